@@ -1,17 +1,79 @@
-from flask import Flask,request,render_template, jsonify
+from flask import Flask,request,render_template, jsonify, Response, g, stream_with_context
 from flask_cors import CORS,cross_origin
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 import sys
 import os
+import io
+import csv
+import itertools
+import time
+import logging
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
-from src.pipeline.predict_pipeline import CustomData,PredictPipeline
+from src.pipeline.predict_pipeline import CustomData,PredictPipeline,get_micro_batcher,get_batch_as_data_frame,get_drift_monitor
+from src.exception import CustomException
+from src.logger import request_logger
+from src.metrics import registry, timed, debug_print, request_seconds, requests_total, metrics_dir, load_processes
+
+# batches bigger than this are streamed back as CSV instead of a single JSON document, predicted this many rows at a time
+STREAM_THRESHOLD_ROWS=10000
+
+micro_batcher_gauge=registry.gauge("ph_micro_batcher","Queue depth and batch size of the micro-batcher",labels=("stat",))
+
+def collect_micro_batcher_stats():
+    config=PredictPipeline().predict_pipeline_config
+    if config.micro_batching:
+        stats=get_micro_batcher(config).stats()
+        for stat in ("queue_depth","max_queue_depth","mean_batch_size","mean_queue_wait_ms"):
+            micro_batcher_gauge.set(stats[stat],stat=stat)
+
+# refreshed whenever the metrics are rendered or saved for the other workers
+registry.collector("micro_batcher",collect_micro_batcher_stats)
 
 application=Flask(__name__)
 app=application
 
+# Load the model and preprocessor before serving the first request. Under gunicorn this runs
+# once in the master (preload_app), and the forked workers share the loaded arrays.
+# If the artifacts aren't there yet the server still starts, and /ready reports 503 until they are.
+try:
+    with timed("warm_up"):
+        PredictPipeline().warm_up()
+except CustomException as e:
+    logging.error(f"Artifacts not loaded at startup: {e}")
+
+def client_error(e):
+    # the CustomException text has the server's file paths, so clients only get the message of a bad input
+    cause=e
+    while isinstance(cause,CustomException) and cause.args:
+        cause=cause.args[0]
+    if isinstance(cause,ValueError):
+        return str(cause),400
+    logging.error(f"Request failed: {e}")
+    return "Internal server error",500
+
+def error_response(e):
+    message,status=client_error(e)
+    return jsonify(error=message),status
+
+@app.before_request
+def start_timer():
+    g.request_start=time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint=request.endpoint or "unknown"
+    if endpoint not in ("metrics","ready","drift"):
+        duration=time.perf_counter()-g.request_start
+        request_seconds.observe(duration,endpoint=endpoint)
+        requests_total.inc(endpoint=endpoint,status=response.status_code)
+        # sampled with PH_LOG_SAMPLE_RATE, errors are always logged
+        level=logging.WARNING if response.status_code>=400 else logging.INFO
+        request_logger.log(level,"request",extra={"endpoint":endpoint,"status":response.status_code,
+                                                  "duration_ms":round(1000*duration,3)})
+    return response
+
 @app.route('/')
 @cross_origin()
 def index(): 
@@ -23,26 +85,216 @@ def predict_datapoint():
     if request.method=='GET':
         return render_template('index.html')
     else:
-        data=CustomData(
-            Temp=float(request.form.get('Temp')),
-            SEC=float(request.form.get('SEC')),
-            Turbidity=float(request.form.get('Turbidity')),
-            Total_Iron=float(request.form.get('Total_Iron')),
-            Titration_1=float(request.form.get('Titration_1')),
-            Titration_2=float(request.form.get('Titration_2')),
-            Volume=request.form.get('Volume'),
-            N_VALUE=float(request.form.get('N_VALUE')),
-            Tryptophan_Probe=float(request.form.get('Tryptophan_Probe')),
-            Final_HCO3=float(request.form.get('Final_HCO3')),
-        ) 
-        pred_df=data.get_data_as_data_frame()
-        print(pred_df)        
+        with timed("form_parsing"):
+            data=CustomData(
+                Temp=float(request.form.get('Temp')),
+                SEC=float(request.form.get('SEC')),
+                Turbidity=float(request.form.get('Turbidity')),
+                Total_Iron=float(request.form.get('Total_Iron')),
+                Titration_1=float(request.form.get('Titration_1')),
+                Titration_2=float(request.form.get('Titration_2')),
+                Volume=request.form.get('Volume'),
+                N_VALUE=float(request.form.get('N_VALUE')),
+                Tryptophan_Probe=float(request.form.get('Tryptophan_Probe')),
+                Final_HCO3=float(request.form.get('Final_HCO3')),
+            )
+        with timed("dataframe_construction"):
+            pred_df=data.get_data_as_data_frame()
+        debug_print(pred_df)
 
         predict_pipeline=PredictPipeline()
         results=predict_pipeline.predict(pred_df)
-        return render_template('index.html',results=round(results[0], 2))
+        with timed("render"):
+            return render_template('index.html',results=round(results[0], 2))
+
+
+def take_upload(file):
+    # Flask closes the uploaded files once the view returns, before a streamed response is read,
+    # so the stream is taken out of the request and closed by the caller
+    stream=file.stream
+    file.stream=io.BytesIO()
+    return stream
+
+
+@app.route('/predictbatch',methods=['POST'])
+@cross_origin()
+def predict_batch():
+    # accepts either an uploaded CSV file or a JSON array of records with the CustomData columns,
+    # read and predicted STREAM_THRESHOLD_ROWS rows at a time
+    upload=None
+    try:
+        with timed("batch_upload_parsing"):
+            if 'file' in request.files:
+                upload=take_upload(request.files['file'])
+                chunks=pd.read_csv(upload,dtype=str,chunksize=STREAM_THRESHOLD_ROWS)
+            else:
+                payload=request.get_json(silent=True)
+                if not isinstance(payload,list) or not all(isinstance(record,dict) for record in payload):
+                    return jsonify(error="Expected a JSON array of records or a CSV file upload"),400
+                records=pd.DataFrame(payload)
+                chunks=(records.iloc[start:start+STREAM_THRESHOLD_ROWS] for start in range(0,len(records),STREAM_THRESHOLD_ROWS))
+            # the first two chunks are read before answering, so a broken upload is a 400 and a small one a JSON document
+            first=next(chunks,pd.DataFrame())
+            second=next(chunks,None)
+    except ValueError as e:
+        # empty file, bad quoting, not text...
+        if upload is not None:
+            upload.close()
+        return jsonify(error=f"Could not read the CSV upload: {e}"),400
+
+    pipeline=PredictPipeline()
+    try:
+        rows,preds,errors=pipeline.predict_batch(first)
+    except CustomException as e:
+        if upload is not None:
+            upload.close()
+        return error_response(e)
+
+    if second is None and request.args.get('format')!='csv':
+        if upload is not None:
+            upload.close()
+        predictions=dict(zip(rows,preds.tolist()))
+        results=[]
+        for row in range(len(first)):
+            if row in predictions:
+                results.append({"row":row,"pH":predictions[row]})
+            else:
+                results.append({"row":row,"error":errors[row]})
+        return jsonify(results=results,n_predicted=len(predictions),n_errors=len(errors))
+
+    # the rest is predicted chunk by chunk while the response is written, so memory doesn't grow with the upload
+    def generate(records,rows,preds,errors):
+        buffer=io.StringIO()
+        writer=csv.writer(buffer,lineterminator="\n")
+        writer.writerow(["row","pH","error"])
+        offset=0
+        remaining=chunks if second is None else itertools.chain([second],chunks)
+        while True:
+            # csv.writer quotes the error messages, one chunk per yield
+            predictions=dict(zip(rows,preds.tolist()))
+            for row in range(len(records)):
+                writer.writerow([offset+row,predictions[row],""] if row in predictions else [offset+row,"",errors[row]])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            offset+=len(records)
+            try:
+                records=next(remaining,None)
+                if records is None:
+                    return
+                rows,preds,errors=pipeline.predict_batch(records)
+            except (ValueError,CustomException) as e:
+                # the response has started, the client finds out from the last row
+                message,_=client_error(e)
+                writer.writerow(["","",f"Stopped after row {offset-1}: {message}"])
+                yield buffer.getvalue()
+                return
+    response=Response(stream_with_context(generate(first,rows,preds,errors)),mimetype='text/csv')
+    if upload is not None:
+        response.call_on_close(upload.close)
+    return response
+
+
+@app.route('/explain',methods=['POST'])
+@cross_origin()
+def explain():
+    # JSON record or array of records with the CustomData columns, ?num_features= to limit the features per explanation
+    payload=request.get_json(silent=True)
+    if isinstance(payload,dict):
+        payload=[payload]
+    if not isinstance(payload,list) or not all(isinstance(record,dict) for record in payload):
+        return jsonify(error="Expected a JSON record or an array of records"),400
+    num_features=request.args.get('num_features')
+    if num_features is not None:
+        if not num_features.isdigit() or int(num_features)<1:
+            return jsonify(error="num_features must be a positive integer"),400
+        num_features=int(num_features)
+
+    # imported on first use, LIME pulls in sklearn
+    from src.pipeline.explainer import Explainer
+    try:
+        start=time.perf_counter()
+        # parsed once, the same rows are predicted and explained
+        with timed("batch_parsing"):
+            features,errors=get_batch_as_data_frame(pd.DataFrame(payload))
+        preds=PredictPipeline().predict_rows(features)
+        prediction_seconds=time.perf_counter()-start
+        with timed("explain"):
+            explanations=Explainer().explain(features,num_features=num_features) if len(features) else []
+        explanation_seconds=time.perf_counter()-start-prediction_seconds
+    except ValueError as e:
+        return jsonify(error=str(e)),400
+    except CustomException as e:
+        return error_response(e)
+
+    predictions=dict(zip(features.index.tolist(),zip(preds.tolist(),explanations)))
+    results=[]
+    for row in range(len(payload)):
+        if row in predictions:
+            pH,explanation=predictions[row]
+            results.append({"row":row,"pH":pH,"explanation":explanation})
+        else:
+            results.append({"row":row,"error":errors[row]})
+    return jsonify(results=results,prediction_ms=round(1000*prediction_seconds,3),
+                   explanation_ms=round(1000*explanation_seconds,3))
+
+
+# {pid: saved metrics} of every live process of the server, None when it runs as a single process
+def server_processes():
+    directory=metrics_dir()
+    if not directory:
+        return None
+    # this process's numbers are saved first, so they're current
+    registry.save_process(directory)
+    return load_processes(directory)
+
+
+@app.route('/drift',methods=['GET'])
+def drift():
+    # PSI/KS of the recent inputs and predictions of every worker against training, and outlier counts per feature
+    drift_monitor=get_drift_monitor(PredictPipeline().predict_pipeline_config)
+    if drift_monitor is None:
+        return jsonify(enabled=False)
+    processes=server_processes()
+    if processes is None:
+        return jsonify(enabled=True,pids=[os.getpid()],**drift_monitor.report())
+    states=[state["collected"]["drift"] for state in processes.values() if "drift" in state.get("collected",{})]
+    return jsonify(enabled=True,pids=sorted(processes),**drift_monitor.report(states))
+
+
+@app.route('/batching_stats',methods=['GET'])
+def batching_stats():
+    # queue depth and batch sizes of the micro-batcher, for tuning PH_MAX_BATCH_SIZE and PH_MAX_WAIT_MS
+    pipeline=PredictPipeline()
+    if not pipeline.predict_pipeline_config.micro_batching:
+        return jsonify(enabled=False)
+    return jsonify(enabled=True,**get_micro_batcher(pipeline.predict_pipeline_config).stats())
+
+
+@app.route('/ready',methods=['GET'])
+def ready():
+    # readiness probe: 200 once the model and preprocessor are loaded (served from the cache after that)
+    try:
+        PredictPipeline().load_artifacts()
+    except CustomException as e:
+        logging.error(f"Artifacts not loaded: {e}")
+        return jsonify(ready=False),503
+    return jsonify(ready=True,pid=os.getpid())
+
+
+@app.route('/metrics',methods=['GET'])
+def metrics():
+    # stage and request latency histograms and counters in the Prometheus text format, per process (pid label)
+    # makes sure the drift monitor exists, so its gauges are refreshed with the others
+    get_drift_monitor(PredictPipeline().predict_pipeline_config)
+    processes=server_processes()
+    if processes is not None:
+        return Response(registry.render_processes(processes),mimetype='text/plain; version=0.0.4')
+    registry.collect()
+    return Response(registry.render(pid=os.getpid()),mimetype='text/plain; version=0.0.4')
     
 
 if __name__=="__main__":
+    # development server, in production run `gunicorn app:app` (settings in gunicorn.conf.py)
     app.run(host="0.0.0.0", port=8080) 
     # app.run(host="0.0.0.0") 
\ No newline at end of file
@@ -0,0 +1,59 @@
+import sys
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.utils import OutlierHandler
+
+
+def legacy_transform(handler, X):
+    """
+    The column-by-column pandas transform OutlierHandler used before it was vectorized,
+    kept here as the reference point for the benchmark.
+    """
+    X = pd.DataFrame(X, columns=handler.feature_names)
+    X = X.copy()
+    for i, column in enumerate(X.columns):
+        outliers = (X[column] < handler.lower_bound[i]) | (X[column] > handler.upper_bound[i])
+        if outliers.any():
+            median_value = X[column].median()
+            X.loc[outliers, column] = median_value
+    return X.to_numpy()
+
+
+def time_call(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(n_features=10, seed=42):
+    rng = np.random.default_rng(seed)
+    train = rng.normal(size=(10_000, n_features))
+    results = []
+    for n_rows, repeat in [(1, 2000), (1_000, 200), (1_000_000, 3)]:
+        # Heavy tails so every column has outliers to replace
+        X = rng.standard_t(df=3, size=(n_rows, n_features))
+        for dtype in (np.float64, np.float32):
+            for strategy in ("median", "clip"):
+                handler = OutlierHandler(strategy=strategy).fit(train.astype(dtype))
+                X_typed = X.astype(dtype)
+                vectorized = time_call(lambda: handler.transform(X_typed), repeat)
+                legacy = time_call(lambda: legacy_transform(handler, X_typed), repeat) if strategy == "median" else None
+                results.append((n_rows, np.dtype(dtype).name, strategy, legacy, vectorized))
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'rows':>9} {'dtype':>8} {'strategy':>8} {'legacy (ms)':>12} {'vectorized (ms)':>16} {'speedup':>8}")
+    for n_rows, dtype, strategy, legacy, vectorized in run():
+        legacy_text = f"{legacy * 1e3:12.3f}" if legacy is not None else f"{'-':>12}"
+        speedup_text = f"{legacy / vectorized:7.1f}x" if legacy is not None else f"{'-':>8}"
+        print(f"{n_rows:>9} {dtype:>8} {strategy:>8} {legacy_text} {vectorized * 1e3:16.3f} {speedup_text}")
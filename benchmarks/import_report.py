@@ -0,0 +1,62 @@
+import sys
+import os
+import argparse
+import subprocess
+from collections import defaultdict
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# libraries the inference path shouldn't need once the preprocessor and model are exported
+HEAVY_MODULES = ["sklearn", "scipy", "catboost", "xgboost", "dill", "lime"]
+
+# what a serving process does at startup: import the pipeline, load the artifacts, score one row
+INFERENCE_CODE = (
+    "import sys, io, contextlib; sys.path.insert(0, '.')\n"
+    "with contextlib.redirect_stdout(io.StringIO()):\n"
+    "    from src.pipeline.predict_pipeline import PredictPipeline, FEATURE_COLUMNS\n"
+    "    import pandas as pd\n"
+    "    PredictPipeline().predict(pd.DataFrame([[25.0] * len(FEATURE_COLUMNS)], columns=FEATURE_COLUMNS))\n"
+    f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))\n"
+)
+
+
+def import_times(code):
+    """
+    Runs code in a fresh interpreter with -X importtime.
+    Returns ({top-level package: seconds}, total seconds, heavy modules that got imported).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    by_package = defaultdict(float)
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        by_package[name.strip().split(".")[0]] += int(self_us) / 1e6
+        # modules imported directly by the code (not by another module) add up to the total
+        if not name[1:].startswith(" "):
+            total += int(cumulative_us) / 1e6
+    heavy = [name for name in result.stdout.strip().split(",") if name]
+    return dict(by_package), total, heavy
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time report for the inference path")
+    parser.add_argument("--top", type=int, default=15, help="packages to list")
+    parser.add_argument("--max-seconds", type=float, default=None, help="exit with an error above this total import time")
+    args = parser.parse_args()
+
+    by_package, total, heavy = import_times(INFERENCE_CODE)
+    print(f"{'package':30s} {'seconds':>10s}")
+    for package, seconds in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{package:30s} {seconds:10.3f}")
+    print(f"{'total':30s} {total:10.3f}")
+    if heavy:
+        print(f"Heavy modules imported: {', '.join(heavy)} (export the artifacts with src/components/export_artifacts.py)")
+    else:
+        print("No heavy modules imported")
+
+    if args.max_seconds is not None and total > args.max_seconds:
+        print(f"Import time {total:.3f}s is over the {args.max_seconds:.3f}s budget")
+        sys.exit(1)
@@ -0,0 +1,273 @@
+import sys
+import os
+import io
+import json
+import time
+import argparse
+import platform
+import resource
+import contextlib
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Add the project root directory to sys.path
+sys.path.insert(0, ROOT_DIR)
+# The pipeline resolves artifacts/ relative to the working directory
+os.chdir(ROOT_DIR)
+
+from src.pipeline.predict_pipeline import PredictPipeline, FEATURE_COLUMNS
+from src.components.model_trainer import ModelTrainer
+from src.utils import evaluate_models
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+# code whose changes make a baseline stale
+BENCHMARKED_PATHS = ["src", "app.py", "benchmarks/run_benchmarks.py"]
+
+
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def load_sample_rows():
+    df = pd.read_csv(os.path.join("artifacts", "data.csv"))
+    df = df[df["Sample_taken"] == "Sampled"]
+    return df[FEATURE_COLUMNS + ["pH"]].reset_index(drop=True)
+
+
+def make_synthetic_rows(sample, n_rows, seed=42):
+    """
+    Scales the bundled sample up to n_rows by resampling rows and jittering them by a few percent.
+    """
+    rng = np.random.default_rng(seed)
+    rows = sample.iloc[rng.integers(0, len(sample), n_rows)].reset_index(drop=True)
+    noise = rng.lognormal(mean=0.0, sigma=0.05, size=(n_rows, len(FEATURE_COLUMNS)))
+    rows[FEATURE_COLUMNS] = rows[FEATURE_COLUMNS].to_numpy(dtype=np.float64) * noise
+    return rows
+
+
+def percentiles(timings, prefix):
+    timings_ms = 1000 * np.asarray(timings)
+    return {
+        f"{prefix}_p50_ms": float(np.percentile(timings_ms, 50)),
+        f"{prefix}_p90_ms": float(np.percentile(timings_ms, 90)),
+        f"{prefix}_p99_ms": float(np.percentile(timings_ms, 99)),
+    }
+
+
+def bench_single_row(sample, n_requests):
+    pipeline = PredictPipeline()
+    rows = [sample.iloc[[i % len(sample)]][FEATURE_COLUMNS] for i in range(n_requests)]
+    with quiet():
+        pipeline.warm_up()
+        pipeline.predict(rows[0])
+        timings = []
+        for row in rows:
+            start = time.perf_counter()
+            pipeline.predict(row)
+            timings.append(time.perf_counter() - start)
+    return percentiles(timings, "single_row")
+
+
+def bench_batch_throughput(sample, batch_sizes):
+    pipeline = PredictPipeline()
+    results = {}
+    for batch_size in batch_sizes:
+        features = make_synthetic_rows(sample, batch_size)[FEATURE_COLUMNS]
+        repeat = max(1, min(50, 100_000 // batch_size))
+        with quiet():
+            pipeline.predict_now(features)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                pipeline.predict_now(features)
+            elapsed = (time.perf_counter() - start) / repeat
+        results[f"batch_{batch_size}_rows_per_s"] = batch_size / elapsed
+    return results
+
+
+def bench_cold_start(repeat):
+    # A fresh interpreter: imports, artifact loading and the first prediction.
+    # The child reports its own peak RSS: VmHWM covers only the new process image, while
+    # ru_maxrss (of the child, or of RUSAGE_CHILDREN here) carries over this process's peak from before exec
+    code = (
+        "import sys, io, contextlib; sys.path.insert(0, '.')\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    from src.pipeline.predict_pipeline import PredictPipeline, FEATURE_COLUMNS\n"
+        "    import pandas as pd\n"
+        "    PredictPipeline().predict(pd.DataFrame([[25.0] * len(FEATURE_COLUMNS)], columns=FEATURE_COLUMNS))\n"
+        "try:\n"
+        "    with open('/proc/self/status') as file_obj:\n"
+        "        print(next(int(line.split()[1]) for line in file_obj if line.startswith('VmHWM:')))\n"
+        "except OSError:\n"
+        "    # no /proc (macOS), where ru_maxrss is in bytes\n"
+        "    import resource\n"
+        "    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1))\n"
+    )
+    timings = []
+    peak_rss_kb = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, check=True, capture_output=True, text=True)
+        timings.append(time.perf_counter() - start)
+        peak_rss_kb.append(int(result.stdout.split()[-1]))
+    return {
+        "cold_start_s": float(np.median(timings)),
+        "cold_start_peak_rss_mb": float(np.median(peak_rss_kb)) / 1024,
+    }
+
+
+def bench_flask(sample, n_requests):
+    with quiet():
+        from app import app
+    client = app.test_client()
+
+    forms = [{name: str(value) for name, value in sample.iloc[i % len(sample)][FEATURE_COLUMNS].items()}
+             for i in range(n_requests)]
+    with quiet():
+        client.post("/predictdata", data=forms[0])
+        timings = []
+        for form in forms:
+            start = time.perf_counter()
+            response = client.post("/predictdata", data=form)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200
+
+        records = make_synthetic_rows(sample, 1000)[FEATURE_COLUMNS].to_dict(orient="records")
+        start = time.perf_counter()
+        response = client.post("/predictbatch", json=records)
+        batch_elapsed = time.perf_counter() - start
+        assert response.status_code == 200
+
+    results = percentiles(timings, "flask_predictdata")
+    results["flask_predictbatch_1000_rows_ms"] = 1000 * batch_elapsed
+    return results
+
+
+def bench_training(sample, n_rows, search_strategy, n_iter):
+    """
+    End-to-end evaluate_models time per model family on a synthetic training set,
+    transformed with the bundled preprocessor.
+    """
+    pipeline = PredictPipeline()
+    with quiet():
+        _, preprocessor = pipeline.load_artifacts()
+    data = make_synthetic_rows(sample, n_rows)
+    X = preprocessor.transform(data[FEATURE_COLUMNS])
+    y = data["pH"].to_numpy()
+    split = int(0.8 * n_rows)
+
+    trainer = ModelTrainer()
+    models, params = trainer.get_models_and_params()
+    results = {}
+    for model_name, model in models.items():
+        start = time.perf_counter()
+        with quiet():
+            evaluate_models(X[:split], y[:split], X[split:], y[split:], {model_name: model}, params,
+                            n_jobs=trainer.model_trainer_config.n_jobs,
+                            random_state=trainer.model_trainer_config.random_state,
+                            search_strategy=search_strategy, n_iter=n_iter)
+        results[f"train_{model_name.lower().replace(' ', '_')}_s"] = time.perf_counter() - start
+    return results
+
+
+def run(args):
+    sample = load_sample_rows()
+    results = {}
+    results.update(bench_single_row(sample, args.requests))
+    results.update(bench_batch_throughput(sample, args.batch_sizes))
+    results.update(bench_cold_start(args.cold_start_repeat))
+    results.update(bench_flask(sample, args.requests))
+    if not args.skip_training:
+        results.update(bench_training(sample, args.training_rows, args.search_strategy, args.n_iter))
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def higher_is_better(metric):
+    return metric.endswith("_per_s")
+
+
+def check_against_baseline(results, baseline, tolerance):
+    """
+    Returns the metrics that are more than `tolerance` (relative) worse than the baseline.
+    """
+    regressions = []
+    for metric, value in results.items():
+        if metric not in baseline:
+            continue
+        reference = baseline[metric]
+        if higher_is_better(metric):
+            regressed = value < reference * (1 - tolerance)
+        else:
+            regressed = value > reference * (1 + tolerance)
+        if regressed:
+            regressions.append((metric, reference, value))
+    return regressions
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def git_commit():
+    result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def changed_since(commit):
+    """
+    Benchmarked files that differ between `commit` and the working tree, None if git can't tell.
+    """
+    result = subprocess.run(["git", "diff", "--name-only", commit, "--", *BENCHMARKED_PATHS],
+                            cwd=ROOT_DIR, capture_output=True, text=True)
+    return result.stdout.split() if result.returncode == 0 else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inference latency, throughput and training time benchmarks")
+    parser.add_argument("--requests", type=int, default=500, help="requests for the single-row and Flask latency runs")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--cold-start-repeat", type=int, default=3)
+    parser.add_argument("--training-rows", type=int, default=2_000)
+    parser.add_argument("--search-strategy", default="random", choices=["grid", "random", "halving"])
+    parser.add_argument("--n-iter", type=int, default=3)
+    parser.add_argument("--skip-training", action="store_true")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {BASELINE_PATH}")
+    parser.add_argument("--check", action="store_true", help="exit with an error if a metric regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression for --check")
+    args = parser.parse_args()
+
+    results = run(args)
+    for metric, value in results.items():
+        print(f"{metric:45s} {value:14.3f}")
+
+    if args.save_baseline:
+        settings = {name: value for name, value in vars(args).items() if name not in ("save_baseline", "check", "tolerance")}
+        with open(BASELINE_PATH, "w") as file_obj:
+            json.dump({"environment": environment(), "git_commit": git_commit(), "settings": settings,
+                       "results": results}, file_obj, indent=2)
+        print(f"Saved baseline to {BASELINE_PATH}")
+
+    if args.check:
+        with open(BASELINE_PATH) as file_obj:
+            baseline = json.load(file_obj)
+        if baseline["environment"] != environment():
+            print(f"Warning: baseline was recorded on {baseline['environment']}, this machine is {environment()}")
+        commit = baseline.get("git_commit")
+        changed = changed_since(commit) if commit else None
+        if changed is None:
+            print("Warning: can't tell which commit the baseline was recorded on, it may measure different code")
+        elif changed:
+            print(f"Warning: baseline was recorded on {commit[:10]}, these files changed since: {', '.join(changed)}")
+        regressions = check_against_baseline(results, baseline["results"], args.tolerance)
+        for metric, reference, value in regressions:
+            print(f"REGRESSION {metric}: baseline {reference:.3f}, now {value:.3f}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of the baseline")
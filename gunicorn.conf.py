@@ -0,0 +1,95 @@
+# Production server settings, picked up automatically by `gunicorn app:app`.
+#
+# The app (and with it the model and preprocessor) is loaded once in the master process
+# before the workers are forked, so the fitted arrays are shared copy-on-write instead of
+# being loaded again by every worker. When the artifacts change on disk, the master loads
+# the new ones and gracefully replaces the workers (SIGHUP), so the new workers share them too.
+import gc
+import os
+import signal
+import tempfile
+import threading
+import time
+import multiprocessing
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get("PH_WORKERS", multiprocessing.cpu_count()))
+# prediction is mostly numpy, which releases the GIL, so a few threads per worker help with I/O
+threads = int(os.environ.get("PH_THREADS", 4))
+worker_class = "gthread"
+preload_app = True
+timeout = int(os.environ.get("PH_WORKER_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("PH_GRACEFUL_TIMEOUT", 30))
+# how often (seconds) the master checks the artifacts for changes, 0 to never reload
+reload_interval = float(os.environ.get("PH_RELOAD_INTERVAL", 5))
+# Each request reaches one worker, so every worker saves its metrics and drift counts to a shared
+# directory every PH_METRICS_SAVE_INTERVAL seconds, and /metrics and /drift report all of them
+os.environ.setdefault("PH_METRICS_DIR", tempfile.mkdtemp(prefix="ph-metrics-"))
+metrics_save_interval = float(os.environ.get("PH_METRICS_SAVE_INTERVAL", 5))
+
+
+def artifact_stamps():
+    from src.pipeline.predict_pipeline import PredictPipelineConfig
+    from src.pipeline.compact_model import MANIFEST_FILE
+
+    config = PredictPipelineConfig()
+    paths = [
+        config.model_path,
+        config.preprocessor_path,
+        os.path.join(config.compact_model_dir, MANIFEST_FILE),
+        os.path.join(config.compiled_preprocessor_dir, MANIFEST_FILE),
+        config.feature_store_path,
+    ]
+    stamps = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamps[path] = None
+    return stamps
+
+
+def watch_artifacts(server):
+    from src.pipeline.predict_pipeline import PredictPipeline
+
+    last = artifact_stamps()
+    pending = None
+    while True:
+        time.sleep(reload_interval)
+        current = artifact_stamps()
+        if current == last:
+            pending = None
+            continue
+        # Training replaces several files one after the other, wait until they stop changing
+        if current != pending:
+            pending = current
+            continue
+
+        try:
+            PredictPipeline().warm_up()
+        except Exception as e:
+            # keep the running workers on the old artifacts
+            server.log.error(f"Changed artifacts failed to load, not reloading: {e}")
+            last = current
+            continue
+        last, pending = current, None
+        server.log.info("Artifacts changed, replacing the workers")
+        os.kill(os.getpid(), signal.SIGHUP)
+
+
+def when_ready(server):
+    if reload_interval > 0:
+        threading.Thread(target=watch_artifacts, args=(server,), name="artifact-watcher", daemon=True).start()
+
+
+def post_fork(server, worker):
+    from src.metrics import start_process_saver
+
+    start_process_saver(os.environ["PH_METRICS_DIR"], metrics_save_interval)
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the garbage collector's reach, so collections
+    # in the workers don't write to (and copy) the shared pages
+    gc.freeze()
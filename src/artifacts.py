@@ -0,0 +1,127 @@
+import os
+import sys
+import pickle
+import hashlib
+import threading
+import contextlib
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.exception import CustomException
+from src.logger import logging
+
+# Loading and caching of saved artifacts. Kept free of pandas/sklearn imports so the
+# inference path only pays for the libraries the loaded artifacts actually need.
+
+try:
+    import fcntl
+except ImportError:
+    # no flock on Windows, swaps of several artifacts aren't guarded there
+    fcntl = None
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file_obj:
+        for block in iter(lambda: file_obj.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stamp(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_object(file_path):
+    try:
+        logging.info(f"Loading object from: {file_path}")
+        with open(file_path, "rb") as file_obj:
+            return pickle.load(file_obj)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+@contextlib.contextmanager
+def artifact_lock(lock_path, exclusive=False):
+    """
+    File lock around artifacts that have to change together (model and preprocessor), across processes.
+    Writers hold it exclusively while they replace the files and readers share it while they check
+    and load them, so nobody loads half of a swap. Each call opens its own descriptor, since threads
+    sharing one would release each other's lock.
+    """
+    fd = None
+    if fcntl is not None:
+        try:
+            fd = os.open(lock_path, os.O_RDONLY | os.O_CREAT, 0o666)
+        except OSError:
+            # no artifacts directory yet, or a read-only one: nothing can be swapped there
+            pass
+    try:
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        if fd is not None:
+            # closing the descriptor releases the lock
+            os.close(fd)
+
+
+class ArtifactCache:
+    """
+    Process-wide cache of loaded artifacts (model, preprocessor, ...).
+    Each file is loaded once and reloaded only when its mtime or size changes,
+    so a retrained model is picked up without restarting the server. Files listed in
+    depends_on (e.g. the pickle an export was made from) are part of the stamp too.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(file_path, depends_on=()):
+        stat = os.stat(file_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        for dependency in depends_on:
+            # a missing dependency is a change too, the loader decides what that means
+            stamp += tuple(file_stamp(dependency)) if os.path.exists(dependency) else (None,)
+        return stamp
+
+    def get(self, file_path, loader=None, depends_on=()):
+        loader = loader or load_object
+        try:
+            # The same file can be cached under several loaders (e.g. raw and compiled preprocessor)
+            key = (os.path.abspath(file_path), loader)
+            stamp = self._stamp(key[0], depends_on)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+
+            with self._lock:
+                # Another thread may have reloaded the file while we were waiting
+                stamp = self._stamp(key[0], depends_on)
+                entry = self._entries.get(key)
+                if entry is None or entry[0] != stamp:
+                    # Replace the whole entry in one assignment so readers get either the old or the new object
+                    entry = (stamp, loader(key[0]))
+                    self._entries[key] = entry
+            return entry[1]
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def version(self, file_path, loader=None):
+        """
+        Returns the (mtime, size) stamp of the cached copy, or None if the file was never loaded.
+        """
+        entry = self._entries.get((os.path.abspath(file_path), loader or load_object))
+        return entry[0] if entry is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every PredictPipeline in the process
+artifact_cache = ArtifactCache()
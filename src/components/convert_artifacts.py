@@ -0,0 +1,51 @@
+import os
+import sys
+import argparse
+
+import pandas as pd
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.logger import logging
+from src.utils import read_in_chunks, ChunkedTableWriter
+
+
+def convert_artifact(csv_path, chunk_size=100000):
+    """
+    Converts a CSV artifact (train.csv, test.csv, data.csv) to Parquet next to it, chunk by chunk.
+    Returns the path of the Parquet file.
+    """
+    try:
+        # First pass: settle one type per column, since a column can be empty (numeric)
+        # in one chunk and hold text in another
+        dtypes = {}
+        for chunk in read_in_chunks(csv_path, chunk_size):
+            for column, dtype in chunk.dtypes.items():
+                numeric = pd.api.types.is_numeric_dtype(dtype) and dtypes.get(column, "float64") == "float64"
+                dtypes[column] = "float64" if numeric else "string"
+
+        parquet_path = os.path.splitext(csv_path)[0] + ".parquet"
+        with ChunkedTableWriter(parquet_path) as writer:
+            for chunk in read_in_chunks(csv_path, chunk_size):
+                writer.write(chunk.astype(dtypes))
+
+        logging.info(f"Converted {csv_path} to {parquet_path}")
+        return parquet_path
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert CSV artifacts to Parquet")
+    parser.add_argument(
+        "paths", nargs="*",
+        default=[os.path.join("artifacts", name) for name in ("train.csv", "test.csv", "data.csv")],
+        help="CSV artifacts to convert (default: the train, test and raw data artifacts)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    args = parser.parse_args()
+
+    for path in args.paths:
+        print(convert_artifact(path, chunk_size=args.chunk_size))
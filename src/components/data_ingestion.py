@@ -9,11 +9,15 @@ from src.components.data_transformation import DataTransformation
 from src.components.data_transformation import DataTransformationConfig
 from src.components.model_trainer import ModelTrainerConfig
 from src.components.model_trainer import ModelTrainer
+from src.utils import read_in_chunks, write_table, ChunkedTableWriter
+from src.metrics import registry, timed
+from src.pipeline.feature_store import ID_COLUMN, DATE_COLUMN, TIME_COLUMN
 
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.impute import SimpleImputer
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 # @dataclass decorator , because inside any traditional class, to define the class variables you basically use __init__ ,  
@@ -23,6 +27,27 @@ class DataIngestionConfig:
     train_data_path: str=os.path.join('artifacts',"train.csv")
     test_data_path: str=os.path.join('artifacts',"test.csv")
     raw_data_path: str=os.path.join('artifacts',"data.csv")
+    source_data_path: str=os.path.join('notebook','Dataset','Dataset Disssertation.xlsx')
+    test_size: float=0.2
+    # streaming mode reads the source in chunks, keeps only sampled rows and the columns
+    # used downstream, and splits every row by a hash of its key columns
+    streaming: bool=False
+    chunk_size: int=10000
+    split_key_columns: tuple=('WP_ID','SURVEY_DETAIL_ID','Date_Assessment','Time_Assessment')
+    keep_columns: tuple=('Temp','pH','SEC','Turbidity','Total_Iron','Titration_1','Titration_2',
+                         'Volume','N_VALUE','Tryptophan_Probe','Final_HCO3')
+    # "csv" or "parquet"; parquet lets later stages read only the columns they need
+    artifact_format: str="csv"
+    # forecasting mode (PH_FORECASTING=1) needs the water point and reading time of every row,
+    # so streaming keeps them next to keep_columns
+    forecasting: bool=field(default_factory=lambda: os.environ.get("PH_FORECASTING")=="1")
+
+    def __post_init__(self):
+        if self.artifact_format!="csv":
+            extension=f".{self.artifact_format}"
+            self.train_data_path=os.path.splitext(self.train_data_path)[0]+extension
+            self.test_data_path=os.path.splitext(self.test_data_path)[0]+extension
+            self.raw_data_path=os.path.splitext(self.raw_data_path)[0]+extension
 
 class DataIngestion:
     #__init__ since we have other functions to define
@@ -33,21 +58,24 @@ class DataIngestion:
     def __init__(self):
         self.ingestion_config=DataIngestionConfig()
 
+    @timed("data_ingestion")
     def initiate_data_ingestion(self):
         logging.info("Entered the data ingestion method or component")
+        if self.ingestion_config.streaming:
+            return self.initiate_streaming_data_ingestion()
         try:
-            df = pd.read_excel('notebook/Dataset/Dataset Disssertation.xlsx')
+            df = pd.read_excel(self.ingestion_config.source_data_path)
             logging.info('Reading the dataset as dataframe')
             logging.info(df.columns)
 
             os.makedirs(os.path.dirname(self.ingestion_config.train_data_path),exist_ok=True)
-            df.to_csv(self.ingestion_config.raw_data_path,index=False,header=True)
+            write_table(df,self.ingestion_config.raw_data_path)
 
             logging.info("Train test split initiated")
 
-            train_set,test_set=train_test_split(df,test_size=0.2,random_state=42)
-            train_set.to_csv(self.ingestion_config.train_data_path,index=False,header=True)
-            test_set.to_csv(self.ingestion_config.test_data_path,index=False,header=True)
+            train_set,test_set=train_test_split(df,test_size=self.ingestion_config.test_size,random_state=42)
+            write_table(train_set,self.ingestion_config.train_data_path)
+            write_table(test_set,self.ingestion_config.test_data_path)
 
             logging.info("Ingestion of the data is complete")
 
@@ -59,6 +87,54 @@ class DataIngestion:
         except Exception as e:
             logging.info('Exception occured at Data Ingestion stage')
             raise CustomException(e,sys)
+
+    def is_test_row(self,df):
+        """
+        Deterministic train/test assignment from a hash of each row's key columns,
+        so a row lands in the same split no matter which chunk it is read in.
+        """
+        key_columns=list(self.ingestion_config.split_key_columns)
+        row_hash=pd.util.hash_pandas_object(df[key_columns].astype(str),index=False).to_numpy()
+        return (row_hash % np.uint64(1_000_000)) < np.uint64(self.ingestion_config.test_size*1_000_000)
+
+    def initiate_streaming_data_ingestion(self):
+        logging.info("Entered the streaming data ingestion method")
+        try:
+            config=self.ingestion_config
+            id_columns=[ID_COLUMN,DATE_COLUMN,TIME_COLUMN] if config.forecasting else []
+            columns=list(dict.fromkeys([*config.keep_columns,*config.split_key_columns,*id_columns,'Sample_taken']))
+            os.makedirs(os.path.dirname(config.train_data_path),exist_ok=True)
+
+            n_rows={"read":0,"train":0,"test":0}
+            with ChunkedTableWriter(config.raw_data_path) as raw_writer, \
+                 ChunkedTableWriter(config.train_data_path) as train_writer, \
+                 ChunkedTableWriter(config.test_data_path) as test_writer:
+                for chunk in read_in_chunks(config.source_data_path,config.chunk_size,columns=columns):
+                    n_rows["read"]+=len(chunk)
+
+                    # Filter and prune while reading, so unsampled rows and unused columns never pile up
+                    chunk=chunk[chunk['Sample_taken']=='Sampled']
+                    is_test=self.is_test_row(chunk)
+                    # Every kept column is numeric, coerce them so each chunk has the same types.
+                    # The id columns stay as read, like in the non-streaming split
+                    chunk=pd.concat([chunk[id_columns],
+                                     chunk[list(config.keep_columns)].apply(pd.to_numeric,errors='coerce')],axis=1)
+
+                    raw_writer.write(chunk)
+                    train_writer.write(chunk[~is_test])
+                    test_writer.write(chunk[is_test])
+                    n_rows["train"]+=int((~is_test).sum())
+                    n_rows["test"]+=int(is_test.sum())
+
+            logging.info(f"Streaming ingestion complete: {n_rows}")
+            return(
+                config.train_data_path,
+                config.test_data_path
+            )
+
+        except Exception as e:
+            logging.info('Exception occured at streaming Data Ingestion stage')
+            raise CustomException(e,sys)
         
 
 if __name__=="__main__":
@@ -71,4 +147,6 @@ if __name__=="__main__":
     train_arr,test_arr,_=data_transformation.initiate_data_transformation(train_data,test_data)    
 
     modeltrainer=ModelTrainer()
-    print(modeltrainer.initiate_model_trainer(train_arr,test_arr))
\ No newline at end of file
+    print(modeltrainer.initiate_model_trainer(train_arr,test_arr))
+    # stage timings of this run, for the node_exporter textfile collector
+    registry.write(os.path.join('artifacts','training_metrics.prom'))
\ No newline at end of file
@@ -1,6 +1,8 @@
 import sys
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
+import copy
+import shutil
 
 import numpy as np 
 import pandas as pd
@@ -13,13 +15,31 @@ from sklearn.preprocessing import OneHotEncoder,StandardScaler
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 from src.exception import CustomException
 from src.logger import logging
-from src.utils import OutlierHandler, save_object
+from src.utils import OutlierHandler, save_object, read_table, table_columns, stack_features_and_target
+from src.metrics import timed
+from src.pipeline.compiled_preprocessor import export_compiled_preprocessor
+from src.pipeline.feature_store import FeatureStore, ID_COLUMN, DATE_COLUMN, TIME_COLUMN
+from src.pipeline.drift_monitor import build_drift_reference, save_drift_reference
 
 # @dataclass decorator , because inside any traditional class, to define the class variables you basically use _init_ ,  
 # but if we use this @dataclass decorator,  it enables us to define the class variable directly
 @dataclass
 class DataTransformationConfig:
     preprocessor_obj_file_path=os.path.join('artifacts',"preprocessor.pkl")
+    # "median" replaces outliers with the training median, "clip" clips them to the IQR bounds
+    outlier_strategy: str="median"
+    # write the transformed arrays to .npy files and hand them to training memory-mapped
+    save_arrays: bool=False
+    train_array_path: str=os.path.join('artifacts',"train_arr.npy")
+    test_array_path: str=os.path.join('artifacts',"test_arr.npy")
+    # also save the preprocessor as plain arrays, so serving doesn't need to import sklearn
+    export_compiled_preprocessor: bool=True
+    compiled_preprocessor_dir: str=os.path.join('artifacts',"compiled_preprocessor")
+    # forecasting mode: add per-WP_ID lag/rolling features from the feature store (PH_FORECASTING=1)
+    forecasting: bool=field(default_factory=lambda: os.environ.get("PH_FORECASTING")=="1")
+    feature_store_path: str=os.path.join('artifacts',"feature_store.pkl")
+    # training distribution of the inputs and the target, for the drift monitor of PredictPipeline
+    drift_reference_path: str=os.path.join('artifacts',"drift_reference.json")
 
 class DataTransformation:
     def __init__(self):
@@ -35,8 +55,11 @@ class DataTransformation:
             # numerical_columns = ['Temp (oC)','SEC (µS/cm)', 'Turbidity (<NTU)', 'Total Iron (mg/l)', 'Titration 1', 'Titration 2', 'Volume 50/100ml', 'N_VALUE', 'Tryptophan_Probe_µgL', 'Final HCO3']
             num_pipeline = Pipeline(
                 steps=[ 
-                    ("imputer", SimpleImputer(strategy="median")),
-                    ("outlier_handler", OutlierHandler()),  
+                    # in forecasting mode, keep columns that are empty at fit time (e.g. history features when every
+                    # water point has one reading), so the preprocessor outputs the same columns and can still be compiled
+                    ("imputer", SimpleImputer(strategy="median",
+                                              keep_empty_features=self.data_transformation_config.forecasting)),
+                    ("outlier_handler", OutlierHandler(strategy=self.data_transformation_config.outlier_strategy)),  
                     ("scaler", StandardScaler()),  
                 ]
             )
@@ -52,25 +75,63 @@ class DataTransformation:
         except Exception as e:
             raise CustomException(e, sys)
     
+    def add_forecasting_features(self, train_df, test_df):
+        """
+        Adds the feature store features to train and test. The training features come from the
+        training readings only, then the test readings are replayed on a copy of that store, so a
+        test reading sees the history before it but its pH never reaches a training row. The store
+        saved for serving holds every reading.
+        """
+        try:
+            missing = [col for col in (ID_COLUMN, DATE_COLUMN) if col not in train_df.columns]
+            if missing:
+                raise ValueError(f"Forecasting needs the {missing} columns in the training data")
+
+            logging.info("Building the forecasting features...")
+            feature_store = FeatureStore()
+            train_features = feature_store.fit_transform(train_df)
+            test_features = copy.deepcopy(feature_store).fit_transform(test_df)
+
+            serving_store = FeatureStore()
+            serving_store.observe(pd.concat([train_df, test_df]))
+            save_object(file_path=self.data_transformation_config.feature_store_path, obj=serving_store)
+            logging.info(f"Feature store with {len(serving_store._states)} water points saved")
+            return pd.concat([train_df, train_features], axis=1), pd.concat([test_df, test_features], axis=1)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @timed("data_transformation")
     def initiate_data_transformation(self, train_path, test_path):
         try:
+            columns_to_drop = ['WP_ID', 'DataType', 'Date_Assessment_Original', 'SURVEY_DETAIL_ID',
+                               'COUNTRY', 'Comment', 'HCO3', 'Corrected_HCO3', 'Sample_taken', 
+                               'Date_Assessment', 'Time_Assessment']
+
             logging.info("Reading train and test data.")
-            train_df = pd.read_csv(train_path)
-            test_df = pd.read_csv(test_path)
+            # Only read the columns that are used (Parquet skips the others on disk)
+            forecasting = self.data_transformation_config.forecasting
+            id_columns = [ID_COLUMN, DATE_COLUMN, TIME_COLUMN] if forecasting else []
+            columns = [col for col in table_columns(train_path)
+                       if col not in columns_to_drop or col == 'Sample_taken' or col in id_columns]
+            train_df = read_table(train_path, columns=columns)
+            test_df = read_table(test_path, columns=columns)
             logging.info("Read train and test data completed")
 
-            logging.info("Removing unsampled rows...")
-            train_df = train_df[train_df['Sample_taken'] == 'Sampled']
-            test_df = test_df[test_df['Sample_taken'] == 'Sampled']
+            # Streaming ingestion already filtered the rows and pruned the columns
+            if 'Sample_taken' in train_df.columns:
+                logging.info("Removing unsampled rows...")
+                train_df = train_df[train_df['Sample_taken'] == 'Sampled']
+                test_df = test_df[test_df['Sample_taken'] == 'Sampled']
             logging.info(f"Train dataset shape after removing unsampled rows: {train_df.shape}")
             logging.info(f"Test dataset shape after removing unsampled rows: {test_df.shape}")
 
+            if forecasting:
+                train_df, test_df = self.add_forecasting_features(train_df, test_df)
+
             logging.info("Dropping unneeded features...")
-            columns_to_drop = ['WP_ID', 'DataType', 'Date_Assessment_Original', 'SURVEY_DETAIL_ID',
-                               'COUNTRY', 'Comment', 'HCO3', 'Corrected_HCO3', 'Sample_taken', 
-                               'Date_Assessment', 'Time_Assessment']
-            train_df = train_df.drop(columns=columns_to_drop, axis=1)
-            test_df = test_df.drop(columns=columns_to_drop, axis=1)
+            train_df = train_df.drop(columns=columns_to_drop, axis=1, errors='ignore')
+            test_df = test_df.drop(columns=columns_to_drop, axis=1, errors='ignore')
             logging.info(f"Remaining columns: {train_df.columns.tolist()}")   
 
             logging.info("Creating preprocessing pipeline...")
@@ -90,14 +151,40 @@ class DataTransformation:
             input_feature_train_arr = preprocessing_obj.fit_transform(input_feature_train_df)
             input_feature_test_arr = preprocessing_obj.transform(input_feature_test_df)
 
-            train_arr = np.c_[input_feature_train_arr, np.array(target_feature_train_df)]
-            test_arr = np.c_[input_feature_test_arr, np.array(target_feature_test_df)]
+            save_arrays = self.data_transformation_config.save_arrays
+            train_arr = stack_features_and_target(
+                input_feature_train_arr, target_feature_train_df.to_numpy(),
+                file_path=self.data_transformation_config.train_array_path if save_arrays else None
+            )
+            test_arr = stack_features_and_target(
+                input_feature_test_arr, target_feature_test_df.to_numpy(),
+                file_path=self.data_transformation_config.test_array_path if save_arrays else None
+            )
 
             logging.info(f"Saving preprocessing object.")
+            # Remove the previous export first so it is never served next to the new pickle
+            shutil.rmtree(self.data_transformation_config.compiled_preprocessor_dir, ignore_errors=True)
             save_object(
                 file_path=self.data_transformation_config.preprocessor_obj_file_path,
                 obj=preprocessing_obj
             )
+            if self.data_transformation_config.export_compiled_preprocessor:
+                export_compiled_preprocessor(
+                    preprocessing_obj,
+                    self.data_transformation_config.preprocessor_obj_file_path,
+                    self.data_transformation_config.compiled_preprocessor_dir
+                )
+
+            logging.info("Saving the drift reference.")
+            # request inputs only, the forecasting features are computed from them
+            monitored_columns = [col for col in numerical_columns if col not in FeatureStore().feature_names]
+            outlier_handler = preprocessing_obj.named_transformers_['num_pipeline'].named_steps['outlier_handler']
+            bounds = [numerical_columns.index(col) for col in monitored_columns]
+            save_drift_reference(
+                build_drift_reference(input_feature_train_df[monitored_columns], target_feature_train_df.to_numpy(),
+                                      outlier_handler.lower_bound[bounds], outlier_handler.upper_bound[bounds]),
+                self.data_transformation_config.drift_reference_path
+            )
 
             return (
                 train_arr,
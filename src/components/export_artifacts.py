@@ -0,0 +1,64 @@
+import os
+import sys
+import argparse
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.logger import logging
+from src.utils import load_object, read_table
+from src.pipeline.predict_pipeline import PredictPipelineConfig, FEATURE_COLUMNS
+from src.pipeline.compiled_preprocessor import export_compiled_preprocessor
+from src.pipeline.compact_model import export_compact_model
+from src.pipeline.drift_monitor import build_drift_reference, save_drift_reference, prediction_reference
+
+
+def export_artifacts(check_data_path=os.path.join("artifacts", "test.csv"),
+                     train_data_path=os.path.join("artifacts", "train.csv")):
+    """
+    Writes the compiled preprocessor and compact model exports and the drift reference for the
+    pickles already in artifacts/, e.g. ones trained before they existed. Training writes them itself.
+    The model export is checked against the pickle on the rows of check_data_path, the drift
+    reference is computed from train_data_path.
+    """
+    try:
+        config = PredictPipelineConfig()
+        preprocessor = load_object(config.preprocessor_path)
+        preprocessor_manifest = export_compiled_preprocessor(
+            preprocessor, config.preprocessor_path, config.compiled_preprocessor_dir
+        )
+
+        model = load_object(config.model_path)
+        X_check = preprocessor.transform(read_table(check_data_path, columns=FEATURE_COLUMNS))
+        model_manifest = export_compact_model(model, config.model_path, config.compact_model_dir, X_check)
+
+        _, num_pipeline, columns = preprocessor.transformers_[0]
+        train_df = read_table(train_data_path)
+        if 'Sample_taken' in train_df.columns:
+            train_df = train_df[train_df['Sample_taken'] == 'Sampled']
+        # forecasting features aren't in the training file, and aren't request inputs anyway
+        monitored = [i for i, col in enumerate(columns) if col in train_df.columns]
+        outlier_handler = num_pipeline.named_steps['outlier_handler']
+        reference = build_drift_reference(train_df[[columns[i] for i in monitored]], train_df['pH'].to_numpy(dtype=float),
+                                          outlier_handler.lower_bound[monitored], outlier_handler.upper_bound[monitored])
+        if len(monitored) == len(columns):
+            # served predictions are compared to the model's own predictions on the training rows
+            reference["prediction"] = prediction_reference(model.predict(preprocessor.transform(train_df[list(columns)])))
+        save_drift_reference(reference, config.drift_reference_path)
+
+        logging.info(f"Exported artifacts: preprocessor {preprocessor_manifest is not None}, model {model_manifest is not None}")
+        return preprocessor_manifest, model_manifest
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the pickled preprocessor and model for fast loading, and the drift reference")
+    parser.add_argument("--check-data", default=os.path.join("artifacts", "test.csv"),
+                        help="rows the compact model is checked on against the pickled model")
+    args = parser.parse_args()
+
+    preprocessor_manifest, model_manifest = export_artifacts(args.check_data)
+    print(f"compiled preprocessor: {'exported' if preprocessor_manifest else 'not exported'}")
+    print(f"compact model: {'exported' if model_manifest else 'not exported'}")
@@ -0,0 +1,286 @@
+import os
+import sys
+import copy
+import time
+import shutil
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import r2_score
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.logger import logging
+from src.artifacts import file_sha256, load_object, artifact_lock
+from src.utils import save_object, read_table, EarlyStoppingRegressor
+from src.metrics import timed
+from src.pipeline.compiled_preprocessor import export_compiled_preprocessor, is_batch_independent
+from src.pipeline.compact_model import export_compact_model
+from src.pipeline.feature_store import FeatureStore
+
+TARGET_COLUMN = 'pH'
+LINEAR_MODELS = ("LinearRegression", "Ridge", "Lasso")
+
+
+@dataclass
+class IncrementalTrainerConfig:
+    model_path: str=os.path.join("artifacts","model.pkl")
+    preprocessor_path: str=os.path.join("artifacts","preprocessor.pkl")
+    compact_model_dir: str=os.path.join("artifacts","compact_model")
+    compiled_preprocessor_dir: str=os.path.join("artifacts","compiled_preprocessor")
+    # same lock as PredictPipelineConfig.artifact_lock_path, taken while both pickles are replaced
+    artifact_lock_path: str=os.path.join("artifacts","artifacts.lock")
+    # the held-out set the refreshed model has to hold up on
+    test_data_path: str=os.path.join("artifacts","test.csv")
+    # only read once, to start the running aggregates of the current model's training rows
+    train_data_path: str=os.path.join("artifacts","train.csv")
+    training_stats_path: str=os.path.join("artifacts","training_stats.pkl")
+    # trees/boosting rounds added per refresh
+    extra_estimators: int=32
+    # promote only if the held-out R2 is at most this much below the current model's, and at least min_score
+    max_score_drop: float=0.0
+    min_score: float=0.7
+
+
+class TrainingStats:
+    """
+    Running mean and co-moment matrix of [imputed features, pH] over every row the current model
+    was trained on. Batches are merged in O(features^2) without keeping the rows, and that's
+    enough to solve the linear models exactly as if they were refitted on all of them.
+    """
+    def __init__(self, n_columns):
+        self.n = 0
+        self.mean = np.zeros(n_columns)
+        self.comoment = np.zeros((n_columns, n_columns))
+        self.preprocessor_sha256 = None
+        self.files = []
+
+    def update(self, Z, y):
+        W = np.column_stack([Z, y]).astype(np.float64)
+        n_batch = len(W)
+        if not n_batch:
+            return
+        batch_mean = W.mean(axis=0)
+        centered = W - batch_mean
+        delta = batch_mean - self.mean
+        n = self.n + n_batch
+        # Chan et al. parallel update, stable however many batches are merged
+        self.comoment += centered.T @ centered + np.outer(delta, delta) * self.n * n_batch / n
+        self.mean += delta * n_batch / n
+        self.n = n
+
+    def solve_linear(self, model, scaler):
+        """
+        Returns a copy of the linear model refitted on every row seen, in the units of the scaler.
+        """
+        s = scaler.scale_
+        G = self.comoment[:-1, :-1] / np.outer(s, s)
+        b = self.comoment[:-1, -1] / s
+        name = type(model).__name__
+        if name == "LinearRegression":
+            coef = np.linalg.lstsq(G, b, rcond=None)[0]
+        elif name == "Ridge":
+            coef = np.linalg.solve(G + model.alpha * np.eye(len(G)), b)
+        else:
+            coef = lasso_from_gram(G, b, model.alpha * self.n, model.max_iter, model.tol)
+
+        model = copy.deepcopy(model)
+        model.coef_ = coef
+        model.intercept_ = self.mean[-1] - ((self.mean[:-1] - scaler.mean_) / s) @ coef
+        return model
+
+
+def lasso_from_gram(G, b, penalty, max_iter=1000, tol=1e-4):
+    # coordinate descent on the centered Gram matrix, same objective as sklearn's Lasso
+    coef = np.zeros(len(b))
+    for _ in range(max_iter):
+        max_change = 0.0
+        for j in range(len(b)):
+            if G[j, j] == 0:
+                continue
+            rho = b[j] - G[j] @ coef + G[j, j] * coef[j]
+            new = np.sign(rho) * max(abs(rho) - penalty, 0.0) / G[j, j]
+            max_change = max(max_change, abs(new - coef[j]))
+            coef[j] = new
+        if max_change <= tol * max(1.0, np.abs(coef).max()):
+            break
+    return coef
+
+
+def continue_training(model, X, y, extra_estimators):
+    """
+    Returns a copy of the tree ensemble with extra_estimators trees fitted on the new rows added,
+    or None if the model can't be warm-started (AdaBoost, single trees, KNN).
+    """
+    model = copy.deepcopy(model)
+    wrapped = isinstance(model, EarlyStoppingRegressor)
+    estimator = model.estimator_ if wrapped else model
+    name = type(estimator).__name__
+
+    if name == "XGBRegressor":
+        refreshed = clone(estimator).set_params(n_estimators=extra_estimators, early_stopping_rounds=None)
+        refreshed.fit(X, y, xgb_model=estimator.get_booster(), verbose=False)
+    elif name == "CatBoostRegressor":
+        refreshed = clone(estimator).set_params(iterations=extra_estimators)
+        refreshed.fit(X, y, init_model=estimator, verbose=False)
+    elif "warm_start" in estimator.get_params():
+        # Random Forest / Gradient Boosting keep their trees and only fit the new ones
+        refreshed = estimator
+        refreshed.set_params(warm_start=True, n_estimators=estimator.n_estimators + extra_estimators)
+        refreshed.fit(X, y)
+    else:
+        return None
+
+    if wrapped:
+        model.estimator_ = refreshed
+        return model
+    return refreshed
+
+
+class IncrementalTrainer:
+    """
+    Refreshes the current model with new readings instead of running the full search again.
+    Linear models are re-solved from running aggregates of all their training rows, with the
+    scaler updated the same way (partial_fit). Tree ensembles keep the scaler, since their
+    split thresholds are in its units, and grow extra trees on the new rows. The result
+    replaces the current artifacts only if it holds up on the held-out set.
+    The imputer medians and the outlier bounds stay as fitted by the last full training:
+    medians and quartiles can't be merged from running aggregates. Every row, old and new, goes
+    through those same frozen steps, so the linear models are still exactly a refit on all rows
+    given that preprocessing, but it drifts from a full retraining as the data moves; run one
+    from time to time to refit them.
+    """
+    def __init__(self):
+        self.incremental_trainer_config=IncrementalTrainerConfig()
+
+    @staticmethod
+    def prepare(df, preprocessor):
+        # the columns the preprocessor was fitted on, and the target
+        if 'Sample_taken' in df.columns:
+            df = df[df['Sample_taken'] == 'Sampled']
+        df = df.dropna(subset=[TARGET_COLUMN])
+        return df[list(preprocessor.feature_names_in_)], df[TARGET_COLUMN].to_numpy(dtype=np.float64)
+
+    def load_training_stats(self, preprocessor):
+        config = self.incremental_trainer_config
+        preprocessor_sha256 = file_sha256(config.preprocessor_path)
+        if os.path.exists(config.training_stats_path):
+            stats = load_object(config.training_stats_path)
+            if stats.preprocessor_sha256 == preprocessor_sha256:
+                return stats
+
+        # First refresh after a full training: one pass over its training rows
+        logging.info(f"Computing the running aggregates from {config.train_data_path}")
+        X_train, y_train = self.prepare(read_table(config.train_data_path), preprocessor)
+        _, num_pipeline, columns = preprocessor.transformers_[0]
+        stats = TrainingStats(len(columns) + 1)
+        stats.update(num_pipeline[:-1].transform(X_train[columns]), y_train)
+        stats.preprocessor_sha256 = preprocessor_sha256
+        return stats
+
+    @timed("incremental_training")
+    def refresh(self, new_data_path):
+        try:
+            config = self.incremental_trainer_config
+            start = time.perf_counter()
+            model = load_object(config.model_path)
+            preprocessor = load_object(config.preprocessor_path)
+            if not is_batch_independent(preprocessor):
+                raise ValueError("The preprocessor replaces outliers with the batch median, "
+                                 "run a full training before refreshing it incrementally")
+            _, num_pipeline, columns = preprocessor.transformers_[0]
+            if set(columns) & set(FeatureStore().feature_names):
+                raise ValueError("Forecasting models need a full training to be refreshed")
+
+            stats = self.load_training_stats(preprocessor)
+            new_data_sha256 = file_sha256(new_data_path)
+            if new_data_sha256 in stats.files:
+                logging.info(f"{new_data_path} was already trained on, skipping it")
+                return {"promoted": False, "reason": "already trained on"}
+
+            X_new, y_new = self.prepare(read_table(new_data_path), preprocessor)
+            if not len(y_new):
+                return {"promoted": False, "reason": "no sampled readings"}
+            Z_new = num_pipeline[:-1].transform(X_new[columns])
+
+            candidate_preprocessor = copy.deepcopy(preprocessor)
+            estimator = model.estimator_ if isinstance(model, EarlyStoppingRegressor) else model
+            model_name = type(estimator).__name__
+            if model_name in LINEAR_MODELS:
+                scaler = candidate_preprocessor.transformers_[0][1][-1]
+                scaler.partial_fit(Z_new)
+                candidate_stats = copy.deepcopy(stats)
+                candidate_stats.update(Z_new, y_new)
+                candidate = candidate_stats.solve_linear(model, scaler)
+            else:
+                candidate = continue_training(model, num_pipeline[-1].transform(Z_new), y_new,
+                                              config.extra_estimators)
+                if candidate is None:
+                    raise ValueError(f"{model_name} can't be refreshed incrementally, run a full training")
+                candidate_stats = copy.deepcopy(stats)
+                candidate_stats.update(Z_new, y_new)
+
+            # Promotion gate: both versions on the same held-out rows
+            X_test, y_test = self.prepare(read_table(config.test_data_path), preprocessor)
+            current_score = r2_score(y_test, model.predict(preprocessor.transform(X_test)))
+            candidate_score = r2_score(y_test, candidate.predict(candidate_preprocessor.transform(X_test)))
+            promoted = candidate_score >= max(current_score - config.max_score_drop, config.min_score)
+            logging.info(f"Refreshed {model_name} on {len(y_new)} new readings: held-out R2 "
+                         f"{candidate_score:.4f} vs {current_score:.4f}, {'promoted' if promoted else 'kept the current model'}")
+
+            if promoted:
+                self.save(candidate, candidate_preprocessor, preprocessor, X_test)
+                candidate_stats.files.append(new_data_sha256)
+                candidate_stats.preprocessor_sha256 = file_sha256(config.preprocessor_path)
+                save_object(config.training_stats_path, candidate_stats)
+
+            return {
+                "model": model_name,
+                "new_rows": len(y_new),
+                "current_score": current_score,
+                "candidate_score": candidate_score,
+                "promoted": promoted,
+                "seconds": time.perf_counter() - start,
+            }
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def save(self, model, preprocessor, previous_preprocessor, X_test):
+        config = self.incremental_trainer_config
+        preprocessor_changed = (preprocessor.transformers_[0][1][-1].n_samples_seen_
+                                != previous_preprocessor.transformers_[0][1][-1].n_samples_seen_)
+
+        # Both pickles are written in full first and swapped in under the exclusive lock, which servers
+        # share while they load them, so none pairs the new scaler with the old coefficients (or the other way round)
+        save_object(f"{config.model_path}.new", model)
+        if preprocessor_changed:
+            save_object(f"{config.preprocessor_path}.new", preprocessor)
+        with artifact_lock(config.artifact_lock_path, exclusive=True):
+            if preprocessor_changed:
+                os.replace(f"{config.preprocessor_path}.new", config.preprocessor_path)
+            os.replace(f"{config.model_path}.new", config.model_path)
+
+        # The old exports no longer match the pickles, so they're ignored until replaced here
+        if preprocessor_changed and export_compiled_preprocessor(
+                preprocessor, config.preprocessor_path, config.compiled_preprocessor_dir) is None:
+            shutil.rmtree(config.compiled_preprocessor_dir, ignore_errors=True)
+        if export_compact_model(model, config.model_path, config.compact_model_dir,
+                                preprocessor.transform(X_test)) is None:
+            shutil.rmtree(config.compact_model_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the current model with new readings")
+    parser.add_argument("new_data", help="CSV/Parquet file with the new readings (feature columns and pH)")
+    parser.add_argument("--extra-estimators", type=int, default=32, help="trees added to forests and boosting models")
+    parser.add_argument("--max-score-drop", type=float, default=0.0, help="allowed drop of the held-out R2")
+    args = parser.parse_args()
+
+    trainer = IncrementalTrainer()
+    trainer.incremental_trainer_config.extra_estimators = args.extra_estimators
+    trainer.incremental_trainer_config.max_score_drop = args.max_score_drop
+    print(trainer.refresh(args.new_data))
@@ -1,7 +1,12 @@
 import os
 import sys
+import json
+import shutil
+import hashlib
 from dataclasses import dataclass
+from typing import Optional
 
+import numpy as np
 from catboost import CatBoostRegressor
 from sklearn.ensemble import (
     AdaBoostRegressor,
@@ -18,7 +23,16 @@ from xgboost import XGBRegressor
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 from src.exception import CustomException
 from src.logger import logging
-from src.utils import save_object, evaluate_models
+from src import utils
+from src.utils import (save_object, load_object, evaluate_models, EarlyStoppingRegressor, load_array,
+                       profile_model, predict_latency, pareto_front)
+from src.artifacts import file_sha256
+from src.pipeline.compact_model import export_compact_model, build_compact_model
+from src.pipeline.drift_monitor import set_prediction_reference
+from src.metrics import timed, stage_seconds
+
+# model families whose number of trees can be picked by early stopping
+BOOSTING_MODELS=["Gradient Boosting","XGBRegressor","CatBoosting Regressor","AdaBoost Regressor"]
 
 
 # @dataclass decorator , because inside any traditional class, to define the class variables you basically use _init_,  
@@ -26,13 +40,246 @@ from src.utils import save_object, evaluate_models
 @dataclass
 class ModelTrainerConfig:
     trained_model_file_path=os.path.join("artifacts","model.pkl")
+    # compact inference export of the best model, served by PredictPipeline when present
+    export_compact_model: bool=True
+    compact_model_dir: str=os.path.join("artifacts","compact_model")
+    # workers for the hyperparameter search (-1 uses every core), and the seed that makes runs reproducible
+    n_jobs: int=-1
+    random_state: int=42
+    # "grid", "random" (n_iter sampled combinations) or "halving" (successive halving over training rows)
+    search_strategy: str="grid"
+    n_iter: int=10
+    halving_factor: int=3
+    # wall-clock budgets in seconds, None means no limit
+    model_time_budget: Optional[float]=None
+    total_time_budget: Optional[float]=None
+    # pick the number of trees of the boosting models on a held-out fold instead of gridding it
+    early_stopping: bool=False
+    max_iterations: int=256
+    early_stopping_patience: int=20
+    validation_fraction: float=0.2
+    # memoize each model's search result in this directory, so only models whose data, params,
+    # grid or search settings changed are searched again (None to always search everything)
+    search_cache_dir: Optional[str]=None
+    # serving budgets: the winner is the best test R2 among the models whose single-row predict
+    # takes at most max_latency_ms and whose pickle is at most max_model_size_mb (None means no limit)
+    max_latency_ms: Optional[float]=None
+    max_model_size_mb: Optional[float]=None
+    # of the models within score_tolerance of that best test R2, the fastest one wins
+    score_tolerance: float=0.0
+    # repeats of the timed single-row predict, and rows of the timed batch predict
+    profile_repeats: int=50
+    profile_batch_size: int=1000
+    # latency, size and load time of every candidate and of the served model, for capacity planning
+    model_profile_path: str=os.path.join("artifacts","model_profile.json")
+    # saved by DataTransformation, gets the bins of the best model's predictions on the training rows
+    drift_reference_path: str=os.path.join("artifacts","drift_reference.json")
+
+
+def array_sha256(*arrays):
+    digest=hashlib.sha256()
+    for arr in arrays:
+        arr=np.ascontiguousarray(arr)
+        digest.update(f"{arr.dtype.str}{arr.shape}".encode())
+        digest.update(arr.data)
+    return digest.hexdigest()
+
 
 class ModelTrainer:
     def __init__(self):
         self.model_trainer_config=ModelTrainerConfig()
 
+    def get_models_and_params(self):
+        """
+        Returns the candidate models and their hyperparameter grids, keyed by model name.
+        """
+        models = {
+            "Random Forest": RandomForestRegressor(),
+            "Lasso": Lasso(),
+            "Ridge": Ridge(),
+            "Decision Tree": DecisionTreeRegressor(),
+            "Gradient Boosting": GradientBoostingRegressor(),
+            "Linear Regression": LinearRegression(),
+            "XGBRegressor": XGBRegressor(),
+            "CatBoosting Regressor": CatBoostRegressor(verbose=False),
+            "AdaBoost Regressor": AdaBoostRegressor(),
+        }
+
+        params={
+            "Decision Tree": {
+                'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
+            },
+            "Random Forest":{
+                'n_estimators': [8,16,32,64,128,256]
+            },
+            "Gradient Boosting":{
+                'learning_rate':[.1,.01,.05,.001],
+                'subsample':[0.6,0.7,0.75,0.8,0.85,0.9],
+                'n_estimators': [8,16,32,64,128,256]
+            },
+            "Linear Regression":{},
+            "Lasso":{},
+            "Ridge":{},
+            "XGBRegressor":{
+                'learning_rate':[.1,.01,.05,.001],
+                'n_estimators': [8,16,32,64,128,256]
+            },
+            "CatBoosting Regressor":{
+                'depth': [6,8,10],
+                'learning_rate': [0.01, 0.05, 0.1],
+                'iterations': [30, 50, 100]
+            },
+            "AdaBoost Regressor":{
+                'learning_rate':[.1,.01,0.5,.001],
+                'n_estimators': [8,16,32,64,128,256]
+            }                
+        }
+
+        if self.model_trainer_config.early_stopping:
+            # The number of trees comes from early stopping, so it drops out of the grid
+            for model_name in BOOSTING_MODELS:
+                models[model_name]=EarlyStoppingRegressor(
+                    models[model_name],
+                    max_iterations=self.model_trainer_config.max_iterations,
+                    patience=self.model_trainer_config.early_stopping_patience,
+                    validation_fraction=self.model_trainer_config.validation_fraction,
+                )
+                params[model_name]={
+                    f"estimator__{name}":values for name,values in params[model_name].items()
+                    if name not in ("n_estimators","iterations")
+                }
+
+        return models,params
+
+    def search_cache_key(self,model_name,model,param,data_sha256):
+        """
+        Everything a model's search result depends on: the data, the model and its grid,
+        the search settings and the search code itself.
+        """
+        config=self.model_trainer_config
+        key={
+            "model_name":model_name,
+            "estimator":type(model).__name__,
+            "params":model.get_params(),
+            "grid":param,
+            "search":[config.search_strategy,config.n_iter,config.halving_factor,config.random_state],
+            "data":data_sha256,
+            "code":file_sha256(utils.__file__),
+        }
+        # nested estimators are already covered by their params, so only their type goes in
+        key=json.dumps(key,sort_keys=True,default=lambda obj: type(obj).__name__)
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def evaluate_models_cached(self,X_train,y_train,X_test,y_test,models,params):
+        """
+        evaluate_models, with the results of models searched before on the same data,
+        params and settings read from search_cache_dir instead of searched again.
+        """
+        config=self.model_trainer_config
+        # a search cut short by a time budget isn't the result of the full grid, so it's never cached
+        use_cache=(config.search_cache_dir is not None and config.model_time_budget is None
+                   and config.total_time_budget is None)
+        cached_report={}
+        cache_paths={}
+        if use_cache:
+            data_sha256=array_sha256(X_train,y_train,X_test,y_test)
+            for model_name,model in models.items():
+                cache_paths[model_name]=os.path.join(config.search_cache_dir,
+                    f"{self.search_cache_key(model_name,model,params[model_name],data_sha256)}.pkl")
+                if os.path.exists(cache_paths[model_name]):
+                    cached_report[model_name]={**load_object(cache_paths[model_name]),"cached":True}
+                    logging.info(f"{model_name}: search result read from the cache")
+
+        to_search=[model_name for model_name in models if model_name not in cached_report]
+        model_report=evaluate_models(X_train=X_train,y_train=y_train,
+                                     X_test=X_test,y_test=y_test,
+                                     models={name:models[name] for name in to_search},
+                                     param={name:params[name] for name in to_search},
+                                     n_jobs=config.n_jobs,
+                                     random_state=config.random_state,
+                                     search_strategy=config.search_strategy,
+                                     n_iter=config.n_iter,
+                                     halving_factor=config.halving_factor,
+                                     model_time_budget=config.model_time_budget,
+                                     total_time_budget=config.total_time_budget
+                                     ) if to_search else {}
+        if use_cache:
+            for model_name,report in model_report.items():
+                save_object(cache_paths[model_name],report)
+
+        # same order as models, whichever way each result was obtained
+        return {name:(cached_report.get(name) or model_report[name]) for name in models
+                if name in cached_report or name in model_report}
+
+    def within_budget(self,profile):
+        config=self.model_trainer_config
+        return ((config.max_latency_ms is None or profile["single_row_ms"]<=config.max_latency_ms)
+                and (config.max_model_size_mb is None or profile["size_bytes"]<=config.max_model_size_mb*1e6))
+
+    def select_model(self,model_report):
+        """
+        Picks the model to serve: the best test R2 among the candidates within the latency and
+        size budgets, or the fastest of those within score_tolerance of it.
+        """
+        eligible=[name for name,report in model_report.items() if self.within_budget(report["profile"])]
+        if not eligible:
+            raise ValueError("No model is within the latency/size budget, "
+                             "see max_latency_ms and max_model_size_mb in ModelTrainerConfig")
+        best_score=max(model_report[name]["test_score"] for name in eligible)
+        tolerance=self.model_trainer_config.score_tolerance
+        close=[name for name in eligible if model_report[name]["test_score"]>=best_score-tolerance]
+        return min(close,key=lambda name: model_report[name]["profile"]["single_row_ms"])
+
+    def save_model_profile(self,model_report,best_model_name,compact_manifest,X_test):
+        """
+        Writes the profile of every candidate, which of them are on the Pareto front of test R2,
+        single-row latency and size, and the latency of the model as it is served.
+        """
+        config=self.model_trainer_config
+        candidates={name:{"test_score":report["test_score"],**report["profile"],
+                          "within_budget":self.within_budget(report["profile"])}
+                    for name,report in model_report.items()}
+        front=pareto_front(candidates)
+        for name in candidates:
+            candidates[name]["pareto_optimal"]=name in front
+            logging.info(f"{name}: test r2 {candidates[name]['test_score']:.4f}, "
+                         f"single row {candidates[name]['single_row_ms']:.3f}ms, "
+                         f"{candidates[name]['rows_per_second']:.0f} rows/s, {candidates[name]['size_bytes']/1e6:.2f}MB, "
+                         f"load {candidates[name]['load_ms']:.1f}ms{', pareto optimal' if name in front else ''}")
+
+        # PredictPipeline serves the compact export when there is one, which is usually faster than the pickle
+        if compact_manifest is not None:
+            compact_model=build_compact_model(config.compact_model_dir,compact_manifest)
+            served={"format":"compact",
+                    **predict_latency(compact_model,X_test,config.profile_repeats,config.profile_batch_size),
+                    "size_bytes":sum(entry.stat().st_size for entry in os.scandir(config.compact_model_dir))}
+        else:
+            served={"format":"pickle",**model_report[best_model_name]["profile"]}
+
+        profile={
+            "selected":best_model_name,
+            "model_sha256":file_sha256(config.trained_model_file_path),
+            "policy":{"max_latency_ms":config.max_latency_ms,"max_model_size_mb":config.max_model_size_mb,
+                      "score_tolerance":config.score_tolerance},
+            "served":served,
+            "pareto_front":front,
+            "candidates":candidates,
+        }
+        os.makedirs(os.path.dirname(config.model_profile_path),exist_ok=True)
+        with open(f"{config.model_profile_path}.tmp","w") as file_obj:
+            json.dump(profile,file_obj,indent=2)
+        os.replace(f"{config.model_profile_path}.tmp",config.model_profile_path)
+        return profile
+
+    @timed("model_trainer")
     def initiate_model_trainer(self,train_array,test_array):
         try:   
+            # Arrays saved by DataTransformation can be passed as .npy paths and are memory-mapped
+            if isinstance(train_array,str):
+                train_array=load_array(train_array)
+            if isinstance(test_array,str):
+                test_array=load_array(test_array)
+
             logging.info("Split training and test input data")
             X_train,y_train,X_test,y_test=(
                 train_array[:,:-1], # Selects all columns except the last one
@@ -41,70 +288,44 @@ class ModelTrainer:
                 test_array[:,-1] # Selects only the last column
             )
 
-            models = {
-                "Random Forest": RandomForestRegressor(),
-                "Lasso": Lasso(),
-                "Ridge": Ridge(),
-                "Decision Tree": DecisionTreeRegressor(),
-                "Gradient Boosting": GradientBoostingRegressor(),
-                "Linear Regression": LinearRegression(),
-                "XGBRegressor": XGBRegressor(),
-                "CatBoosting Regressor": CatBoostRegressor(verbose=False),
-                "AdaBoost Regressor": AdaBoostRegressor(),
-            }
-
-            params={
-                "Decision Tree": {
-                    'criterion':['squared_error', 'friedman_mse', 'absolute_error', 'poisson'],
-                },
-                "Random Forest":{
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "Gradient Boosting":{
-                    'learning_rate':[.1,.01,.05,.001],
-                    'subsample':[0.6,0.7,0.75,0.8,0.85,0.9],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "Linear Regression":{},
-                "Lasso":{},
-                "Ridge":{},
-                "XGBRegressor":{
-                    'learning_rate':[.1,.01,.05,.001],
-                    'n_estimators': [8,16,32,64,128,256]
-                },
-                "CatBoosting Regressor":{
-                    'depth': [6,8,10],
-                    'learning_rate': [0.01, 0.05, 0.1],
-                    'iterations': [30, 50, 100]
-                },
-                "AdaBoost Regressor":{
-                    'learning_rate':[.1,.01,0.5,.001],
-                    'n_estimators': [8,16,32,64,128,256]
-                }                
-            }
-
-            model_report:dict=evaluate_models(X_train=X_train,y_train=y_train,
-                                              X_test=X_test,y_test=y_test,
-                                             models=models,param=params 
-                                             )
-
-            # To get best model score from dict
-            best_model_score = max(sorted(model_report.values()))
-
-            # To get best model name from dict
-            best_model_name = list(model_report.keys())[
-                list(model_report.values()).index(best_model_score)
-            ]
-
-            best_model = models[best_model_name]            
+            models,params=self.get_models_and_params()
+
+            model_report:dict=self.evaluate_models_cached(X_train,y_train,X_test,y_test,models,params)
+
+            for model_name,report in model_report.items():
+                if report.get("cached"):
+                    continue
+                stage_seconds.observe(report["fit_time"],stage=f"model_search:{model_name}")
+
+            # Serving cost of every candidate, on the transformed test rows (the preprocessor costs the same for all)
+            with timed("model_profiling"):
+                for model_name,report in model_report.items():
+                    report["profile"]=profile_model(report["model"],X_test,
+                                                    n_repeats=self.model_trainer_config.profile_repeats,
+                                                    batch_size=self.model_trainer_config.profile_batch_size)
+
+            # To get best model name and score from dict
+            best_model_name = self.select_model(model_report)
+            best_model_score = model_report[best_model_name]["test_score"]
+
+            best_model = model_report[best_model_name]["model"]            
             if best_model_score<0.7:
                 raise CustomException("No best model found")
-            logging.info(f"Best found model on both training and testing dataset")
+            logging.info(f"Best found model on both training and testing dataset: {best_model_name}")
 
+            # Remove the previous export first so it is never served next to the new pickle
+            shutil.rmtree(self.model_trainer_config.compact_model_dir,ignore_errors=True)
             save_object(
                 file_path=self.model_trainer_config.trained_model_file_path,
                 obj=best_model
             )
+            compact_manifest=None
+            if self.model_trainer_config.export_compact_model:
+                compact_manifest=export_compact_model(best_model,self.model_trainer_config.trained_model_file_path,
+                                                      self.model_trainer_config.compact_model_dir,X_test)
+            self.save_model_profile(model_report,best_model_name,compact_manifest,X_test)
+            if os.path.exists(self.model_trainer_config.drift_reference_path):
+                set_prediction_reference(self.model_trainer_config.drift_reference_path,best_model.predict(X_train))
 
             predicted=best_model.predict(X_test)
             r2_square = r2_score(y_test, predicted)
@@ -5,18 +5,35 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.logger import logging
 
-def error_message_detail(error,error_detail:sys):
+def error_location(error_detail:sys):
     _,_,exc_tb=error_detail.exc_info()
-    file_name=exc_tb.tb_frame.f_code.co_filename
+    if exc_tb is None:
+        return None,None
+    return exc_tb.tb_frame.f_code.co_filename,exc_tb.tb_lineno
+
+def error_message_detail(error,error_detail:sys):
+    file_name,line_number=error_location(error_detail)
+    return format_error_message(file_name,line_number,error)
+
+def format_error_message(file_name,line_number,error):
     error_message="Error occured in python script name [{0}] line number [{1}] error message[{2}]".format(
-     file_name,exc_tb.tb_lineno,str(error))
+     file_name,line_number,str(error))
 
     return error_message
 
 class CustomException(Exception):
     def __init__(self,error_message,error_detail:sys):
         super().__init__(error_message)
-        self.error_message=error_message_detail(error_message,error_detail=error_detail)
+        # only the location is captured here, the message is built when it's first needed,
+        # so exceptions that are caught and handled (or re-wrapped) don't pay for the string formatting
+        self.file_name,self.line_number=error_location(error_detail)
+        self._error_message=None
+
+    @property
+    def error_message(self):
+        if self._error_message is None:
+            self._error_message=format_error_message(self.file_name,self.line_number,self.args[0])
+        return self._error_message
     
     def __str__(self):
         return self.error_message
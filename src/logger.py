@@ -1,27 +1,252 @@
 import logging
+import logging.handlers
 import os
-from datetime import datetime
-import numpy as np
+import copy
+import json
+import queue
+import atexit
+import threading
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:
+    # no flock on Windows, rotation there is only safe with a single process writing the file
+    fcntl = None
 
 LOG_FILE = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
 
 # Define the directory where logs will be saved
 logs_dir = os.path.join(os.getcwd(), "logs")
 
-# Create the directory if it doesn't exist
-os.makedirs(logs_dir, exist_ok=True)
+# Define the full path for the log file (PH_LOG_FILE to use a fixed file instead of one per start)
+LOG_FILE_PATH = os.environ.get("PH_LOG_FILE") or os.path.join(logs_dir, LOG_FILE)
+
+# Settings, all from the environment:
+#   PH_LOG_ASYNC        "1" (default) writes log files on a background thread, "0" on the caller's thread
+#   PH_LOG_FORMAT       "text" (default) or "json" for one JSON object per line
+#   PH_LOG_MAX_BYTES    rotate the file at this size (default 10 MB), 0 to never rotate by size
+#   PH_LOG_BACKUP_COUNT rotated files to keep (default 5)
+#   PH_LOG_ROTATE_WHEN  rotate by time instead, e.g. "midnight" or "H" (see TimedRotatingFileHandler)
+#   PH_LOG_SAMPLE_RATE  fraction of request logs to keep (default 1.0), warnings and errors are always kept
+#   PH_LOG_EXTERNAL_ROTATION "1" to never rotate in the process and reopen the file when something else
+#                       (logrotate) moves it
+# Every process of the server (gunicorn master and workers) appends to the same file, and the rotation
+# is coordinated through a lock file next to it (see SharedRotationMixin)
+LOG_ASYNC = os.environ.get("PH_LOG_ASYNC", "1") == "1"
+LOG_FORMAT = os.environ.get("PH_LOG_FORMAT", "text")
+LOG_MAX_BYTES = int(os.environ.get("PH_LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("PH_LOG_BACKUP_COUNT", 5))
+LOG_ROTATE_WHEN = os.environ.get("PH_LOG_ROTATE_WHEN")
+LOG_SAMPLE_RATE = float(os.environ.get("PH_LOG_SAMPLE_RATE", 1.0))
+LOG_EXTERNAL_ROTATION = os.environ.get("PH_LOG_EXTERNAL_ROTATION") == "1"
+
+TEXT_FORMAT = "[ %(asctime)s ] Line no.: %(lineno)d, %(name)s - %(levelname)s - %(message)s"
+
+# attributes every LogRecord has, anything else was passed with extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class LazyFileMixin:
+    """
+    Creates the logs directory and the log file on the first record instead of on import,
+    so processes that never log (e.g. an idle inference worker) don't leave empty files behind.
+    """
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class SharedRotationMixin:
+    """
+    Lets several processes append to and rotate the same file. Each record is written under an
+    flock on "<file>.lock"; the process that finds the file due rotates it, and the others see
+    that the file they hold was moved away and reopen it instead of rotating it again.
+    """
+    def emit(self, record):
+        if fcntl is None:
+            return super().emit(record)
+        lock_path = f"{self.baseFilename}.lock"
+        try:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        # opened for every record: a descriptor inherited over a fork would share the lock with the parent
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            self._lock_fd = fd
+            self.follow_rotation()
+            super().emit(record)
+        finally:
+            self._lock_fd = None
+            os.close(fd)
+
+    def follow_rotation(self):
+        # rotated by another process: the open stream is the backup now, write to the new file
+        if self.stream is None:
+            return
+        try:
+            stat = os.stat(self.baseFilename)
+            current = os.fstat(self.stream.fileno())
+            moved = (stat.st_dev, stat.st_ino) != (current.st_dev, current.st_ino)
+        except FileNotFoundError:
+            moved = True
+        if moved:
+            self.stream.close()
+            # opened again by emit
+            self.stream = None
+
+
+class LazyRotatingFileHandler(SharedRotationMixin, LazyFileMixin, logging.handlers.RotatingFileHandler):
+    # shouldRollover seeks to the end of the file, so the size is the shared one, not this process's writes
+    pass
+
+
+class LazyTimedRotatingFileHandler(SharedRotationMixin, LazyFileMixin, logging.handlers.TimedRotatingFileHandler):
+    """
+    The next rollover time is kept in the lock file, so once a process has rotated, the others
+    move on to the next interval instead of rotating (and removing) that interval's backup again.
+    """
+    def follow_rotation(self):
+        if self._lock_fd is not None:
+            shared = os.pread(self._lock_fd, 32, 0)
+            if shared and float(shared) > self.rolloverAt:
+                self.rolloverAt = float(shared)
+        super().follow_rotation()
+
+    def doRollover(self):
+        super().doRollover()
+        if self._lock_fd is not None:
+            os.ftruncate(self._lock_fd, 0)
+            os.pwrite(self._lock_fd, str(self.rolloverAt).encode(), 0)
+
+
+class LazyWatchedFileHandler(LazyFileMixin, logging.handlers.WatchedFileHandler):
+    pass
 
-# Define the full path for the log file
-LOG_FILE_PATH = os.path.join(logs_dir, LOG_FILE)
 
+class JsonFormatter(logging.Formatter):
+    """
+    One compact JSON object per line, with the fields passed through extra={...} at the top level.
+    """
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "line": f"{record.module}:{record.lineno}",
+            "msg": record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every 1/rate records below WARNING. Counting instead of drawing random
+    numbers keeps the sampled volume exact and the filter cheap.
+    """
+    def __init__(self, rate):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if not self.every:
+            return False
+        with self._lock:
+            self._count += 1
+            return (self._count - 1) % self.every == 0
+
+
+class PreparedQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Merge the args into the message and render the traceback while it still exists,
+        # but leave the formatting itself to the file handler on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def make_file_handler():
+    if LOG_EXTERNAL_ROTATION:
+        # every process appends to the same file, and reopens it once logrotate has moved it away
+        handler = LazyWatchedFileHandler(LOG_FILE_PATH, delay=True)
+    elif LOG_ROTATE_WHEN:
+        handler = LazyTimedRotatingFileHandler(LOG_FILE_PATH, when=LOG_ROTATE_WHEN,
+                                               backupCount=LOG_BACKUP_COUNT, delay=True)
+    else:
+        handler = LazyRotatingFileHandler(LOG_FILE_PATH, maxBytes=LOG_MAX_BYTES,
+                                          backupCount=LOG_BACKUP_COUNT, delay=True)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+class AsyncLogging:
+    """
+    Callers only put records on a queue; a QueueListener thread formats and writes them.
+    The thread is stopped (and the queue drained) before a fork, so the child never inherits
+    a half-written file buffer, and restarted in both processes afterwards.
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = PreparedQueueHandler(self.queue)
+        self.listener = None
+        self.start()
+        atexit.register(self.stop)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(before=self.stop, after_in_parent=self.start, after_in_child=self._start_in_child)
+
+    def start(self):
+        self.listener = logging.handlers.QueueListener(self.queue, self.handler, respect_handler_level=True)
+        self.listener.start()
+
+    def _start_in_child(self):
+        # records queued by other threads during the fork are the parent's to write
+        self.queue = queue.SimpleQueue()
+        self.queue_handler.queue = self.queue
+        self.start()
+
+    def stop(self):
+        # flushes every queued record before the process exits
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+        self.handler.flush()
+
+
+file_handler = make_file_handler()
+if LOG_ASYNC:
+    async_logging = AsyncLogging(file_handler)
+    root_handler = async_logging.queue_handler
+else:
+    async_logging = None
+    root_handler = file_handler
 
 # Configure logging
 logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format="[ %(asctime)s ] Line no.: %(lineno)d, %(name)s - %(levelname)s - %(message)s",
+    handlers=[root_handler],
     level=logging.INFO,
 )
 
+# Per-request logs go through this logger, so under heavy traffic only a sample of them is written
+request_logger = logging.getLogger("ph.requests")
+request_logger.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
 
 if __name__ == "__main__":
-    logging.info("Logging has Started") 
\ No newline at end of file
+    logging.info("Logging has Started")
@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+from contextlib import ContextDecorator
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.exception import CustomException
+
+# print DataFrames and intermediate arrays on the request path (PH_DEBUG=1), off in production
+DEBUG=os.environ.get("PH_DEBUG")=="1"
+
+# Under a multi-process server every process saves its metrics to <PH_METRICS_DIR>/<pid>.json
+# (gunicorn.conf.py sets it), so whichever worker answers /metrics can serve all of them
+def metrics_dir():
+    return os.environ.get("PH_METRICS_DIR")
+
+# upper bounds in seconds, from sub-millisecond transforms up to full training runs
+LATENCY_BUCKETS=(0.0001,0.00025,0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0,30.0,60.0,300.0,900.0)
+
+
+def debug_print(*args):
+    if DEBUG:
+        print(*args)
+
+
+def _label_str(label_names,label_values):
+    if not label_names:
+        return ""
+    pairs=",".join(f'{name}="{value}"' for name,value in zip(label_names,label_values))
+    return "{"+pairs+"}"
+
+
+class Metric:
+    """
+    Base class: one metric name with a value per combination of label values.
+    """
+    kind=None
+
+    def __init__(self,name,documentation,labels=()):
+        self.name=name
+        self.documentation=documentation
+        self.label_names=tuple(labels)
+        self._values={}
+        self._lock=threading.Lock()
+
+    def _key(self,labels):
+        if set(labels)!=set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}",f"# TYPE {self.name} {self.kind}"]
+
+    def render(self,values=None,extra_labels=()):
+        """
+        The header and samples of the metric, from values ({label values: value}, this process's
+        own by default) with the extra_labels ((name, value) pairs, e.g. the pid) added to every series.
+        """
+        return self.header()+self.samples(values,extra_labels)
+
+    def samples(self,values=None,extra_labels=()):
+        if values is None:
+            with self._lock:
+                values=dict(self._values)
+        label_names=self.label_names+tuple(name for name,_ in extra_labels)
+        extra=tuple(str(value) for _,value in extra_labels)
+        lines=[]
+        for key,value in sorted(values.items()):
+            lines.extend(self._render_value(label_names,key+extra,value))
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            values=[[list(key),value] for key,value in self._values.items()]
+        return {"kind":self.kind,"documentation":self.documentation,"labels":list(self.label_names),"values":values}
+
+    def _render_value(self,label_names,key,value):
+        return [f"{self.name}{_label_str(label_names,key)} {value}"]
+
+
+class Counter(Metric):
+    kind="counter"
+
+    def inc(self,amount=1,**labels):
+        key=self._key(labels)
+        with self._lock:
+            self._values[key]=self._values.get(key,0)+amount
+
+
+class Gauge(Metric):
+    kind="gauge"
+
+    def set(self,value,**labels):
+        key=self._key(labels)
+        with self._lock:
+            self._values[key]=value
+
+
+class Histogram(Metric):
+    """
+    Cumulative histogram in the Prometheus layout: per-bucket counts, a sum and a count.
+    """
+    kind="histogram"
+
+    def __init__(self,name,documentation,labels=(),buckets=LATENCY_BUCKETS):
+        super().__init__(name,documentation,labels)
+        self.buckets=tuple(sorted(buckets))
+
+    def observe(self,value,**labels):
+        key=self._key(labels)
+        index=bisect.bisect_left(self.buckets,value)
+        with self._lock:
+            counts,total=self._values.get(key,([0]*(len(self.buckets)+1),0.0))
+            counts[index]+=1
+            self._values[key]=(counts,total+value)
+
+    def snapshot(self):
+        return {**super().snapshot(),"buckets":list(self.buckets)}
+
+    def _render_value(self,label_names,key,value):
+        counts,total=value
+        lines=[]
+        cumulative=0
+        for bound,count in zip([*map(str,self.buckets),"+Inf"],counts):
+            cumulative+=count
+            lines.append(f"{self.name}_bucket{_label_str(label_names+('le',),key+(bound,))} {cumulative}")
+        lines.append(f"{self.name}_sum{_label_str(label_names,key)} {total}")
+        lines.append(f"{self.name}_count{_label_str(label_names,key)} {cumulative}")
+        return lines
+
+
+METRIC_CLASSES={"counter":Counter,"gauge":Gauge,"histogram":Histogram}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics={}
+        self._collectors={}
+        self._lock=threading.Lock()
+
+    def _register(self,metric_class,name,*args,**kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name]=metric_class(name,*args,**kwargs)
+            return self._metrics[name]
+
+    def counter(self,name,documentation,labels=()):
+        return self._register(Counter,name,documentation,labels)
+
+    def gauge(self,name,documentation,labels=()):
+        return self._register(Gauge,name,documentation,labels)
+
+    def histogram(self,name,documentation,labels=(),buckets=LATENCY_BUCKETS):
+        return self._register(Histogram,name,documentation,labels,buckets)
+
+    def collector(self,name,collect):
+        """
+        Registers collect(), called before the metrics are saved for the other processes.
+        It can refresh gauges and returns JSON state of its own, saved under name.
+        """
+        with self._lock:
+            self._collectors[name]=collect
+
+    def collect(self):
+        with self._lock:
+            collectors=dict(self._collectors)
+        return {name:collect() for name,collect in collectors.items()}
+
+    def render(self,pid=None):
+        """
+        All metrics in the Prometheus text exposition format, with a pid label if pid is given.
+        """
+        with self._lock:
+            metrics=list(self._metrics.values())
+        extra_labels=(("pid",pid),) if pid is not None else ()
+        lines=[]
+        for metric in metrics:
+            lines.extend(metric.render(extra_labels=extra_labels))
+        return "\n".join(lines)+"\n"
+
+    def render_processes(self,process_states):
+        """
+        The saved metrics of several processes ({pid: state from save_process}) in one exposition,
+        every series labelled with the pid of its process. Sum them over pid for server-wide totals.
+        """
+        metrics={}
+        for state in process_states.values():
+            for name,snapshot in state["metrics"].items():
+                if name not in metrics:
+                    kwargs={"buckets":snapshot["buckets"]} if snapshot["kind"]=="histogram" else {}
+                    metrics[name]=METRIC_CLASSES[snapshot["kind"]](name,snapshot["documentation"],snapshot["labels"],**kwargs)
+        lines=[]
+        for name,metric in metrics.items():
+            lines.extend(metric.header())
+            for pid,state in sorted(process_states.items()):
+                snapshot=state["metrics"].get(name)
+                if snapshot is not None:
+                    values={tuple(key):value for key,value in snapshot["values"]}
+                    lines.extend(metric.samples(values,extra_labels=(("pid",pid),)))
+        return "\n".join(lines)+"\n"
+
+    def save_process(self,directory):
+        """
+        Saves the metrics of this process, and the state of the collectors, to <directory>/<pid>.json.
+        """
+        try:
+            collected=self.collect()
+            with self._lock:
+                metrics=list(self._metrics.values())
+            state={"metrics":{metric.name:metric.snapshot() for metric in metrics},"collected":collected}
+            os.makedirs(directory,exist_ok=True)
+            file_path=os.path.join(directory,f"{os.getpid()}.json")
+            with open(f"{file_path}.tmp","w") as file_obj:
+                json.dump(state,file_obj)
+            os.replace(f"{file_path}.tmp",file_path)
+
+        except Exception as e:
+            raise CustomException(e,sys)
+
+    def write(self,file_path):
+        # for batch jobs like training, in the node_exporter textfile collector layout
+        try:
+            dir_path=os.path.dirname(file_path)
+            if dir_path:
+                os.makedirs(dir_path,exist_ok=True)
+            tmp_path=f"{file_path}.tmp"
+            with open(tmp_path,"w") as file_obj:
+                file_obj.write(self.render())
+            os.replace(tmp_path,file_path)
+
+        except Exception as e:
+            raise CustomException(e,sys)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid,0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def load_processes(directory):
+    """
+    {pid: saved state} of the live processes in directory. Files of processes that are gone
+    (e.g. workers replaced after a reload) are removed.
+    """
+    states={}
+    for entry in os.scandir(directory):
+        name,ext=os.path.splitext(entry.name)
+        if ext!=".json" or not name.isdigit():
+            continue
+        pid=int(name)
+        if not process_alive(pid):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(entry.path) as file_obj:
+                states[pid]=json.load(file_obj)
+        except (OSError,ValueError):
+            # being replaced, the process is picked up on the next scrape
+            continue
+    return states
+
+
+def start_process_saver(directory,interval):
+    """
+    Saves this process's metrics every interval seconds from a background thread.
+    """
+    def save_periodically():
+        while True:
+            try:
+                registry.save_process(directory)
+            except CustomException:
+                # only delays the numbers until the next save
+                pass
+            time.sleep(interval)
+
+    threading.Thread(target=save_periodically,name="metrics-saver",daemon=True).start()
+
+
+# one registry per process
+registry=MetricsRegistry()
+
+stage_seconds=registry.histogram("ph_stage_duration_seconds","Time spent in each stage of serving and training",labels=("stage",))
+request_seconds=registry.histogram("ph_request_duration_seconds","End-to-end request latency",labels=("endpoint",))
+requests_total=registry.counter("ph_requests_total","Requests served",labels=("endpoint","status"))
+predicted_rows_total=registry.counter("ph_predicted_rows_total","Rows scored by the model")
+
+
+class timed(ContextDecorator):
+    """
+    Records the wall time of a block or function in ph_stage_duration_seconds{stage=...}.
+    Works as `with timed("transform"):` and as `@timed("model_trainer")`.
+    """
+    def __init__(self,stage):
+        self.stage=stage
+
+    def _recreate_cm(self):
+        # a fresh timer per call, so a decorated function can run in several threads at once
+        return timed(self.stage)
+
+    def __enter__(self):
+        self._start=time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        stage_seconds.observe(time.perf_counter()-self._start,stage=self.stage)
+        return False
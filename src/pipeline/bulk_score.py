@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.logger import logging
+from src.artifacts import file_sha256
+from src.utils import read_in_chunks, table_columns
+from src.pipeline.predict_pipeline import PredictPipeline, PredictPipelineConfig, FEATURE_COLUMNS
+
+# leading underscore so Parquet readers skip it when reading the output directory as a dataset
+PROGRESS_FILE = "_progress.json"
+
+
+def part_path(output_dir, chunk_index):
+    return os.path.join(output_dir, f"part-{chunk_index:06d}.parquet")
+
+
+def init_worker():
+    # every worker loads the artifacts once, not once per chunk
+    PredictPipeline().warm_up()
+
+
+def score_chunk(chunk_index, chunk, id_columns, output_dir):
+    """
+    Scores one chunk and writes it as a Parquet part: the id columns, the predicted pH
+    (empty for rows that couldn't be scored) and the error for those rows.
+    Returns (chunk index, rows, rows with errors).
+    """
+    try:
+        rows, preds, errors = PredictPipeline().predict_batch(chunk)
+        predicted = np.full(len(chunk), np.nan)
+        predicted[rows] = preds
+        error = np.full(len(chunk), None, dtype=object)
+        for row, message in errors.items():
+            error[row] = message
+
+        # ids as strings, so every part has the same schema whatever each chunk happened to hold
+        result = chunk[id_columns].astype("string").reset_index(drop=True)
+        result["pH_predicted"] = predicted
+        result["error"] = pd.Series(error, dtype="string")
+
+        # Write to a temporary file and swap it in, so a part on disk is always complete
+        file_path = part_path(output_dir, chunk_index)
+        result.to_parquet(f"{file_path}.tmp", index=False, engine="pyarrow")
+        os.replace(f"{file_path}.tmp", file_path)
+        return chunk_index, len(chunk), len(errors)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+class BulkScorer:
+    """
+    Scores a CSV/Parquet/Excel file of any size chunk by chunk over a process pool.
+    At most 2 chunks per worker are in memory at a time. Finished chunks are recorded in a
+    progress file in the output directory, so a rerun after a crash skips them.
+    """
+    def __init__(self, input_path, output_dir, chunk_size=100000, workers=None,
+                 id_columns=("WP_ID", "Date_Assessment"), restart=False):
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count()
+        self.id_columns = list(id_columns)
+        self.restart = restart
+        self.progress_path = os.path.join(output_dir, PROGRESS_FILE)
+
+    def run_key(self):
+        # a run can only be resumed with the same input, chunking and model
+        config = PredictPipelineConfig()
+        return {
+            "input_path": os.path.abspath(self.input_path),
+            "input_size": os.path.getsize(self.input_path),
+            "input_mtime_ns": os.stat(self.input_path).st_mtime_ns,
+            "chunk_size": self.chunk_size,
+            "id_columns": self.id_columns,
+            "model_sha256": file_sha256(config.model_path),
+            "preprocessor_sha256": file_sha256(config.preprocessor_path),
+        }
+
+    def load_progress(self, run_key):
+        if self.restart or not os.path.exists(self.progress_path):
+            return {"run": run_key, "completed": {}, "done": False}
+        with open(self.progress_path) as file_obj:
+            progress = json.load(file_obj)
+        if progress["run"] != run_key:
+            raise ValueError(f"{self.output_dir} holds a run with a different input, chunk size or model, "
+                             "use --restart to overwrite it")
+        # keep only the chunks whose part actually made it to disk
+        progress["completed"] = {index: counts for index, counts in progress["completed"].items()
+                                 if os.path.exists(part_path(self.output_dir, int(index)))}
+        return progress
+
+    def save_progress(self, progress):
+        with open(f"{self.progress_path}.tmp", "w") as file_obj:
+            json.dump(progress, file_obj, indent=2)
+        os.replace(f"{self.progress_path}.tmp", self.progress_path)
+
+    def run(self):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            if not self.input_path.endswith((".xlsx", ".xlsm")):
+                missing = [c for c in self.id_columns + FEATURE_COLUMNS if c not in table_columns(self.input_path)]
+                if missing:
+                    raise ValueError(f"Missing columns in {self.input_path}: {missing}")
+
+            progress = self.load_progress(self.run_key())
+            if progress["done"]:
+                logging.info(f"Bulk scoring of {self.input_path} already finished")
+                return progress
+            if self.restart:
+                for name in os.listdir(self.output_dir):
+                    if name.startswith("part-"):
+                        os.remove(os.path.join(self.output_dir, name))
+
+            completed = progress["completed"]
+            n_rows = n_errors = 0
+            start = time.perf_counter()
+            columns = self.id_columns + FEATURE_COLUMNS
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as executor:
+                pending = set()
+                for chunk_index, chunk in enumerate(read_in_chunks(self.input_path, self.chunk_size, columns=columns)):
+                    if str(chunk_index) in completed:
+                        continue
+                    # bounded number of chunks in flight keeps memory flat
+                    if len(pending) >= 2 * self.workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        n_rows, n_errors = self._record(done, completed, progress, n_rows, n_errors, start)
+                    pending.add(executor.submit(score_chunk, chunk_index, chunk, self.id_columns, self.output_dir))
+                done, _ = wait(pending)
+                n_rows, n_errors = self._record(done, completed, progress, n_rows, n_errors, start)
+
+            elapsed = time.perf_counter() - start
+            progress["done"] = True
+            progress["rows"] = sum(counts[0] for counts in completed.values())
+            progress["errors"] = sum(counts[1] for counts in completed.values())
+            self.save_progress(progress)
+            rate = n_rows / elapsed if elapsed else 0.0
+            logging.info(f"Scored {n_rows} rows ({n_errors} errors) in {elapsed:.1f}s, {rate:.0f} rows/s")
+            progress["rows_per_second"] = rate
+            return progress
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _record(self, done, completed, progress, n_rows, n_errors, start):
+        for future in done:
+            chunk_index, rows, errors = future.result()
+            completed[str(chunk_index)] = [rows, errors]
+            n_rows += rows
+            n_errors += errors
+        self.save_progress(progress)
+        elapsed = time.perf_counter() - start
+        print(f"{len(completed)} chunks, {n_rows} rows scored this run, {n_rows / elapsed:.0f} rows/s", flush=True)
+        return n_rows, n_errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a large CSV/Parquet/Excel file with the current model")
+    parser.add_argument("input", help="file with the feature columns and the id columns")
+    parser.add_argument("output_dir", help="directory for the Parquet parts and the progress file")
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=None, help="scoring processes (default: CPU count)")
+    parser.add_argument("--id-columns", nargs="+", default=["WP_ID", "Date_Assessment"])
+    parser.add_argument("--restart", action="store_true", help="discard the progress of a previous run")
+    args = parser.parse_args()
+
+    progress = BulkScorer(args.input, args.output_dir, chunk_size=args.chunk_size, workers=args.workers,
+                          id_columns=args.id_columns, restart=args.restart).run()
+    print(f"{progress.get('rows', 0)} rows, {progress.get('errors', 0)} errors, "
+          f"{progress.get('rows_per_second', 0.0):.0f} rows/s -> {args.output_dir}")
@@ -0,0 +1,387 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+
+import numpy as np
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.logger import logging
+from src.artifacts import file_sha256, file_stamp
+
+# Compact models must match the pickled model within this absolute difference (pH units).
+# Linear models match bit for bit; tree ensembles can differ in the last bits because the
+# per-tree values are summed in a different order than sklearn does.
+DEFAULT_TOLERANCE = 1e-9
+
+# Walking every tree for every row at once holds n_rows x n_trees node indices per level,
+# so large batches are evaluated in row chunks of about this many node indices
+CHUNK_NODES = 1 << 18
+
+MANIFEST_FILE = "manifest.json"
+
+
+class LinearModel:
+    """
+    Evaluator for exported linear models (Linear Regression, Ridge, Lasso).
+    """
+    def __init__(self, coef, intercept):
+        self.coef = coef
+        self.intercept = intercept
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
+
+
+class TreeEnsembleModel:
+    """
+    Evaluator for exported sklearn tree ensembles (Decision Tree, Random Forest, Gradient Boosting).
+    All trees are flattened into one set of node arrays, and every tree is walked
+    for a chunk of rows at once, one tree level per step.
+    """
+    def __init__(self, feature, threshold, children_left, children_right, value, roots, max_depth, aggregate, offset,
+                 chunk_nodes=CHUNK_NODES):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.aggregate = aggregate
+        self.offset = offset
+        self.chunk_nodes = chunk_nodes
+
+    def predict(self, X):
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        chunk_rows = max(1, self.chunk_nodes // len(self.roots))
+        if X.shape[0] <= chunk_rows:
+            return self._predict_rows(X)
+        return np.concatenate([self._predict_rows(X[start:start + chunk_rows]) for start in range(0, X.shape[0], chunk_rows)])
+
+    def _predict_rows(self, X):
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        node = np.repeat(self.roots[np.newaxis, :], X.shape[0], axis=0)
+
+        for _ in range(self.max_depth):
+            feature = self.feature[node]
+            is_leaf = feature < 0
+            go_left = X[rows, np.where(is_leaf, 0, feature)] <= self.threshold[node]
+            node = np.where(is_leaf, node, np.where(go_left, self.children_left[node], self.children_right[node]))
+
+        values = self.value[node]
+        if self.aggregate == "mean":
+            return values.mean(axis=1)
+        return self.offset + values.sum(axis=1)
+
+
+class BoosterModel:
+    """
+    Evaluator for XGBoost and CatBoost models saved in their native binary formats. Only used
+    for the boosters whose trees can't be flattened (e.g. categorical splits or a non-identity
+    objective), since the native libraries load a private copy of the model into every process.
+    """
+    def __init__(self, kind, model_file):
+        self.kind = kind
+        if kind == "xgboost":
+            import xgboost
+
+            self.booster = xgboost.Booster(model_file=model_file)
+        else:
+            from catboost import CatBoost
+
+            self.booster = CatBoost().load_model(model_file, format="cbm")
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.kind == "xgboost":
+            return self.booster.inplace_predict(X)
+        return self.booster.predict(X)
+
+
+def concat_trees(trees):
+    """
+    Concatenates per-tree node arrays (feature, threshold, children_left, children_right, value),
+    with leaves marked by a negative children_left, into one set of arrays with child indices
+    offset so they point into the concatenated arrays. Also returns the deepest tree's depth.
+    """
+    feature, threshold, children_left, children_right, value, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree_feature, tree_threshold, tree_left, tree_right, tree_value in trees:
+        tree_left = np.asarray(tree_left)
+        tree_right = np.asarray(tree_right)
+        is_leaf = tree_left < 0
+        roots.append(offset)
+        feature.append(np.where(is_leaf, -1, tree_feature))
+        threshold.append(tree_threshold)
+        children_left.append(np.where(is_leaf, -1, tree_left + offset))
+        children_right.append(np.where(is_leaf, -1, tree_right + offset))
+        value.append(tree_value)
+        offset += len(tree_left)
+
+        # walk down one level at a time until only leaves are left
+        level = np.array([0])
+        depth = 0
+        while True:
+            level = level[~is_leaf[level]]
+            if len(level) == 0:
+                break
+            level = np.concatenate([tree_left[level], tree_right[level]])
+            depth += 1
+        max_depth = max(max_depth, depth)
+
+    return {
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "children_left": np.concatenate(children_left).astype(np.int32),
+        "children_right": np.concatenate(children_right).astype(np.int32),
+        "value": np.concatenate(value).astype(np.float64),
+        "roots": np.array(roots, dtype=np.int32),
+    }, max_depth
+
+
+def flatten_trees(trees):
+    """
+    Flattens fitted sklearn trees.
+    """
+    return concat_trees(
+        (tree.tree_.feature, tree.tree_.threshold, tree.tree_.children_left, tree.tree_.children_right,
+         tree.tree_.value[:, 0, 0])
+        for tree in trees
+    )
+
+
+def xgboost_trees(model):
+    """
+    Flattens a fitted XGBRegressor. Returns (arrays, max_depth, offset, tolerance), or None for
+    boosters that aren't a plain sum of numeric-split trees.
+    """
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    gradient_booster = learner["gradient_booster"]
+    if gradient_booster["name"] != "gbtree" or learner["objective"]["name"] != "reg:squarederror":
+        return None
+
+    trees = gradient_booster["model"]["trees"]
+    # the sklearn wrapper predicts with the best iteration only when early stopping was used
+    best_iteration = getattr(model, "best_iteration", None)
+    if best_iteration is not None:
+        trees_per_iteration = int(gradient_booster["model"]["gbtree_model_param"]["num_parallel_tree"])
+        trees = trees[:(best_iteration + 1) * trees_per_iteration]
+    if any(any(tree["split_type"]) for tree in trees):
+        return None
+
+    flat = []
+    for tree in trees:
+        # XGBoost goes left when x < split in float32, which is x <= the next float32 down
+        split = np.asarray(tree["split_conditions"], dtype=np.float32)
+        threshold = np.nextafter(split, np.float32(-np.inf))
+        # leaves keep their value in split_conditions
+        flat.append((tree["split_indices"], threshold, tree["left_children"], tree["right_children"], split))
+    arrays, max_depth = concat_trees(flat)
+    # base_score is saved as "[6.77E0]" by XGBoost 3 and as "6.77E0" before
+    offset = float(learner["learner_model_param"]["base_score"].strip("[]"))
+    # XGBoost adds up the tree values in float32, which can round off by up to half a float32 step
+    # of the running sum per tree, so the float64 sum here only matches it within that bound
+    largest_sum = abs(offset) + sum(np.max(np.abs(tree[4])) for tree in flat)
+    tolerance = float(np.finfo(np.float32).eps * (len(flat) + 1) * largest_sum)
+    return arrays, max_depth, offset, tolerance
+
+
+def catboost_trees(model):
+    """
+    Flattens a fitted CatBoostRegressor by expanding its oblivious trees (one split per level)
+    into full binary trees. Returns (arrays, max_depth, offset), or None for models with
+    non-symmetric trees or non-numeric splits.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, "model.json")
+        model.save_model(json_path, format="json")
+        with open(json_path) as file_obj:
+            exported = json.load(file_obj)
+
+    if "oblivious_trees" not in exported:
+        return None
+    flat_index = {info["feature_index"]: info["flat_feature_index"] for info in exported["features_info"]["float_features"]}
+    scale, bias = exported.get("scale_and_bias", [1.0, [0.0]])
+
+    flat = []
+    for tree in exported["oblivious_trees"]:
+        splits = tree.get("splits") or []
+        if any(split["split_type"] != "FloatFeature" for split in splits):
+            return None
+        depth = len(splits)
+        n_nodes = 2 ** (depth + 1) - 1
+        feature = np.full(n_nodes, -1)
+        threshold = np.zeros(n_nodes)
+        children_left = np.full(n_nodes, -1)
+        children_right = np.full(n_nodes, -1)
+        value = np.zeros(n_nodes)
+        # CatBoost sets bit `level` of the leaf index when x > border at that level, so going
+        # right at level l adds 2**l to the position among the next level's nodes
+        for level, split in enumerate(splits):
+            nodes = 2 ** level - 1 + np.arange(2 ** level)
+            feature[nodes] = flat_index[split["float_feature_index"]]
+            threshold[nodes] = split["border"]
+            children_left[nodes] = 2 ** (level + 1) - 1 + np.arange(2 ** level)
+            children_right[nodes] = children_left[nodes] + 2 ** level
+        value[2 ** depth - 1:] = scale * np.asarray(tree["leaf_values"], dtype=np.float64)
+        flat.append((feature, threshold, children_left, children_right, value))
+    arrays, max_depth = concat_trees(flat)
+    return arrays, max_depth, float(np.ravel(bias)[0])
+
+
+def export_candidates(model):
+    """
+    Yields (manifest entries, arrays, native writer) for each compact form of a fitted model,
+    best first. Yields nothing if the model has no compact form.
+    """
+    model_name = type(model).__name__
+
+    if model_name in ("LinearRegression", "Ridge", "Lasso", "ElasticNet"):
+        coef = np.asarray(model.coef_, dtype=np.float64)
+        if coef.ndim == 1:
+            yield {"kind": "linear", "intercept": float(model.intercept_)}, {"coef": coef}, None
+
+    elif model_name in ("DecisionTreeRegressor", "RandomForestRegressor", "ExtraTreesRegressor"):
+        trees = [model] if model_name == "DecisionTreeRegressor" else list(model.estimators_)
+        arrays, max_depth = flatten_trees(trees)
+        yield {"kind": "tree_ensemble", "aggregate": "mean", "offset": 0.0, "max_depth": int(max_depth)}, arrays, None
+
+    elif model_name == "GradientBoostingRegressor":
+        # Only the default mean (DummyRegressor) or zero initial prediction can be stored as one offset
+        if model.init_ == "zero":
+            offset = 0.0
+        elif type(model.init_).__name__ == "DummyRegressor" and model.init_.strategy == "mean":
+            offset = float(np.ravel(model.init_.constant_)[0])
+        else:
+            return
+        arrays, max_depth = flatten_trees(model.estimators_[:, 0])
+        # GradientBoosting adds learning_rate * tree value for each tree, so store the scaled values
+        arrays["value"] = model.learning_rate * arrays["value"]
+        yield {"kind": "tree_ensemble", "aggregate": "sum", "offset": offset, "max_depth": int(max_depth)}, arrays, None
+
+    elif model_name == "XGBRegressor":
+        # Flattened trees are memory-mapped and shared between server processes, the native model isn't
+        flattened = xgboost_trees(model)
+        if flattened is not None:
+            arrays, max_depth, offset, tolerance = flattened
+            yield {"kind": "tree_ensemble", "aggregate": "sum", "offset": offset, "max_depth": int(max_depth),
+                   "tolerance": tolerance}, arrays, None
+        yield {"kind": "xgboost", "model_file": "model.ubj"}, {}, lambda path: model.get_booster().save_model(path)
+
+    elif model_name == "CatBoostRegressor":
+        flattened = catboost_trees(model)
+        if flattened is not None:
+            arrays, max_depth, offset = flattened
+            yield {"kind": "tree_ensemble", "aggregate": "sum", "offset": offset, "max_depth": int(max_depth)}, arrays, None
+        yield {"kind": "catboost", "model_file": "model.cbm"}, {}, lambda path: model.save_model(path, format="cbm")
+
+
+def export_compact_model(model, model_path, export_dir, X_check, tolerance=DEFAULT_TOLERANCE):
+    """
+    Exports the fitted model to export_dir in a compact inference format and checks that it
+    predicts the same as the pickled model on X_check. Returns the manifest, or None (with
+    nothing written) if none of the model's compact forms matches within the tolerance.
+    """
+    try:
+        # Imported here so serving an export doesn't pull in the training code and sklearn
+        from src.utils import EarlyStoppingRegressor
+
+        # Models wrapped for early stopping are exported as the model they wrap
+        if isinstance(model, EarlyStoppingRegressor):
+            model = model.estimator_
+        tmp_dir = f"{export_dir}.tmp"
+        for manifest, arrays, write_native in export_candidates(model):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+            if write_native is not None:
+                write_native(os.path.join(tmp_dir, manifest["model_file"]))
+
+            # some forms can't match more closely than their source model's precision
+            check_tolerance = max(tolerance, manifest.get("tolerance", 0.0))
+            compact_model = build_compact_model(tmp_dir, manifest)
+            max_abs_diff = float(np.max(np.abs(compact_model.predict(X_check) - model.predict(X_check))))
+            if max_abs_diff <= check_tolerance:
+                break
+            logging.warning(f"Compact {manifest['kind']} {type(model).__name__} differs from the pickled model by {max_abs_diff}, not exporting it")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            logging.info(f"No usable compact export for {type(model).__name__}, serving the pickled model")
+            return None
+
+        manifest.update({
+            "source": type(model).__name__,
+            "n_features": int(np.shape(X_check)[1]),
+            "max_abs_diff": max_abs_diff,
+            "tolerance": check_tolerance,
+            # ties the export to the pickle it was made from
+            "source_model_path": os.path.relpath(model_path, export_dir),
+            "model_sha256": file_sha256(model_path),
+            "model_stamp": file_stamp(model_path),
+        })
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as file_obj:
+            json.dump(manifest, file_obj, indent=2)
+
+        shutil.rmtree(export_dir, ignore_errors=True)
+        os.replace(tmp_dir, export_dir)
+        logging.info(f"Exported compact {manifest['kind']} model to {export_dir} (max abs diff {max_abs_diff})")
+        return manifest
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def build_compact_model(export_dir, manifest):
+    kind = manifest["kind"]
+    if kind in ("xgboost", "catboost"):
+        return BoosterModel(kind, os.path.join(export_dir, manifest["model_file"]))
+
+    # Memory-mapped, so every server process on the machine shares the same pages
+    def array(name):
+        return np.load(os.path.join(export_dir, f"{name}.npy"), mmap_mode="r")
+
+    if kind == "linear":
+        return LinearModel(array("coef"), manifest["intercept"])
+    return TreeEnsembleModel(
+        feature=array("feature"),
+        threshold=array("threshold"),
+        children_left=array("children_left"),
+        children_right=array("children_right"),
+        value=array("value"),
+        roots=array("roots"),
+        max_depth=manifest["max_depth"],
+        aggregate=manifest["aggregate"],
+        offset=manifest["offset"],
+    )
+
+
+def load_compact_model(manifest_path):
+    """
+    Loads an exported model from its manifest. Returns None if the pickle it was exported
+    from has been replaced since, so a stale export is never served.
+    """
+    try:
+        export_dir = os.path.dirname(manifest_path)
+        with open(manifest_path) as file_obj:
+            manifest = json.load(file_obj)
+
+        model_path = os.path.join(export_dir, manifest["source_model_path"])
+        # Hashing a large pickle is slow, so only do it when its mtime or size changed (e.g. after a copy)
+        matches = os.path.exists(model_path) and (
+            file_stamp(model_path) == manifest["model_stamp"] or file_sha256(model_path) == manifest["model_sha256"]
+        )
+        if not matches:
+            logging.warning(f"Compact model at {export_dir} doesn't match {model_path}, ignoring it")
+            return None
+        return build_compact_model(export_dir, manifest)
+
+    except Exception as e:
+        raise CustomException(e, sys)
@@ -0,0 +1,273 @@
+import sys
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.logger import logging
+from src.artifacts import load_object, file_sha256, file_stamp
+from src.pipeline.compact_model import MANIFEST_FILE
+
+# names of the fitted arrays saved by export_compiled_preprocessor
+ARRAY_NAMES = ("impute_values", "lower_bound", "upper_bound", "replace_values", "mean", "scale")
+
+
+class CompiledPreprocessor:
+    """
+    Flat NumPy version of the fitted preprocessor built in
+    DataTransformation.get_data_transformer_object
+    (ColumnTransformer -> SimpleImputer(median) -> OutlierHandler -> StandardScaler).
+    The fitted parameters are stored as one array per step, so transforming a row
+    is a handful of vectorized ops instead of several pandas conversions and copies.
+    """
+    def __init__(self, columns, impute_values, lower_bound, upper_bound, replace_values, mean, scale, clip=False):
+        self.columns = list(columns)
+        self.impute_values = impute_values
+        self.lower_bound = lower_bound
+        self.upper_bound = upper_bound
+        # None means outliers are replaced with the median of the batch being transformed
+        self.replace_values = replace_values
+        self.clip = clip
+        self.mean = mean
+        self.scale = scale
+
+    def transform(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X[self.columns].to_numpy(dtype=np.float64)
+        else:
+            X = np.asarray(X, dtype=np.float64)
+
+        X = np.where(np.isnan(X), self.impute_values, X)
+        if self.clip:
+            X = np.clip(X, self.lower_bound, self.upper_bound)
+        else:
+            outliers = (X < self.lower_bound) | (X > self.upper_bound)
+            replace_values = self.replace_values if self.replace_values is not None else np.median(X, axis=0)
+            X = np.where(outliers, replace_values, X)
+        return (X - self.mean) / self.scale
+
+
+def is_batch_independent(preprocessor):
+    """
+    True if each row is transformed on its own. Outlier handlers pickled before they stored the
+    training median replace outliers with the batch median, so merging rows would change results.
+    """
+    if isinstance(preprocessor, CompiledPreprocessor):
+        return preprocessor.clip or preprocessor.replace_values is not None
+
+    # sklearn is already loaded if we got here, since the preprocessor was unpickled
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+    from src.utils import OutlierHandler
+
+    steps = [preprocessor]
+    while steps:
+        step = steps.pop()
+        if isinstance(step, OutlierHandler) and step.strategy == "median" and step.median is None:
+            return False
+        if isinstance(step, ColumnTransformer):
+            steps.extend(transformer for _, transformer, _ in step.transformers_)
+        elif isinstance(step, Pipeline):
+            steps.extend(transformer for _, transformer in step.steps)
+    return True
+
+
+def compile_preprocessor(preprocessor):
+    """
+    Extracts the fitted parameters of the preprocessor into a CompiledPreprocessor.
+    Returns None if the preprocessor doesn't have the expected structure.
+    """
+    try:
+        from sklearn.compose import ColumnTransformer
+        from sklearn.impute import SimpleImputer
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import StandardScaler
+        from src.utils import OutlierHandler
+
+        if not isinstance(preprocessor, ColumnTransformer):
+            return None
+
+        # Only one transformer may produce output, everything else has to be dropped
+        active = [t for t in preprocessor.transformers_ if t[1] != 'drop']
+        if len(active) != 1:
+            return None
+        _, num_pipeline, columns = active[0]
+        if not isinstance(num_pipeline, Pipeline) or len(num_pipeline.steps) != 3:
+            return None
+
+        imputer, outlier_handler, scaler = [step for _, step in num_pipeline.steps]
+        if not (isinstance(imputer, SimpleImputer) and imputer.strategy == 'median'
+                and isinstance(outlier_handler, OutlierHandler)
+                and isinstance(scaler, StandardScaler)):
+            return None
+
+        impute_values = np.asarray(imputer.statistics_, dtype=np.float64)
+        # Columns that were empty at fit time are dropped by the imputer, which we don't replicate
+        if len(impute_values) != len(columns) or np.isnan(impute_values).any():
+            return None
+
+        n_features = len(columns)
+        replace_values = outlier_handler.median
+        return CompiledPreprocessor(
+            columns=columns,
+            impute_values=impute_values,
+            lower_bound=np.asarray(outlier_handler.lower_bound, dtype=np.float64),
+            upper_bound=np.asarray(outlier_handler.upper_bound, dtype=np.float64),
+            replace_values=None if replace_values is None else np.asarray(replace_values, dtype=np.float64),
+            mean=scaler.mean_ if scaler.with_mean else np.zeros(n_features),
+            scale=scaler.scale_ if scaler.with_std else np.ones(n_features),
+            clip=outlier_handler.strategy == 'clip',
+        )
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def make_parity_probe(compiled):
+    """
+    Builds rows that exercise every branch of the compiled transform:
+    missing values, values inside the IQR bounds and outliers on both sides.
+    """
+    lower, upper = compiled.lower_bound, compiled.upper_bound
+    width = np.maximum(upper - lower, 1.0)
+    rows = [
+        compiled.impute_values,
+        np.full_like(lower, np.nan),
+        (lower + upper) / 2,
+        lower - width,
+        upper + width,
+        lower + width / 4,
+        upper - width / 4,
+    ]
+    probe = np.vstack(rows)
+    # Mix missing values and outliers within the same rows as well
+    probe[5, ::2] = np.nan
+    probe[6, 1::2] = upper[1::2] + width[1::2]
+    return pd.DataFrame(probe, columns=compiled.columns)
+
+
+def check_parity(compiled, preprocessor, X):
+    """
+    Returns the largest absolute difference between the compiled and sklearn transforms on X.
+    """
+    expected = preprocessor.transform(X)
+    actual = compiled.transform(X)
+    if expected.shape != actual.shape:
+        return np.inf
+    return float(np.max(np.abs(expected - actual))) if expected.size else 0.0
+
+
+def probe_parity(compiled, preprocessor):
+    """
+    Largest difference between the compiled and sklearn transforms over the parity probe,
+    checking each probe row on its own (single-row requests) and all together (batches).
+    """
+    probe = make_parity_probe(compiled)
+    return max(
+        [check_parity(compiled, preprocessor, probe)]
+        + [check_parity(compiled, preprocessor, probe.iloc[[i]]) for i in range(len(probe))]
+    )
+
+
+def load_preprocessor(file_path, tolerance=1e-9):
+    """
+    Loads the pickled preprocessor and returns its compiled version if it can be compiled
+    and matches the sklearn pipeline on the parity probe, otherwise the sklearn pipeline itself.
+    """
+    try:
+        preprocessor = load_object(file_path)
+        compiled = compile_preprocessor(preprocessor)
+        if compiled is None:
+            logging.info(f"Preprocessor at {file_path} can't be compiled, using the sklearn pipeline")
+            return preprocessor
+
+        max_diff = probe_parity(compiled, preprocessor)
+        if not max_diff <= tolerance:
+            logging.warning(f"Compiled preprocessor differs from the sklearn pipeline by {max_diff}, using the sklearn pipeline")
+            return preprocessor
+
+        logging.info(f"Using compiled preprocessor for {file_path}")
+        return compiled
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def export_compiled_preprocessor(preprocessor, preprocessor_path, export_dir, tolerance=1e-9):
+    """
+    Saves the compiled preprocessor as plain .npy arrays and a manifest, so serving can load it
+    without unpickling the sklearn pipeline (and importing sklearn). Returns the manifest, or
+    None (with nothing written) if it can't be compiled or doesn't match on the parity probe.
+    """
+    try:
+        compiled = compile_preprocessor(preprocessor)
+        if compiled is None:
+            logging.info("Preprocessor can't be compiled, serving the pickled pipeline")
+            return None
+        max_diff = probe_parity(compiled, preprocessor)
+        if not max_diff <= tolerance:
+            logging.warning(f"Compiled preprocessor differs from the sklearn pipeline by {max_diff}, not exporting")
+            return None
+
+        tmp_dir = f"{export_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in ARRAY_NAMES:
+            arr = getattr(compiled, name)
+            if arr is not None:
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(arr, dtype=np.float64))
+
+        manifest = {
+            "columns": compiled.columns,
+            "clip": bool(compiled.clip),
+            "max_abs_diff": max_diff,
+            "tolerance": tolerance,
+            # ties the export to the pickle it was made from
+            "source_preprocessor_path": os.path.relpath(preprocessor_path, export_dir),
+            "preprocessor_sha256": file_sha256(preprocessor_path),
+            "preprocessor_stamp": file_stamp(preprocessor_path),
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as file_obj:
+            json.dump(manifest, file_obj, indent=2)
+
+        shutil.rmtree(export_dir, ignore_errors=True)
+        os.replace(tmp_dir, export_dir)
+        logging.info(f"Exported compiled preprocessor to {export_dir} (max abs diff {max_diff})")
+        return manifest
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def load_compiled_preprocessor(manifest_path):
+    """
+    Loads an exported compiled preprocessor from its manifest. Returns None if the pickle it
+    was exported from has been replaced since, so a stale export is never served.
+    """
+    try:
+        export_dir = os.path.dirname(manifest_path)
+        with open(manifest_path) as file_obj:
+            manifest = json.load(file_obj)
+
+        preprocessor_path = os.path.join(export_dir, manifest["source_preprocessor_path"])
+        matches = os.path.exists(preprocessor_path) and (
+            file_stamp(preprocessor_path) == manifest["preprocessor_stamp"]
+            or file_sha256(preprocessor_path) == manifest["preprocessor_sha256"]
+        )
+        if not matches:
+            logging.warning(f"Compiled preprocessor at {export_dir} doesn't match {preprocessor_path}, ignoring it")
+            return None
+
+        arrays = {}
+        for name in ARRAY_NAMES:
+            file_path = os.path.join(export_dir, f"{name}.npy")
+            arrays[name] = np.load(file_path) if os.path.exists(file_path) else None
+        return CompiledPreprocessor(columns=manifest["columns"], clip=manifest["clip"], **arrays)
+
+    except Exception as e:
+        raise CustomException(e, sys)
@@ -0,0 +1,262 @@
+import sys
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.metrics import registry
+
+outlier_replacements_total=registry.counter("ph_outlier_replacements_total","Input values outside the training IQR bounds, rewritten by the outlier handler",labels=("feature",))
+drift_psi=registry.gauge("ph_drift_psi","Population stability index of the recent inputs and predictions against training",labels=("feature",))
+
+# smallest bin share used in the PSI, so an empty bin doesn't make it infinite
+PSI_EPSILON=1e-4
+
+
+def bin_counts(values, edges):
+    """
+    Counts of values per bin: len(edges)+1 bins split at the edges, plus one for missing values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    bins = np.searchsorted(edges, values, side="right")
+    bins[np.isnan(values)] = len(edges) + 1
+    return np.bincount(bins, minlength=len(edges) + 2)
+
+
+def quantile_edges(values, n_bins):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return np.array([])
+    return np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+
+
+def build_drift_reference(features, target, lower_bound, upper_bound, n_bins=10):
+    """
+    Reference statistics of the training data: decile bins of every feature with their counts
+    and outlier bounds, and bins of the target, which stand in for the model's predictions until
+    the trained model replaces them (set_prediction_reference).
+    features is a DataFrame of raw inputs, lower_bound/upper_bound are aligned with its columns.
+    """
+    try:
+        reference = {"n_rows": len(features), "features": {}, "prediction": {}}
+        for column, lower, upper in zip(features.columns, lower_bound, upper_bound):
+            values = features[column].to_numpy(dtype=np.float64)
+            edges = quantile_edges(values, n_bins)
+            n_outliers = int(((values < lower) | (values > upper)).sum())
+            reference["features"][column] = {
+                "edges": edges.tolist(),
+                "counts": bin_counts(values, edges).tolist(),
+                "lower_bound": float(lower),
+                "upper_bound": float(upper),
+                "outlier_rate": n_outliers / max(len(values), 1),
+            }
+        reference["prediction"] = prediction_reference(target, n_bins, source="target")
+        return reference
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def prediction_reference(values, n_bins=10, source="model"):
+    edges = quantile_edges(values, n_bins)
+    return {"edges": edges.tolist(), "counts": bin_counts(values, edges).tolist(), "source": source}
+
+
+def set_prediction_reference(file_path, predictions, n_bins=10):
+    """
+    Replaces the prediction bins of a saved reference with those of the model's predictions on
+    the training rows, so served predictions are compared to what the model predicts, not to pH.
+    """
+    try:
+        reference = load_drift_reference(file_path)
+        reference["prediction"] = prediction_reference(predictions, n_bins)
+        save_drift_reference(reference, file_path)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def save_drift_reference(reference, file_path):
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    with open(f"{file_path}.tmp", "w") as file_obj:
+        json.dump(reference, file_obj, indent=2)
+    os.replace(f"{file_path}.tmp", file_path)
+
+
+def load_drift_reference(file_path):
+    with open(file_path) as file_obj:
+        return json.load(file_obj)
+
+
+def psi(reference_counts, counts):
+    p = np.maximum(reference_counts / max(reference_counts.sum(), 1), PSI_EPSILON)
+    q = np.maximum(counts / max(counts.sum(), 1), PSI_EPSILON)
+    return float(((q - p) * np.log(q / p)).sum())
+
+
+def binned_ks(reference_counts, counts):
+    # largest gap between the two CDFs at the bin edges, missing values left out
+    p = reference_counts[:-1] / max(reference_counts[:-1].sum(), 1)
+    q = counts[:-1] / max(counts[:-1].sum(), 1)
+    return float(np.abs(np.cumsum(p) - np.cumsum(q)).max())
+
+
+class DriftMonitor:
+    """
+    Compares the inputs and predictions seen by this process to the training data.
+    Each feature (and the prediction) is summarised by its counts in the reference bins,
+    kept in one flat array, so an update is a searchsorted per column and a single bincount,
+    and memory doesn't grow. Counts are kept in tumbling windows of `window` rows; the scores
+    are computed over the current and the previous window, and nothing is flagged as drifted
+    until they hold min_rows rows. Values outside the outlier bounds are counted per feature
+    over the whole lifetime.
+    """
+    def __init__(self, reference, window=10000, psi_threshold=0.2, min_rows=300):
+        self.reference = reference
+        self.window = window
+        self.psi_threshold = psi_threshold
+        self.min_rows = min_rows
+        # states of other processes are only merged if they were counted in the same bins
+        self.reference_id = hashlib.sha256(json.dumps(reference, sort_keys=True).encode()).hexdigest()
+        self.columns = list(reference["features"])
+        stats = [reference["features"][column] for column in self.columns] + [reference["prediction"]]
+        self.names = self.columns + ["prediction"]
+        self.edges = [np.asarray(column_stats["edges"], dtype=np.float64) for column_stats in stats]
+        # where the bins of each column start in the flat counts array, the missing-value bin is the last one
+        sizes = [len(edges) + 2 for edges in self.edges]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)])
+        self.missing_bins = self.offsets[1:] - 1
+        # edges of every column in one matrix, padded with inf, to bin all columns with one comparison
+        self.padded_edges = np.full((len(self.edges), max(map(len, self.edges), default=0)), np.inf)
+        for i, edges in enumerate(self.edges):
+            self.padded_edges[i, :len(edges)] = edges
+        self.reference_counts = np.concatenate([column_stats["counts"] for column_stats in stats])
+        self.lower_bound = np.array([column_stats["lower_bound"] for column_stats in stats[:-1]])
+        self.upper_bound = np.array([column_stats["upper_bound"] for column_stats in stats[:-1]])
+
+        self._current = np.zeros(self.offsets[-1], dtype=np.int64)
+        self._previous = np.zeros(self.offsets[-1], dtype=np.int64)
+        self._current_rows = 0
+        self._previous_rows = 0
+        self._rows_seen = 0
+        self._outliers = np.zeros(len(self.columns), dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def observe(self, features, predictions):
+        """
+        Adds a batch of raw inputs (a DataFrame with the reference columns) and their predictions.
+        """
+        try:
+            if features.columns.tolist() == self.columns:
+                # the usual case, skips selecting the columns
+                present = slice(None)
+                columns = slice(None)
+                frame = features
+            else:
+                present = [i for i, column in enumerate(self.columns) if column in features.columns]
+                columns = present + [len(self.columns)]
+                frame = features[[self.columns[i] for i in present]]
+            try:
+                X = frame.to_numpy(dtype=np.float64)
+            except (ValueError, TypeError):
+                # not numeric, leave this batch out of the statistics
+                return
+
+            values = np.empty((len(X), X.shape[1] + 1))
+            values[:, :-1] = X
+            values[:, -1] = predictions
+            # bin = number of edges <= value, same as searchsorted(side="right") column by column
+            bins = (values[:, :, np.newaxis] >= self.padded_edges[columns]).sum(axis=2) + self.offsets[:-1][columns]
+            missing = np.isnan(values)
+            if missing.any():
+                bins = np.where(missing, self.missing_bins[columns], bins)
+            counts = np.bincount(bins.ravel(), minlength=self.offsets[-1])
+            outliers = np.zeros(len(self.columns), dtype=np.int64)
+            outliers[present] = ((X < self.lower_bound[present]) | (X > self.upper_bound[present])).sum(axis=0)
+
+            with self._lock:
+                if self._current_rows >= self.window:
+                    self._previous, self._previous_rows = self._current, self._current_rows
+                    self._current, self._current_rows = np.zeros_like(self._current), 0
+                self._current += counts
+                self._current_rows += len(X)
+                self._rows_seen += len(X)
+                self._outliers += outliers
+            if outliers.any():
+                for column, n_outliers in zip(self.columns, outliers):
+                    if n_outliers:
+                        outlier_replacements_total.inc(int(n_outliers), feature=column)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def collect(self):
+        # registry collector: refreshes this process's PSI gauges and saves its counts
+        self.report()
+        return self.state()
+
+    def state(self):
+        """
+        The counts of this process, as saved for the other processes of the server.
+        """
+        with self._lock:
+            return {
+                "reference_id": self.reference_id,
+                "counts": (self._current + self._previous).tolist(),
+                "window_rows": self._current_rows + self._previous_rows,
+                "rows_seen": self._rows_seen,
+                "outliers": self._outliers.tolist(),
+            }
+
+    def report(self, states=None):
+        """
+        Scores of this process's windows, or of the sum of states (from state(), e.g. of every
+        worker of the server). Only the scores of this process's own windows set the gauges.
+        """
+        own = states is None
+        states = [self.state()] if own else [state for state in states if state["reference_id"] == self.reference_id]
+        counts = np.sum([state["counts"] for state in states], axis=0) if states else np.zeros(self.offsets[-1])
+        window_rows = sum(state["window_rows"] for state in states)
+        rows_seen = sum(state["rows_seen"] for state in states)
+        outliers = np.sum([state["outliers"] for state in states], axis=0) if states else np.zeros(len(self.columns))
+
+        # a handful of rows always looks drifted, so scores of small windows are reported but not acted on
+        insufficient_data = window_rows < self.min_rows
+        features = {}
+        for i, name in enumerate(self.names):
+            bins = slice(self.offsets[i], self.offsets[i + 1])
+            if window_rows:
+                scores = {"psi": psi(self.reference_counts[bins], counts[bins]),
+                          "ks": binned_ks(self.reference_counts[bins], counts[bins])}
+            else:
+                scores = {"psi": 0.0, "ks": 0.0}
+            if name != "prediction":
+                scores["missing_rate"] = float(counts[bins][-1] / window_rows) if window_rows else 0.0
+                scores["outlier_replacements"] = int(outliers[i])
+                scores["outlier_rate"] = float(outliers[i] / rows_seen) if rows_seen else 0.0
+                scores["reference_outlier_rate"] = self.reference["features"][name]["outlier_rate"]
+            features[name] = scores
+            if own and not insufficient_data:
+                drift_psi.set(scores["psi"], feature=name)
+
+        prediction = features.pop("prediction")
+        return {
+            "processes": len(states),
+            "rows_seen": rows_seen,
+            "window_rows": window_rows,
+            "min_rows": self.min_rows,
+            "insufficient_data": insufficient_data,
+            "psi_threshold": self.psi_threshold,
+            "drifted": [] if insufficient_data else
+                       [name for name, scores in features.items() if scores["psi"] > self.psi_threshold],
+            "prediction_drifted": not insufficient_data and prediction["psi"] > self.psi_threshold,
+            "prediction_reference": self.reference["prediction"].get("source", "target"),
+            "features": features,
+            "prediction": prediction,
+        }
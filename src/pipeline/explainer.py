@@ -0,0 +1,224 @@
+import sys
+import os
+import zlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.metrics import registry, timed
+from src.artifacts import artifact_cache
+from src.pipeline.predict_pipeline import PredictPipeline, FEATURE_COLUMNS, ID_COLUMNS
+
+# lime has no public call that only draws the perturbations: explain_instance samples, predicts and fits
+# in one go, with one predict call per row. Its private sampler lets a request predict the perturbations
+# of all its rows at once, so lime is pinned in requirements.txt; a version without it falls back to
+# explain_instance row by row (same results, slower)
+PRIVATE_SAMPLER="_LimeTabularExplainer__data_inverse"
+
+explanation_cache_events=registry.counter("ph_explanation_cache_events_total","Explanation cache hits and misses",labels=("event",))
+
+
+@dataclass
+class ExplainerConfig:
+    # the perturbations are drawn from the distribution of the training features
+    train_data_path: str=os.path.join("artifacts","train.csv")
+    num_samples: int=field(default_factory=lambda: int(os.environ.get("PH_EXPLAIN_SAMPLES",5000)))
+    num_features: int=10
+    # explanations of up to cache_size distinct rows are kept (PH_EXPLAIN_CACHE_SIZE, 0 to disable)
+    cache_size: int=field(default_factory=lambda: int(os.environ.get("PH_EXPLAIN_CACHE_SIZE",1000)))
+    # threads fitting the local models of the rows of a batch
+    threads: int=field(default_factory=lambda: int(os.environ.get("PH_EXPLAIN_THREADS",4)))
+
+
+def build_explainer(train_data_path):
+    """
+    LIME explainer over the raw feature columns, with its sampling statistics and discretizer
+    taken from the training set. Built once per process and rebuilt only when the file changes.
+    """
+    # lime imports sklearn, which the prediction path doesn't need otherwise
+    from lime.lime_tabular import LimeTabularExplainer
+    from src.utils import read_table
+
+    X_train = read_table(train_data_path, columns=FEATURE_COLUMNS)[FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    # the discretizer's quartiles can't handle missing values, fill them like the preprocessor does
+    medians = X_train.median()
+    explainer = LimeTabularExplainer(X_train.fillna(medians).to_numpy(dtype=np.float64), mode="regression",
+                                     feature_names=FEATURE_COLUMNS, discretize_continuous=True, random_state=42)
+    explainer.feature_medians = medians.to_numpy(dtype=np.float64)
+    return explainer
+
+
+_executor=None
+_explanation_cache=OrderedDict()
+_explanation_cache_artifacts=None
+_lock=threading.Lock()
+# the explainer's random state is shared, so sampling happens one row at a time
+_sampling_lock=threading.Lock()
+
+
+def get_executor(threads):
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor=ThreadPoolExecutor(max_workers=threads,thread_name_prefix="explain")
+    return _executor
+
+
+class Explainer:
+    """
+    Explains predictions with LIME without going through explain_instance row by row:
+    the perturbations of every row of a request are predicted with one transform + predict
+    call, then the local linear models are fitted in parallel. Rows explained before with
+    the same model are answered from a cache.
+    """
+    def __init__(self):
+        self.explainer_config=ExplainerConfig()
+        self.predict_pipeline=PredictPipeline()
+
+    def load_explainer(self):
+        return artifact_cache.get(self.explainer_config.train_data_path,loader=build_explainer)
+
+    @staticmethod
+    def row_keys(features):
+        X=np.ascontiguousarray(features[FEATURE_COLUMNS].to_numpy(dtype=np.float64)+0.0)
+        return [row.tobytes() for row in X]
+
+    def cached(self,keys,artifacts):
+        global _explanation_cache_artifacts
+        with _lock:
+            # a new model or training set makes every cached explanation stale
+            if _explanation_cache_artifacts is None or any(a is not b for a,b in zip(_explanation_cache_artifacts,artifacts)):
+                _explanation_cache.clear()
+                _explanation_cache_artifacts=tuple(artifacts)
+            found={}
+            for row,key in enumerate(keys):
+                if key in _explanation_cache:
+                    _explanation_cache.move_to_end(key)
+                    found[row]=_explanation_cache[key]
+        explanation_cache_events.inc(len(found),event="hit")
+        explanation_cache_events.inc(len(keys)-len(found),event="miss")
+        return found
+
+    def store(self,keys,explanations,artifacts):
+        cache_size=self.explainer_config.cache_size
+        with _lock:
+            if any(a is not b for a,b in zip(_explanation_cache_artifacts,artifacts)):
+                return
+            for key,explanation in zip(keys,explanations):
+                _explanation_cache[key]=explanation
+                _explanation_cache.move_to_end(key)
+            while len(_explanation_cache)>cache_size:
+                _explanation_cache.popitem(last=False)
+
+    @staticmethod
+    def seed(explainer,row):
+        # same seed for the same row, so an explanation doesn't depend on what was explained before it
+        seed=zlib.crc32(row.tobytes())
+        explainer.random_state=np.random.RandomState(seed)
+        explainer.discretizer.random_state=np.random.RandomState(seed)
+
+    def sample(self,explainer,row):
+        with _sampling_lock:
+            self.seed(explainer,row)
+            return getattr(explainer,PRIVATE_SAMPLER)(row,self.explainer_config.num_samples)
+
+    def explain_instance(self,explainer,row,id_values,num_features):
+        # the public path, one transform + predict call per row
+        def predict_fn(inverse):
+            perturbed=pd.DataFrame(inverse,columns=FEATURE_COLUMNS)
+            for col,value in id_values.items():
+                perturbed[col]=value
+            return self.predict_pipeline.predict_now(perturbed)
+
+        with _sampling_lock:
+            self.seed(explainer,row)
+            explanation=explainer.explain_instance(row,predict_fn,num_features=num_features,
+                                                   num_samples=self.explainer_config.num_samples)
+        return self.format_explanation(explainer,row,explanation.intercept[1],explanation.local_exp[1],
+                                       explanation.score,explanation.local_pred)
+
+    def fit_local_model(self,explainer,row,data,predictions,num_features):
+        # what explain_instance does once it has the predictions of the perturbations
+        scaled_data=(data-explainer.scaler.mean_)/explainer.scaler.scale_
+        distances=np.sqrt(((scaled_data-scaled_data[0])**2).sum(axis=1))
+        intercept,local_exp,score,local_pred=explainer.base.explain_instance_with_data(
+            scaled_data,predictions[:,np.newaxis],distances,0,num_features,
+            feature_selection=explainer.feature_selection)
+        return self.format_explanation(explainer,row,intercept,local_exp,score,local_pred)
+
+    @staticmethod
+    def format_explanation(explainer,row,intercept,local_exp,score,local_pred):
+        bins=explainer.discretizer.discretize(row)
+        names=explainer.discretizer.names
+        return {
+            "intercept":float(intercept),
+            "score":float(score),
+            "local_prediction":float(np.ravel(local_pred)[0]),
+            "features":[{"feature":names[feature][int(bins[feature])],"weight":float(weight)}
+                        for feature,weight in local_exp],
+        }
+
+    def explain(self,features,num_features=None):
+        """
+        Returns one explanation per row of features (a DataFrame with the feature columns):
+        the weight of each feature condition in a local linear model around the row.
+        """
+        try:
+            config=self.explainer_config
+            num_features=config.num_features if num_features is None else num_features
+            if isinstance(num_features,bool) or not isinstance(num_features,(int,np.integer)) or num_features<1:
+                raise ValueError(f"num_features must be a positive integer, got {num_features!r}")
+            explainer=self.load_explainer()
+            model,preprocessor=self.predict_pipeline.load_artifacts()
+            artifacts=(model,preprocessor,explainer)
+
+            keys=[key+str(num_features).encode() for key in self.row_keys(features)]
+            # in forecasting mode the same readings are explained differently as the water point's history grows
+            use_cache=config.cache_size and not self.predict_pipeline.predict_pipeline_config.forecasting
+            explanations=self.cached(keys,artifacts) if use_cache else {}
+            missed=[row for row in range(len(keys)) if row not in explanations]
+            if not missed:
+                return [explanations[row] for row in range(len(keys))]
+
+            rows=features[FEATURE_COLUMNS].to_numpy(dtype=np.float64)[missed]
+            # empty values are explained as the median the preprocessor would impute
+            rows=np.where(np.isnan(rows),explainer.feature_medians,rows)
+            id_columns=[col for col in ID_COLUMNS if col in features.columns]
+            if not hasattr(explainer,PRIVATE_SAMPLER):
+                with timed("explain_fit"):
+                    fitted=[self.explain_instance(explainer,rows[i],{col:features[col].to_numpy()[row] for col in id_columns},num_features)
+                            for i,row in enumerate(missed)]
+                return self.finish(explanations,missed,fitted,keys,artifacts,use_cache)
+
+            with timed("explain_sampling"):
+                samples=[self.sample(explainer,row) for row in rows]
+
+            # every perturbation of every row in one transform + predict call
+            perturbed=pd.DataFrame(np.concatenate([inverse for _,inverse in samples]),columns=FEATURE_COLUMNS)
+            for col in id_columns:
+                perturbed[col]=np.repeat(features[col].to_numpy()[missed],config.num_samples)
+            predictions=self.predict_pipeline.predict_now(perturbed).reshape(len(missed),config.num_samples)
+
+            with timed("explain_fit"):
+                fitted=list(get_executor(config.threads).map(
+                    lambda i: self.fit_local_model(explainer,rows[i],samples[i][0],predictions[i],num_features),
+                    range(len(missed))))
+            return self.finish(explanations,missed,fitted,keys,artifacts,use_cache)
+
+        except Exception as e:
+            raise CustomException(e,sys)
+
+    def finish(self,explanations,missed,fitted,keys,artifacts,use_cache):
+        for row,explanation in zip(missed,fitted):
+            explanations[row]=explanation
+        if use_cache:
+            self.store([keys[row] for row in missed],fitted,artifacts)
+        return [explanations[row] for row in range(len(keys))]
@@ -0,0 +1,197 @@
+import sys
+import os
+import argparse
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+
+# columns that identify a reading: the water point and when it was taken
+ID_COLUMN = "WP_ID"
+DATE_COLUMN = "Date_Assessment"
+TIME_COLUMN = "Time_Assessment"
+
+
+def reading_times(df):
+    """
+    Seconds since the epoch of each reading, from Date_Assessment and (if present) Time_Assessment.
+    NaN where the date is missing or can't be parsed.
+    """
+    if DATE_COLUMN not in df.columns:
+        return np.full(len(df), np.nan)
+    stamps = df[DATE_COLUMN].astype("string")
+    if TIME_COLUMN in df.columns:
+        stamps = stamps + " " + df[TIME_COLUMN].astype("string").fillna("")
+    times = pd.to_datetime(stamps.str.strip(), errors="coerce")
+    return np.where(times.isna(), np.nan, times.to_numpy(dtype="datetime64[ns]").astype(np.int64) / 1e9)
+
+
+class WaterPointState:
+    """
+    History summary of one water point: the latest values of the lag columns and a fixed-size
+    window (with running sums) of the rolling columns, so adding a reading is O(1).
+    """
+    __slots__ = ("last_time", "n_readings", "lags", "windows", "sums", "counts")
+
+    def __init__(self, lag_columns, rolling_columns, window):
+        self.last_time = np.nan
+        self.n_readings = 0
+        self.lags = {column: np.nan for column in lag_columns}
+        self.windows = {column: deque(maxlen=window) for column in rolling_columns}
+        self.sums = {column: 0.0 for column in rolling_columns}
+        self.counts = {column: 0 for column in rolling_columns}
+
+
+class FeatureStore:
+    """
+    Per-WP_ID lag and rolling-window features for forecasting.
+    features() describes a water point's history before a new reading, update() adds the
+    reading to it. Training walks the readings in time order through the same two calls,
+    and the state left at the end is saved and used for online prediction, so the features
+    of a request are exactly those the model was trained on, without scanning any history.
+    """
+    def __init__(self, lag_columns=("pH",), rolling_columns=("SEC", "Temp"), window=3):
+        self.lag_columns = list(lag_columns)
+        self.rolling_columns = list(rolling_columns)
+        self.window = window
+        self._states = {}
+        self._lock = threading.Lock()
+
+    @property
+    def feature_names(self):
+        return ([f"prev_{column}" for column in self.lag_columns]
+                + [f"{column}_rolling_mean" for column in self.rolling_columns]
+                + ["hours_since_last_reading", "n_previous_readings"])
+
+    def features(self, wp_id, timestamp):
+        """
+        Features of a reading taken at timestamp (seconds) at water point wp_id, from the readings
+        added so far. NaN (imputed by the preprocessor) where there is no history.
+        """
+        state = self._states.get(wp_id)
+        if state is None:
+            return [np.nan] * (len(self.feature_names) - 1) + [0]
+        values = [state.lags[column] for column in self.lag_columns]
+        values += [state.sums[column] / state.counts[column] if state.counts[column] else np.nan
+                   for column in self.rolling_columns]
+        # a reading older than the latest one known (e.g. replayed out of order) is taken as just after it
+        values.append(np.maximum((timestamp - state.last_time) / 3600, 0.0))
+        values.append(state.n_readings)
+        return values
+
+    def update(self, wp_id, timestamp, reading):
+        """
+        Adds a reading (a mapping with the lag and rolling columns) to the water point's history.
+        Readings are expected in time order; one older than the latest is ignored, since the
+        windows can't be rewound in O(1).
+        """
+        with self._lock:
+            state = self._states.get(wp_id)
+            if state is None:
+                state = self._states[wp_id] = WaterPointState(self.lag_columns, self.rolling_columns, self.window)
+            if timestamp < state.last_time:
+                return False
+
+            state.last_time = timestamp
+            state.n_readings += 1
+            for column in self.lag_columns:
+                value = reading.get(column, np.nan)
+                # a reading without the value keeps the previous one as the latest known
+                if not pd.isna(value):
+                    state.lags[column] = float(value)
+            for column in self.rolling_columns:
+                window = state.windows[column]
+                if len(window) == window.maxlen:
+                    dropped = window[0]
+                    if not np.isnan(dropped):
+                        state.sums[column] -= dropped
+                        state.counts[column] -= 1
+                value = reading.get(column, np.nan)
+                value = np.nan if pd.isna(value) else float(value)
+                window.append(value)
+                if not np.isnan(value):
+                    state.sums[column] += value
+                    state.counts[column] += 1
+            return True
+
+    def transform(self, df):
+        """
+        Looks up the features of every row in df (which needs WP_ID and Date_Assessment)
+        without changing the store. Rows of unknown water points get the no-history values.
+        """
+        try:
+            times = reading_times(df)
+            ids = df[ID_COLUMN].to_numpy() if ID_COLUMN in df.columns else [None] * len(df)
+            rows = [self.features(wp_id, timestamp) for wp_id, timestamp in zip(ids, times)]
+            return pd.DataFrame(rows, columns=self.feature_names, index=df.index, dtype=np.float64)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def fit_transform(self, df):
+        """
+        Walks the readings of df in time order: each row gets the features of the history before it,
+        then is added to that history. Returns the features in the original row order.
+        """
+        try:
+            times = reading_times(df)
+            order = np.lexsort((times, df[ID_COLUMN].astype("string").fillna("").to_numpy()))
+            records = df.to_dict(orient="records")
+            ids = df[ID_COLUMN].to_numpy()
+            features = np.empty((len(df), len(self.feature_names)), dtype=np.float64)
+            for row in order:
+                features[row] = self.features(ids[row], times[row])
+                self.update(ids[row], times[row], records[row])
+            return pd.DataFrame(features, columns=self.feature_names, index=df.index)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def observe(self, df):
+        """
+        Adds new readings (e.g. lab results coming in) to the store, in time order.
+        Returns the number of readings added.
+        """
+        try:
+            times = reading_times(df)
+            order = np.argsort(times, kind="stable")
+            records = df.to_dict(orient="records")
+            ids = df[ID_COLUMN].to_numpy()
+            return sum(bool(self.update(ids[row], times[row], records[row])) for row in order)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+if __name__ == "__main__":
+    # src.utils imports sklearn, which serving never needs from this module
+    from src.artifacts import load_object
+    from src.utils import read_table, save_object
+
+    parser = argparse.ArgumentParser(description="Add new lab readings to the forecasting feature store")
+    parser.add_argument("readings", help="CSV/Parquet file with WP_ID, Date_Assessment, pH, SEC and Temp")
+    parser.add_argument("--store", default=os.path.join("artifacts", "feature_store.pkl"))
+    args = parser.parse_args()
+
+    feature_store = load_object(args.store)
+    readings = read_table(args.readings)
+    columns = [col for col in feature_store.lag_columns + feature_store.rolling_columns if col in readings.columns]
+    readings[columns] = readings[columns].apply(pd.to_numeric, errors="coerce")
+    n_added = feature_store.observe(readings)
+    # the gunicorn master picks up the saved store like a retrained model
+    save_object(args.store, feature_store)
+    print(f"added {n_added} of {len(readings)} readings to {args.store}")
@@ -0,0 +1,123 @@
+import sys
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.logger import logging
+
+# upper bounds of the batch-size histogram buckets (rows per predict call)
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+
+class MicroBatcher:
+    """
+    Queues concurrent prediction requests and merges them into one predict_fn call.
+    A batch is sent once it holds max_batch_size rows or its first request has waited
+    max_wait_ms, and every caller gets back the predictions for its own rows.
+    """
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=2.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stats = {
+            "requests": 0,
+            "rows": 0,
+            "batches": 0,
+            "max_queue_depth": 0,
+            "queue_wait_seconds": 0.0,
+            "batch_size_counts": [0] * (len(BATCH_SIZE_BUCKETS) + 1),
+        }
+
+    def _start(self):
+        # The worker thread doesn't survive a fork, so each process starts its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._worker.start()
+                self._pid = os.getpid()
+
+    def submit(self, features):
+        """
+        Queues a DataFrame of rows and returns a Future for their predictions.
+        """
+        if self._pid != os.getpid():
+            self._start()
+        future = Future()
+        self._queue.put((features, future, time.perf_counter()))
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return future
+
+    def predict(self, features, timeout=None):
+        try:
+            return self.submit(features).result(timeout=timeout)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _run(self):
+        max_wait = self.max_wait_ms / 1000
+        while True:
+            batch = [self._queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = time.perf_counter() + max_wait
+            while n_rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                n_rows += len(item[0])
+            self._process(batch, n_rows)
+
+    def _process(self, batch, n_rows):
+        started = time.perf_counter()
+        try:
+            features = pd.concat([item[0] for item in batch], ignore_index=True)
+            preds = np.asarray(self.predict_fn(features))
+
+            # Hand every caller the slice of predictions that belongs to its rows
+            offset = 0
+            for item_features, future, _ in batch:
+                future.set_result(preds[offset:offset + len(item_features)])
+                offset += len(item_features)
+
+        except Exception as e:
+            logging.error(f"Micro-batch of {n_rows} rows failed: {e}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["rows"] += n_rows
+            self._stats["queue_wait_seconds"] += sum(started - queued_at for _, _, queued_at in batch)
+            self._stats["batch_size_counts"][int(np.searchsorted(BATCH_SIZE_BUCKETS, n_rows))] += 1
+
+    def stats(self):
+        """
+        Queue depth and batch-size statistics for tuning max_batch_size and max_wait_ms.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["batch_size_counts"] = dict(zip([*map(str, BATCH_SIZE_BUCKETS), "+Inf"], self._stats["batch_size_counts"]))
+        stats["queue_depth"] = self._queue.qsize() if self._pid == os.getpid() else 0
+        stats["mean_batch_size"] = stats["rows"] / stats["batches"] if stats["batches"] else 0.0
+        stats["mean_queue_wait_ms"] = 1000 * stats["queue_wait_seconds"] / stats["requests"] if stats["requests"] else 0.0
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait_ms
+        return stats
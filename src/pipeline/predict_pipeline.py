@@ -1,37 +1,256 @@
 import sys
+import numpy as np
 import pandas as pd
 import os
+import threading
+from dataclasses import dataclass, field
 
 # Add the project root directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.exception import CustomException
-from src.utils import load_object
+from src.logger import logging
+from src.metrics import registry, timed, debug_print, predicted_rows_total
+from src.artifacts import artifact_cache, artifact_lock, load_object
+from src.pipeline.compiled_preprocessor import load_preprocessor, load_compiled_preprocessor, is_batch_independent
+from src.pipeline.micro_batcher import MicroBatcher
+from src.pipeline.prediction_cache import PredictionCache
+from src.pipeline.compact_model import load_compact_model, MANIFEST_FILE
+from src.pipeline.feature_store import ID_COLUMN, DATE_COLUMN, TIME_COLUMN
+from src.pipeline.drift_monitor import DriftMonitor, load_drift_reference
+
+
+# input columns expected by the preprocessor, same order as CustomData
+FEATURE_COLUMNS=["Temp","SEC","Turbidity","Total_Iron","Titration_1","Titration_2",
+                 "Volume","N_VALUE","Tryptophan_Probe","Final_HCO3"]
+# identify the water point and time of a reading, only used in forecasting mode
+ID_COLUMNS=[ID_COLUMN,DATE_COLUMN,TIME_COLUMN]
+
+
+@dataclass
+class PredictPipelineConfig:
+    model_path: str=os.path.join("artifacts","model.pkl")
+    preprocessor_path: str=os.path.join('artifacts','preprocessor.pkl')
+    # use the flat NumPy version of the preprocessor when it matches the sklearn pipeline
+    use_compiled_preprocessor: bool=True
+    # exported by DataTransformation, loads without unpickling the pipeline or importing sklearn
+    compiled_preprocessor_dir: str=os.path.join("artifacts","compiled_preprocessor")
+    # serve the compact export of the model (written by ModelTrainer) instead of the pickle when there is one
+    use_compact_model: bool=True
+    compact_model_dir: str=os.path.join("artifacts","compact_model")
+    # held by IncrementalTrainer while it swaps the model and preprocessor, see artifact_lock
+    artifact_lock_path: str=os.path.join("artifacts","artifacts.lock")
+    # merge concurrent single-row requests into one transform + predict call (PH_MICRO_BATCHING=1)
+    micro_batching: bool=field(default_factory=lambda: os.environ.get("PH_MICRO_BATCHING")=="1")
+    max_batch_size: int=field(default_factory=lambda: int(os.environ.get("PH_MAX_BATCH_SIZE",64)))
+    max_wait_ms: float=field(default_factory=lambda: float(os.environ.get("PH_MAX_WAIT_MS",2.0)))
+    # reuse predictions for rows seen before (PH_PREDICTION_CACHE=1), up to cache_size rows for cache_ttl seconds (0 = no expiry)
+    prediction_cache: bool=field(default_factory=lambda: os.environ.get("PH_PREDICTION_CACHE")=="1")
+    cache_size: int=field(default_factory=lambda: int(os.environ.get("PH_CACHE_SIZE",10000)))
+    cache_ttl: float=field(default_factory=lambda: float(os.environ.get("PH_CACHE_TTL",300)))
+    # add the per-WP_ID lag/rolling features of the feature store (PH_FORECASTING=1, needs a model trained the same way)
+    forecasting: bool=field(default_factory=lambda: os.environ.get("PH_FORECASTING")=="1")
+    feature_store_path: str=os.path.join("artifacts","feature_store.pkl")
+    # compare the inputs and predictions to the training data (PH_DRIFT_MONITOR=0 to turn off), over windows of drift_window rows
+    drift_monitoring: bool=field(default_factory=lambda: os.environ.get("PH_DRIFT_MONITOR","1")=="1")
+    drift_reference_path: str=os.path.join("artifacts","drift_reference.json")
+    drift_window: int=field(default_factory=lambda: int(os.environ.get("PH_DRIFT_WINDOW",10000)))
+    drift_psi_threshold: float=field(default_factory=lambda: float(os.environ.get("PH_DRIFT_PSI_THRESHOLD",0.2)))
+    # windows with fewer rows than this are never reported as drifted
+    drift_min_rows: int=field(default_factory=lambda: int(os.environ.get("PH_DRIFT_MIN_ROWS",300)))
+
+
+# one micro-batcher, prediction cache and drift monitor per process, shared by every PredictPipeline
+_micro_batcher=None
+_prediction_cache=None
+_drift_monitor=None
+_shared_lock=threading.Lock()
+
+
+def get_micro_batcher(config=None):
+    global _micro_batcher
+    if _micro_batcher is None:
+        with _shared_lock:
+            if _micro_batcher is None:
+                config=config or PredictPipelineConfig()
+                pipeline=PredictPipeline()
+                pipeline.predict_pipeline_config=config
+                _micro_batcher=MicroBatcher(pipeline.predict_now,
+                                            max_batch_size=config.max_batch_size,
+                                            max_wait_ms=config.max_wait_ms)
+    return _micro_batcher
+
+
+def get_prediction_cache(config=None):
+    global _prediction_cache
+    if _prediction_cache is None:
+        with _shared_lock:
+            if _prediction_cache is None:
+                config=config or PredictPipelineConfig()
+                _prediction_cache=PredictionCache(FEATURE_COLUMNS,max_size=config.cache_size,ttl_seconds=config.cache_ttl)
+    return _prediction_cache
+
+
+# None when there is no reference (training writes it), a new monitor when the reference changes
+def get_drift_monitor(config=None):
+    global _drift_monitor
+    config=config or PredictPipelineConfig()
+    if not config.drift_monitoring or not os.path.exists(config.drift_reference_path):
+        return None
+    try:
+        reference=artifact_cache.get(config.drift_reference_path,loader=load_drift_reference)
+    except CustomException:
+        return None
+    if _drift_monitor is None or _drift_monitor.reference is not reference:
+        with _shared_lock:
+            if _drift_monitor is None or _drift_monitor.reference is not reference:
+                _drift_monitor=DriftMonitor(reference,window=config.drift_window,psi_threshold=config.drift_psi_threshold,
+                                            min_rows=config.drift_min_rows)
+                # saved with the metrics, so /drift can add up the windows of every worker
+                registry.collector("drift",_drift_monitor.collect)
+    return _drift_monitor
+
+
+# settings turned off by an old batch-median preprocessor, each warned about once per process
+_ignored_settings=set()
+
+
+def warn_ignored(setting):
+    if setting not in _ignored_settings:
+        _ignored_settings.add(setting)
+        logging.warning(f"{setting} is ignored: the preprocessor replaces outliers with the median of each batch, "
+                        f"so merged or cached rows would get different results. Retrain it to turn {setting} on")
+
+
+# loads an exported artifact through the cache, None if there is no usable export.
+# The export is checked against source_path (the pickle it was made from) whenever that file changes,
+# so replacing the pickle without touching the export falls back to the pickle
+def load_export(export_dir,loader,source_path=None):
+    manifest_path=os.path.join(export_dir,MANIFEST_FILE)
+    try:
+        return artifact_cache.get(manifest_path,loader=loader,depends_on=(source_path,) if source_path else ()) if os.path.exists(manifest_path) else None
+    except CustomException:
+        # the export was removed between the check and the load, e.g. by a retrain
+        return None
 
 
 class PredictPipeline: 
     def __init__(self):
-        pass
+        self.predict_pipeline_config=PredictPipelineConfig()
+
+    # model and preprocessor are loaded once per process and reloaded when the files change
+    def load_artifacts(self):
+        # the two are checked and loaded under the shared lock, so a retrain that swaps them can't be seen half done
+        with artifact_lock(self.predict_pipeline_config.artifact_lock_path):
+            model=self.load_model()
+            preprocessor=self.load_preprocessor()
+        return model,preprocessor
+
+    def load_model(self):
+        config=self.predict_pipeline_config
+        if config.use_compact_model:
+            model=load_export(config.compact_model_dir,load_compact_model,config.model_path)
+            if model is not None:
+                return model
+        return artifact_cache.get(config.model_path)
+
+    def load_preprocessor(self):
+        config=self.predict_pipeline_config
+        if not config.use_compiled_preprocessor:
+            return artifact_cache.get(config.preprocessor_path,loader=load_object)
+        preprocessor=load_export(config.compiled_preprocessor_dir,load_compiled_preprocessor,config.preprocessor_path)
+        if preprocessor is not None:
+            return preprocessor
+        return artifact_cache.get(config.preprocessor_path,loader=load_preprocessor)
+
+    # the store saved by DataTransformation, with the history of every water point seen in training
+    def load_feature_store(self):
+        return artifact_cache.get(self.predict_pipeline_config.feature_store_path,loader=load_object)
 
+    # the preprocessor inputs: the feature columns plus, when forecasting, the store features of each row
+    def model_inputs(self,features):
+        if not self.predict_pipeline_config.forecasting:
+            return features if len(features.columns)==len(FEATURE_COLUMNS) else features[FEATURE_COLUMNS]
+        # rows without WP_ID/Date_Assessment get the no-history features, imputed by the preprocessor
+        history=self.load_feature_store().transform(features)
+        return pd.concat([features[FEATURE_COLUMNS],history],axis=1)
 
-    # model prediction pipe
+    # called once at startup so the first request doesn't pay the loading cost
+    def warm_up(self):
+        try:
+            self.load_artifacts()
+            if self.predict_pipeline_config.forecasting:
+                self.load_feature_store()
+        except Exception as e:
+            raise CustomException(e,sys)
+
+    # model prediction pipe, goes through the prediction cache and the micro-batcher when they are enabled
     def predict(self,features):
+        preds=self.predict_cached(features,self.predict_uncached)
+        self.observe_drift(features,preds)
+        return preds
+
+    # requests (not the perturbations of explanations, which call predict_now) feed the drift monitor
+    def observe_drift(self,features,preds):
+        drift_monitor=get_drift_monitor(self.predict_pipeline_config)
+        if drift_monitor is not None and len(preds):
+            drift_monitor.observe(features,preds)
+
+    def predict_uncached(self,features):
+        if self.predict_pipeline_config.micro_batching:
+            _,preprocessor=self.load_artifacts()
+            # merging rows would change the results of an old batch-median preprocessor
+            if is_batch_independent(preprocessor):
+                return get_micro_batcher(self.predict_pipeline_config).predict(features)
+            warn_ignored("PH_MICRO_BATCHING")
+        return self.predict_now(features)
+
+    # rows found in the prediction cache are answered from it, only the rest go to predict_fn
+    def predict_cached(self,features,predict_fn):
+        # in forecasting mode the prediction also depends on the history of the water point, not only on the row
+        if self.predict_pipeline_config.prediction_cache and not self.predict_pipeline_config.forecasting:
+            artifacts=self.load_artifacts()
+            # same as micro-batching: an old batch-median preprocessor gives a row different results in different batches
+            if is_batch_independent(artifacts[1]):
+                return get_prediction_cache(self.predict_pipeline_config).predict(features,artifacts,predict_fn)
+            warn_ignored("PH_PREDICTION_CACHE")
+        return predict_fn(features)
+
+    # runs transform + predict straight away on the given rows
+    def predict_now(self,features):
         try:
-            model_path=os.path.join("artifacts","model.pkl")
-            preprocessor_path=os.path.join('artifacts','preprocessor.pkl')
-            print("Before Loading")
-            model=load_object(file_path=model_path)
-            preprocessor=load_object(file_path=preprocessor_path)
-            print("After Loading")
-            print("Features before preprocessing:")
-            print(features)            
-            data_scaled=preprocessor.transform(features)
-            print("Features after scaling:")
-            print(data_scaled)
-            preds=model.predict(data_scaled)
+            with timed("load_artifacts"):
+                model,preprocessor=self.load_artifacts()
+            features=self.model_inputs(features)
+            debug_print("Features before preprocessing:")
+            debug_print(features)
+            with timed("transform"):
+                data_scaled=preprocessor.transform(features)
+            debug_print("Features after scaling:")
+            debug_print(data_scaled)
+            with timed("model_predict"):
+                preds=model.predict(data_scaled)
+            predicted_rows_total.inc(len(preds))
             return preds
         
         except Exception as e:
             raise CustomException(e,sys)
+
+    # batch prediction: all valid rows go through a single transform + predict call
+    def predict_batch(self,records):
+        try:
+            with timed("batch_parsing"):
+                features,errors=get_batch_as_data_frame(records)
+            return features.index.tolist(),self.predict_rows(features),errors
+
+        except Exception as e:
+            raise CustomException(e,sys)
+
+    # rows already coerced by get_batch_as_data_frame
+    def predict_rows(self,features):
+        # already a batch, so the cache misses skip the micro-batcher
+        preds=self.predict_cached(features,self.predict_now) if len(features) else np.array([])
+        self.observe_drift(features,preds)
+        return preds
         
 
 # mapping the input in the HTML to the backend
@@ -79,4 +298,46 @@ class CustomData:
             return pd.DataFrame(custom_data_input_dict)
 
         except Exception as e:
-            raise CustomException(e, sys) 
\ No newline at end of file
+            raise CustomException(e, sys)
+
+
+def get_batch_as_data_frame(records):
+    """
+    Coerces a batch of raw records (a DataFrame with the CustomData columns) to numbers.
+    Returns the rows that can be scored and a {row number: error message} dict for the rest,
+    so one bad row doesn't fail the whole batch. The ID_COLUMNS present are kept as they are for forecasting.
+    """
+    if not len(records):
+        return pd.DataFrame(columns=FEATURE_COLUMNS,dtype=np.float64),{}
+    missing_columns=[col for col in FEATURE_COLUMNS if col not in records.columns]
+    if missing_columns:
+        raise ValueError(f"Missing columns: {missing_columns}")
+
+    raw=records[FEATURE_COLUMNS].reset_index(drop=True)
+    features=raw.apply(pd.to_numeric,errors='coerce').astype(np.float64)
+
+    # empty values are imputed by the preprocessor, anything else that isn't a finite number is an error.
+    # Columns that are already numbers can't hold blanks or booleans, only the others are looked at as text
+    blank=raw.isna()
+    text_columns=[col for col in FEATURE_COLUMNS
+                  if not pd.api.types.is_numeric_dtype(raw[col]) or pd.api.types.is_bool_dtype(raw[col])]
+    if text_columns:
+        text=raw[text_columns].astype(str)
+        blank[text_columns]|=text.apply(lambda col: col.str.strip()=='')
+        # JSON true/false would otherwise be taken as 1.0/0.0
+        features[text_columns]=features[text_columns].mask(text.isin(("True","False")))
+    invalid=~np.isfinite(features) & ~blank
+
+    errors={}
+    for row in np.flatnonzero(invalid.any(axis=1).to_numpy()):
+        columns=invalid.columns[invalid.iloc[row]].tolist()
+        errors[int(row)]=f"Invalid value for {columns}"
+    for row in np.flatnonzero(blank.all(axis=1).to_numpy()):
+        errors[int(row)]="Empty row"
+
+    id_columns=[col for col in ID_COLUMNS if col in records.columns]
+    if id_columns:
+        features=pd.concat([features,records[id_columns].reset_index(drop=True)],axis=1)
+
+    valid_rows=[row for row in range(len(features)) if row not in errors]
+    return features.iloc[valid_rows],errors
@@ -0,0 +1,123 @@
+import sys
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.metrics import registry
+
+prediction_cache_events=registry.counter("ph_prediction_cache_events_total","Prediction cache hits, misses, evictions, expirations and invalidations",labels=("event",))
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predictions keyed on the feature values of a row, with an optional TTL.
+    The loaded model and preprocessor are part of the cache state: when either is replaced
+    (e.g. a retrained model.pkl is picked up), every cached prediction is dropped.
+    """
+    def __init__(self, columns, max_size=10000, ttl_seconds=None):
+        self.columns = list(columns)
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds or None
+        self._entries = OrderedDict()
+        self._artifacts = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _count(self, event, n=1):
+        if n:
+            self._stats[event] += n
+            prediction_cache_events.inc(n, event=event)
+
+    def keys(self, features):
+        """
+        One hashable key per row. Values are compared as float64, so "100" and 100.0 are the same
+        reading, -0.0 is the same as 0.0 and all missing values are the same. Returns None if a
+        value isn't numeric, in which case the rows bypass the cache.
+        """
+        try:
+            X = features[self.columns].to_numpy(dtype=np.float64) + 0.0
+        except (ValueError, TypeError):
+            return None
+        X[np.isnan(X)] = np.nan
+        X = np.ascontiguousarray(X)
+        return [row.tobytes() for row in X]
+
+    def predict(self, features, artifacts, predict_fn):
+        """
+        Returns the predictions for every row of features, looking each one up in the cache
+        and calling predict_fn once on the distinct rows that missed.
+        artifacts is the (model, preprocessor) pair the predictions are made with.
+        """
+        try:
+            keys = self.keys(features)
+            if keys is None:
+                return predict_fn(features)
+
+            now = time.monotonic()
+            preds = np.empty(len(keys), dtype=np.float64)
+            missed = {}
+            with self._lock:
+                if self._artifacts is None or any(a is not b for a, b in zip(self._artifacts, artifacts)):
+                    if self._entries:
+                        self._count("invalidations")
+                    self._entries.clear()
+                    self._artifacts = tuple(artifacts)
+
+                for row, key in enumerate(keys):
+                    entry = self._entries.get(key)
+                    if entry is not None and entry[1] < now:
+                        del self._entries[key]
+                        self._count("expirations")
+                        entry = None
+                    if entry is None:
+                        missed.setdefault(key, []).append(row)
+                    else:
+                        self._entries.move_to_end(key)
+                        preds[row] = entry[0]
+                # both per row, a row repeated in the call and not in the cache is a miss each time
+                n_missed = sum(map(len, missed.values()))
+                self._count("hits", len(keys) - n_missed)
+                self._count("misses", n_missed)
+
+            if missed:
+                # Identical rows in the same call are predicted once
+                first_rows = [rows[0] for rows in missed.values()]
+                missed_preds = np.asarray(predict_fn(features.iloc[first_rows]), dtype=np.float64)
+                expires_at = now + self.ttl_seconds if self.ttl_seconds else np.inf
+                with self._lock:
+                    # don't store predictions made with artifacts that were replaced in the meantime
+                    store = all(a is b for a, b in zip(self._artifacts, artifacts))
+                    for (key, rows), pred in zip(missed.items(), missed_preds):
+                        preds[rows] = pred
+                        if store:
+                            self._entries[key] = (pred, expires_at)
+                            self._entries.move_to_end(key)
+                    n_evicted = max(0, len(self._entries) - self.max_size)
+                    for _ in range(n_evicted):
+                        self._entries.popitem(last=False)
+                    self._count("evictions", n_evicted)
+            return preds
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._artifacts = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["max_size"] = self.max_size
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
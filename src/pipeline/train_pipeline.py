@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import dataclasses
+from dataclasses import dataclass
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.exception import CustomException
+from src.logger import logging
+from src.artifacts import file_sha256
+from src.metrics import registry
+from src.components.data_ingestion import DataIngestion
+from src.components.data_transformation import DataTransformation
+from src.components.model_trainer import ModelTrainer
+from src.pipeline.compact_model import MANIFEST_FILE
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@dataclass
+class TrainPipelineConfig:
+    # fingerprints and outputs of the last run of every stage
+    cache_manifest_path: str=os.path.join('artifacts',"pipeline_cache.json")
+    # per-model search results, see ModelTrainerConfig.search_cache_dir
+    search_cache_dir: str=os.path.join('artifacts',"model_search_cache")
+    metrics_path: str=os.path.join('artifacts',"training_metrics.prom")
+
+
+def config_fingerprint(config):
+    # dataclass fields plus the plain class attributes some configs use for their paths
+    values = {name: value for name, value in vars(type(config)).items()
+              if not name.startswith('_') and not callable(value)}
+    values.update(dataclasses.asdict(config))
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def code_fingerprint(code_files):
+    digest = hashlib.sha256()
+    for code_file in sorted(code_files):
+        digest.update(code_file.encode())
+        digest.update(file_sha256(os.path.join(SRC_DIR, code_file)).encode())
+    return digest.hexdigest()
+
+
+class Stage:
+    """
+    One step of the training pipeline: the files it reads and writes, the config it runs with
+    and the source files that implement it. Its fingerprint covers the content of the inputs,
+    the config and the code, so the stage only has to run again when one of them changed.
+    """
+    def __init__(self, name, run, inputs, outputs, config, code_files):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.config = config
+        self.code_files = code_files
+
+    def fingerprint(self):
+        missing = [path for path in self.inputs if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"Inputs of the {self.name} stage are missing: {missing}")
+        fingerprint = {
+            "inputs": {path: file_sha256(path) for path in self.inputs},
+            "config": config_fingerprint(self.config),
+            "code": code_fingerprint(self.code_files),
+        }
+        return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()
+
+    def output_hashes(self):
+        return {path: file_sha256(path) if os.path.exists(path) else None for path in self.outputs}
+
+
+class TrainPipeline:
+    """
+    DataIngestion -> DataTransformation -> ModelTrainer, skipping every stage whose inputs,
+    config and code are the same as in its last run and whose outputs are still as it left them.
+    Since a stage's inputs are hashed by content, a stage that reruns but writes the same files
+    doesn't make the stages after it run.
+    """
+    def __init__(self, force=False):
+        self.train_pipeline_config = TrainPipelineConfig()
+        self.force = force
+        self.data_ingestion = DataIngestion()
+        self.data_transformation = DataTransformation()
+        self.model_trainer = ModelTrainer()
+        # the trainer reads the arrays from disk, so a skipped transformation needs no rerun to feed it
+        self.data_transformation.data_transformation_config.save_arrays = True
+        self.model_trainer.model_trainer_config.search_cache_dir = self.train_pipeline_config.search_cache_dir
+
+    def get_stages(self):
+        ingestion_config = self.data_ingestion.ingestion_config
+        transformation_config = self.data_transformation.data_transformation_config
+        trainer_config = self.model_trainer.model_trainer_config
+        # the drift reference is finished by the trainer (prediction bins), so it counts as the trainer's output
+        transformation_outputs = [transformation_config.preprocessor_obj_file_path,
+                                  transformation_config.train_array_path, transformation_config.test_array_path]
+        if transformation_config.forecasting:
+            transformation_outputs.append(transformation_config.feature_store_path)
+        # the exports are moved into place whole, so a deleted or unfinished export has no manifest
+        if transformation_config.export_compiled_preprocessor:
+            transformation_outputs.append(os.path.join(transformation_config.compiled_preprocessor_dir, MANIFEST_FILE))
+        trainer_outputs = [trainer_config.trained_model_file_path, trainer_config.model_profile_path,
+                           trainer_config.drift_reference_path]
+        if trainer_config.export_compact_model:
+            trainer_outputs.append(os.path.join(trainer_config.compact_model_dir, MANIFEST_FILE))
+
+        return [
+            Stage(
+                "data_ingestion",
+                run=self.data_ingestion.initiate_data_ingestion,
+                inputs=[ingestion_config.source_data_path],
+                outputs=[ingestion_config.raw_data_path, ingestion_config.train_data_path, ingestion_config.test_data_path],
+                config=ingestion_config,
+                code_files=["components/data_ingestion.py", "utils.py"],
+            ),
+            Stage(
+                "data_transformation",
+                run=lambda: self.data_transformation.initiate_data_transformation(
+                    ingestion_config.train_data_path, ingestion_config.test_data_path),
+                inputs=[ingestion_config.train_data_path, ingestion_config.test_data_path],
+                outputs=transformation_outputs,
+                config=transformation_config,
+                code_files=["components/data_transformation.py", "utils.py", "pipeline/feature_store.py",
+                            "pipeline/compiled_preprocessor.py", "pipeline/drift_monitor.py"],
+            ),
+            Stage(
+                "model_trainer",
+                run=lambda: self.model_trainer.initiate_model_trainer(
+                    transformation_config.train_array_path, transformation_config.test_array_path),
+                inputs=[transformation_config.train_array_path, transformation_config.test_array_path],
+                outputs=trainer_outputs,
+                config=trainer_config,
+                code_files=["components/model_trainer.py", "utils.py", "pipeline/compact_model.py",
+                            "pipeline/drift_monitor.py"],
+            ),
+        ]
+
+    def load_manifest(self):
+        manifest_path = self.train_pipeline_config.cache_manifest_path
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path) as file_obj:
+            return json.load(file_obj)
+
+    def save_manifest(self, manifest):
+        manifest_path = self.train_pipeline_config.cache_manifest_path
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(f"{manifest_path}.tmp", "w") as file_obj:
+            json.dump(manifest, file_obj, indent=2)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def run(self):
+        """
+        Runs the stages that changed. Returns {stage name: "ran" or "cached"} and the
+        result of the model trainer (the test R2 of the best model).
+        """
+        try:
+            manifest = self.load_manifest()
+            status = {}
+            for stage in self.get_stages():
+                fingerprint = stage.fingerprint()
+                last_run = manifest.get(stage.name, {})
+                if (not self.force and last_run.get("fingerprint") == fingerprint
+                        and last_run.get("outputs") == stage.output_hashes()):
+                    logging.info(f"{stage.name}: unchanged, reusing its outputs")
+                    status[stage.name] = "cached"
+                    continue
+
+                logging.info(f"{stage.name}: running")
+                start = time.perf_counter()
+                result = stage.run()
+                manifest[stage.name] = {
+                    "fingerprint": fingerprint,
+                    "outputs": stage.output_hashes(),
+                    "result": result if isinstance(result, (int, float)) else None,
+                    "seconds": time.perf_counter() - start,
+                    "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+                # saved after every stage, so a crash later on doesn't lose the stages that finished
+                self.save_manifest(manifest)
+                status[stage.name] = "ran"
+
+            registry.write(self.train_pipeline_config.metrics_path)
+            return status, manifest.get("model_trainer", {}).get("result")
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the model, rerunning only the stages that changed")
+    parser.add_argument("--force", action="store_true", help="run every stage even if it is unchanged")
+    args = parser.parse_args()
+
+    status, r2_square = TrainPipeline(force=args.force).run()
+    for stage_name, stage_status in status.items():
+        print(f"{stage_name}: {stage_status}")
+    print(f"test r2 of the best model: {r2_square}")
@@ -3,61 +3,181 @@ import sys
 
 import numpy as np 
 import pandas as pd
-import dill
 import pickle
-from sklearn.metrics import r2_score
-from sklearn.model_selection import GridSearchCV
-from sklearn.base import BaseEstimator, TransformerMixin
+import time
+import inspect
+from sklearn.metrics import r2_score, mean_squared_error
+from sklearn.model_selection import GridSearchCV, ParameterGrid, ParameterSampler, train_test_split
+from sklearn.base import BaseEstimator, TransformerMixin, RegressorMixin, clone
+from joblib import effective_n_jobs
 
 
 # Add the project root directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.exception import CustomException
+from src.logger import logging
+# re-exported, they used to live here
+from src.artifacts import load_object, ArtifactCache, artifact_cache
 
 
 class OutlierHandler(BaseEstimator, TransformerMixin):
     """
-    Custom transformer to handle outliers by replacing them with the median.
+    Custom transformer to handle outliers by replacing them with the median
+    of the training data, or by clipping them to the IQR bounds (strategy="clip").
     """
-    def __init__(self, factor=1.5):
+    def __init__(self, factor=1.5, strategy="median"):
         self.factor = factor
+        self.strategy = strategy
         self.feature_names = None
 
+    @staticmethod
+    def _to_array(X):
+        # Convert to NumPy array if input is a DataFrame
+        if isinstance(X, pd.DataFrame):
+            X = X.to_numpy()
+        elif not isinstance(X, np.ndarray):
+            raise ValueError("Input data must be a DataFrame or a NumPy array.")
+
+        # Keep float32 input as float32 instead of upcasting it
+        if X.dtype != np.float32:
+            X = X.astype(np.float64, copy=False)
+        return X
+
     def fit(self, X, y=None):
-        # Convert to DataFrame if input is NumPy array
-        if isinstance(X, np.ndarray):
-            self.feature_names = [f"feature_{i}" for i in range(X.shape[1])]
-            X = pd.DataFrame(X, columns=self.feature_names)
-        elif isinstance(X, pd.DataFrame):
+        if self.strategy not in ("median", "clip"):
+            raise ValueError(f"Unknown strategy {self.strategy!r}, expected 'median' or 'clip'.")
+
+        if isinstance(X, pd.DataFrame):
             self.feature_names = X.columns.tolist()
-        else:
-            raise ValueError("Input data must be a DataFrame or a NumPy array.")
+        X = self._to_array(X)
+        if self.feature_names is None or len(self.feature_names) != X.shape[1]:
+            self.feature_names = [f"feature_{i}" for i in range(X.shape[1])]
 
         # Calculate IQR, lower, and upper bounds for each column
-        self.Q1 = X.quantile(0.25)
-        self.Q3 = X.quantile(0.75)
+        X = X.astype(np.float64)
+        self.Q1, self.Q3 = np.nanpercentile(X, [25, 75], axis=0)
         self.IQR = self.Q3 - self.Q1
         self.lower_bound = self.Q1 - self.factor * self.IQR
         self.upper_bound = self.Q3 + self.factor * self.IQR
+
+        # Outliers are replaced with the training median, so results don't depend on the batch
+        self.median = np.nanmedian(X, axis=0)
         return self
 
     def transform(self, X, y=None):
-        # Convert to DataFrame if input is NumPy array
-        if isinstance(X, np.ndarray):
-            X = pd.DataFrame(X, columns=self.feature_names)
-        elif not isinstance(X, pd.DataFrame):
-            raise ValueError("Input data must be a DataFrame or a NumPy array.")
+        X = self._to_array(X)
+        lower_bound = self.lower_bound.astype(X.dtype, copy=False)
+        upper_bound = self.upper_bound.astype(X.dtype, copy=False)
+
+        if self.strategy == "clip":
+            return np.clip(X, lower_bound, upper_bound)
+
+        outliers = (X < lower_bound) | (X > upper_bound)
+        if self.median is not None:
+            median = self.median.astype(X.dtype, copy=False)
+        elif outliers.any():
+            # Handlers pickled before the rework have no training median, keep their batch-median behaviour
+            median = np.nanmedian(X, axis=0)
+        else:
+            return X.copy()
+        return np.where(outliers, median, X)
 
-        X = X.copy()
-        for column in X.columns:
-            # Replace outliers with median
-            outliers = (X[column] < self.lower_bound[column]) | (X[column] > self.upper_bound[column])
-            if outliers.any():
-                median_value = X[column].median()
-                X.loc[outliers, column] = median_value
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        # Pickles from before the rework store the bounds as pandas Series and have no strategy or median
+        for name in ("Q1", "Q3", "IQR", "lower_bound", "upper_bound"):
+            if isinstance(self.__dict__.get(name), pd.Series):
+                self.__dict__[name] = self.__dict__[name].to_numpy(dtype=np.float64)
+        self.__dict__.setdefault("strategy", "median")
+        self.__dict__.setdefault("median", None)
+
+
+class EarlyStoppingRegressor(BaseEstimator, RegressorMixin):
+    """
+    Wraps a boosting model (XGBoost, CatBoost, Gradient Boosting or AdaBoost) and picks
+    the number of trees on a held-out fold, instead of grid-searching n_estimators/iterations.
+    Training stops once `patience` more trees don't improve the held-out error,
+    then the model is refitted on all rows with the best number of trees.
+    """
+    def __init__(self, estimator, max_iterations=256, patience=20, validation_fraction=0.2, random_state=None):
+        self.estimator = estimator
+        self.max_iterations = max_iterations
+        self.patience = patience
+        self.validation_fraction = validation_fraction
+        self.random_state = random_state
 
-        # Convert back to NumPy array for pipeline compatibility
-        return X.to_numpy()
+    def _iteration_param(self):
+        return "iterations" if type(self.estimator).__name__ == "CatBoostRegressor" else "n_estimators"
+
+    def _find_best_iteration(self, X_fit, y_fit, X_val, y_val):
+        model = clone(self.estimator)
+        model_name = type(model).__name__
+
+        if model_name == "XGBRegressor":
+            model.set_params(n_estimators=self.max_iterations, early_stopping_rounds=self.patience)
+            model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+            return model.best_iteration + 1
+
+        if model_name == "CatBoostRegressor":
+            model.set_params(iterations=self.max_iterations)
+            model.fit(X_fit, y_fit, eval_set=(X_val, y_val), early_stopping_rounds=self.patience, verbose=False)
+            return model.get_best_iteration() + 1
+
+        if "warm_start" in model.get_params():
+            # Grow the ensemble `patience` trees at a time until the held-out error stops improving
+            best_error = np.inf
+            n_estimators = 0
+            model.set_params(warm_start=True)
+            while n_estimators < self.max_iterations:
+                n_estimators = min(n_estimators + self.patience, self.max_iterations)
+                model.set_params(n_estimators=n_estimators)
+                model.fit(X_fit, y_fit)
+                error = mean_squared_error(y_val, model.predict(X_val))
+                if error >= best_error:
+                    break
+                best_error = error
+        elif hasattr(model, "staged_predict"):
+            # No way to grow the ensemble in steps (AdaBoost), fit it once at full size
+            model.set_params(n_estimators=self.max_iterations)
+            model.fit(X_fit, y_fit)
+        else:
+            raise ValueError(f"Early stopping isn't supported for {model_name}")
+
+        # Pick the exact stage with the lowest held-out error
+        errors = [mean_squared_error(y_val, y_pred) for y_pred in self._staged_predict(model, X_val)]
+        return int(np.argmin(errors)) + 1
+
+    @staticmethod
+    def _staged_predict(model, X):
+        if type(model).__name__ != "AdaBoostRegressor":
+            yield from model.staged_predict(X)
+            return
+
+        # AdaBoost's staged_predict re-runs every tree at every stage, so predict each tree once
+        # and take the same weighted median over the first n trees
+        weights = model.estimator_weights_[:len(model.estimators_)]
+        predictions = np.array([estimator.predict(X) for estimator in model.estimators_]).T
+        rows = np.arange(len(predictions))
+        for n_trees in range(1, len(model.estimators_) + 1):
+            sorted_idx = np.argsort(predictions[:, :n_trees], axis=1)
+            weight_cdf = np.cumsum(weights[sorted_idx], axis=1)
+            median_idx = np.argmax(weight_cdf >= 0.5 * weight_cdf[:, -1][:, np.newaxis], axis=1)
+            yield predictions[rows, sorted_idx[rows, median_idx]]
+
+    def fit(self, X, y):
+        X_fit, X_val, y_fit, y_val = train_test_split(
+            X, y, test_size=self.validation_fraction, random_state=self.random_state
+        )
+        self.best_iteration_ = self._find_best_iteration(X_fit, y_fit, X_val, y_val)
+
+        # Refit on all rows with the chosen number of trees
+        self.estimator_ = clone(self.estimator)
+        self.estimator_.set_params(**{self._iteration_param(): self.best_iteration_})
+        self.estimator_.fit(X, y)
+        return self
+
+    def predict(self, X):
+        return self.estimator_.predict(X)
 
 
 def save_object(file_path, obj):
@@ -65,45 +185,374 @@ def save_object(file_path, obj):
         dir_path = os.path.dirname(file_path)
         os.makedirs(dir_path, exist_ok=True)
 
-        with open(file_path, "wb") as file_obj:
+        # Write to a temporary file first and swap it in, so a reader never sees a half-written pickle
+        tmp_file_path = f"{file_path}.tmp"
+        with open(tmp_file_path, "wb") as file_obj:
             pickle.dump(obj, file_obj)
+        os.replace(tmp_file_path, file_path)
 
     except Exception as e:
         raise CustomException(e, sys)
     
 
-def evaluate_models(X_train, y_train,X_test,y_test,models,param):
+def set_supported_params(model, **params):
+    """
+    Sets only the params the estimator accepts, e.g. random_state or n_jobs,
+    which not every model family has.
+    """
+    supported = set(model.get_params(deep=False)) | set(inspect.signature(type(model).__init__).parameters)
+    model.set_params(**{name: value for name, value in params.items() if name in supported})
+
+    # Wrappers such as EarlyStoppingRegressor pass the params on to the model they wrap
+    inner_model = model.get_params(deep=False).get("estimator")
+    if hasattr(inner_model, "get_params"):
+        set_supported_params(inner_model, **params)
+    return model
+
+
+def score_candidates(model, candidates, X, y, n_jobs=None, deadline=np.inf):
+    """
+    Cross-validates the candidate params in batches until they are all scored or the deadline passes.
+    Returns [(cv score, params)] for the scored candidates, best first.
+    """
+    # Without a deadline everything goes into one search so the workers are never idle between batches
+    batch_size = len(candidates) if deadline == np.inf else 2 * effective_n_jobs(n_jobs)
+    scored = []
+    for batch_start in range(0, len(candidates), batch_size):
+        if scored and time.perf_counter() > deadline:
+            break
+        batch = candidates[batch_start:batch_start + batch_size]
+        gs = GridSearchCV(model, [{name: [value] for name, value in params.items()} for params in batch],
+                          cv=3, n_jobs=n_jobs, refit=False)
+        gs.fit(X, y)
+        scored.extend(zip(np.nan_to_num(gs.cv_results_["mean_test_score"], nan=-np.inf), gs.cv_results_["params"]))
+
+    return sorted(scored, key=lambda item: item[0], reverse=True)
+
+
+def successive_halving(model, candidates, X, y, n_jobs=None, deadline=np.inf, factor=3, random_state=None):
+    """
+    Scores every candidate on a small slice of the rows, keeps the best 1/factor of them
+    and repeats with factor times more rows until the full training set is used.
+    """
+    n_samples = len(y)
+    n_rounds = int(np.ceil(np.log(len(candidates)) / np.log(factor))) + 1 if len(candidates) > 1 else 1
+    n_resources = max(n_samples // factor ** (n_rounds - 1), min(n_samples, 30))
+    rows = np.random.RandomState(random_state).permutation(n_samples)
+
+    survivors = candidates
+    while True:
+        subset = np.sort(rows[:n_resources])
+        scored = score_candidates(model, survivors, X[subset], y[subset], n_jobs=n_jobs, deadline=deadline)
+        if len(scored) == 1 or n_resources >= n_samples or time.perf_counter() > deadline:
+            return scored
+        survivors = [params for _, params in scored[:int(np.ceil(len(scored) / factor))]]
+        n_resources = min(n_resources * factor, n_samples)
+
+
+def evaluate_models(X_train, y_train,X_test,y_test,models,param,n_jobs=None,random_state=None,
+                    search_strategy="grid",n_iter=10,halving_factor=3,model_time_budget=None,total_time_budget=None):
+    """
+    Searches the params of every model and scores its refitted best estimator.
+    search_strategy is "grid" (every combination), "random" (n_iter sampled combinations)
+    or "halving" (successive halving over training rows). Candidates and CV folds are spread
+    over n_jobs workers. The time budgets (seconds) are checked between batches of candidates,
+    so a search stops soon after its budget runs out and keeps the best candidate so far.
+    Returns {model name: {"test_score", "train_score", "cv_score", "fit_time", "best_params",
+    "n_candidates", "best_iteration", "model"}}.
+    """
     try:
         report = {}
+        total_deadline = time.perf_counter() + total_time_budget if total_time_budget is not None else np.inf
 
-        for i in range(len(list(models))):
-            model = list(models.values())[i]
-            para=param[list(models.keys())[i]]
+        for model_name, model in models.items():
+            para=param[model_name]
 
-            gs = GridSearchCV(model,para,cv=3)
-            gs.fit(X_train,y_train)            
+            if time.perf_counter() > total_deadline:
+                logging.info(f"Total time budget used up, skipping {model_name}")
+                continue
+            model_deadline = time.perf_counter() + model_time_budget if model_time_budget is not None else np.inf
+            deadline = min(model_deadline, total_deadline)
 
-            model.set_params(**gs.best_params_)
-            model.fit(X_train,y_train)
+            if random_state is not None:
+                set_supported_params(model, random_state=random_state)
+            if n_jobs not in (None, 1):
+                # The search already uses every worker, so models must not start their own threads
+                set_supported_params(model, n_jobs=1, thread_count=1)
 
-            y_train_pred = model.predict(X_train)
-            y_test_pred = model.predict(X_test)
+            start = time.perf_counter()
+            if search_strategy == "grid":
+                candidates = list(ParameterGrid(para))
+                scored = score_candidates(model, candidates, X_train, y_train, n_jobs=n_jobs, deadline=deadline)
+            elif search_strategy == "random":
+                n_candidates = min(n_iter, len(ParameterGrid(para)))
+                candidates = list(ParameterSampler(para, n_iter=n_candidates, random_state=random_state))
+                scored = score_candidates(model, candidates, X_train, y_train, n_jobs=n_jobs, deadline=deadline)
+            elif search_strategy == "halving":
+                candidates = list(ParameterGrid(para))
+                scored = successive_halving(model, candidates, X_train, y_train, n_jobs=n_jobs, deadline=deadline,
+                                            factor=halving_factor, random_state=random_state)
+            else:
+                raise ValueError(f"Unknown search strategy {search_strategy!r}")
+            best_score, best_params = scored[0]
+
+            # Refit the winning params once on the whole training set
+            best_model = clone(model).set_params(**best_params)
+            best_model.fit(X_train,y_train)
+            fit_time = time.perf_counter() - start
+
+            y_train_pred = best_model.predict(X_train)
+            y_test_pred = best_model.predict(X_test)
             train_model_score = r2_score(y_train, y_train_pred)
             test_model_score = r2_score(y_test, y_test_pred)
 
-            report[list(models.keys())[i]] = test_model_score
+            report[model_name] = {
+                "test_score": test_model_score,
+                "train_score": train_model_score,
+                "cv_score": best_score,
+                "fit_time": fit_time,
+                "best_params": best_params,
+                "n_candidates": len(scored),
+                # number of trees picked by early stopping, if the model used it
+                "best_iteration": getattr(best_model, "best_iteration_", None),
+                "model": best_model,
+            }
+            logging.info(f"{model_name}: cv r2 {best_score:.4f}, test r2 {test_model_score:.4f}, "
+                         f"fit time {fit_time:.2f}s, {len(scored)}/{len(candidates)} candidates scored, "
+                         f"best params {best_params}")
 
         return report
     
     except Exception as e:
-        raise CustomException(e, sys) 
-    
+        raise CustomException(e, sys)
+
+
+def predict_latency(model, X, n_repeats=50, batch_size=1000):
+    """
+    Median time of a single-row predict and of a predict on batch_size rows (X repeated as needed).
+    """
+    X = np.asarray(X)
+    row = X[:1]
+    batch = X[np.arange(batch_size) % len(X)]
+    # first calls pay for lazy initialisation, which a long-running server doesn't
+    model.predict(row)
+    model.predict(batch)
+
+    single_row_times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        model.predict(row)
+        single_row_times.append(time.perf_counter() - start)
+    batch_times = []
+    for _ in range(max(n_repeats // 10, 3)):
+        start = time.perf_counter()
+        model.predict(batch)
+        batch_times.append(time.perf_counter() - start)
+
+    batch_time = float(np.median(batch_times))
+    return {
+        "single_row_ms": float(np.median(single_row_times)) * 1e3,
+        "single_row_p95_ms": float(np.percentile(single_row_times, 95)) * 1e3,
+        "batch_size": batch_size,
+        "batch_ms": batch_time * 1e3,
+        "rows_per_second": batch_size / batch_time if batch_time else float("inf"),
+    }
+
+
+def profile_model(model, X, n_repeats=50, batch_size=1000):
+    """
+    Serving cost of a fitted model: predict latency (see predict_latency), pickled size in bytes
+    and the time to unpickle it.
+    """
+    try:
+        payload = pickle.dumps(model)
+        load_times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            pickle.loads(payload)
+            load_times.append(time.perf_counter() - start)
+
+        return {
+            **predict_latency(model, X, n_repeats=n_repeats, batch_size=batch_size),
+            "size_bytes": len(payload),
+            "load_ms": float(np.median(load_times)) * 1e3,
+        }
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
 
-def load_object(file_path):
+def pareto_front(report, maximize="test_score", minimize=("single_row_ms", "size_bytes")):
+    """
+    Names of the entries of report ({name: {metric: value}}) that no other entry beats on
+    every metric: at least as good on all of them and strictly better on one.
+    """
+    def costs(name):
+        return [-report[name][maximize]] + [report[name][metric] for metric in minimize]
+
+    front = []
+    for name in report:
+        dominated = any(
+            all(a <= b for a, b in zip(costs(other), costs(name))) and costs(other) != costs(name)
+            for other in report if other != name
+        )
+        if not dominated:
+            front.append(name)
+    return front
+
+
+def table_columns(file_path):
+    """
+    Returns the column names of a CSV or Parquet file without reading its rows.
+    """
+    try:
+        if file_path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            return pq.read_schema(file_path).names
+        return pd.read_csv(file_path, nrows=0).columns.tolist()
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def read_table(file_path, columns=None):
+    """
+    Reads a CSV or Parquet artifact. For Parquet only the requested columns are read from disk.
+    """
+    try:
+        if file_path.endswith(".parquet"):
+            return pd.read_parquet(file_path, columns=columns)
+        return pd.read_csv(file_path, usecols=columns)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def write_table(df, file_path):
+    try:
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        if file_path.endswith(".parquet"):
+            df.to_parquet(file_path, index=False)
+        else:
+            df.to_csv(file_path, index=False, header=True)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+class ChunkedTableWriter:
+    """
+    Appends DataFrame chunks to a CSV or Parquet file. The first chunk replaces any existing file.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._parquet_writer = None
+        self._n_chunks = 0
+
+    def write(self, df):
+        try:
+            if self.file_path.endswith(".parquet"):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                if self._parquet_writer is None:
+                    table = pa.Table.from_pandas(df, preserve_index=False)
+                    self._parquet_writer = pq.ParquetWriter(self.file_path, table.schema)
+                else:
+                    # Later chunks are cast to the first chunk's schema
+                    table = pa.Table.from_pandas(df, schema=self._parquet_writer.schema, preserve_index=False)
+                self._parquet_writer.write_table(table)
+            else:
+                df.to_csv(self.file_path, mode="a" if self._n_chunks else "w", index=False, header=not self._n_chunks)
+            self._n_chunks += 1
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_in_chunks(file_path, chunk_size, columns=None):
+    """
+    Yields a CSV, Parquet or Excel file as DataFrames of at most chunk_size rows,
+    reading only the given columns, so memory is bounded by the chunk size.
+    """
     try:
-        print(f"Loading object from: {file_path}")
-        with open(file_path, "rb") as file_obj:
-            return pickle.load(file_obj)
+        if file_path.endswith((".xlsx", ".xlsm")):
+            # pd.read_excel can't read in chunks, so stream the rows with openpyxl in read-only mode
+            import openpyxl
+
+            workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                header = [str(name) for name in next(rows)]
+                names = list(columns) if columns is not None else header
+                positions = [header.index(name) for name in names]
+
+                batch = []
+                for row in rows:
+                    batch.append([row[position] for position in positions])
+                    if len(batch) == chunk_size:
+                        yield pd.DataFrame(batch, columns=names)
+                        batch = []
+                if batch:
+                    yield pd.DataFrame(batch, columns=names)
+            finally:
+                workbook.close()
+        elif file_path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size, columns=columns):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(file_path, chunksize=chunk_size, usecols=columns)
 
     except Exception as e:
-        raise CustomException(e, sys)
\ No newline at end of file
+        raise CustomException(e, sys)
+
+
+def stack_features_and_target(features, target, file_path=None):
+    """
+    Puts the features and the target side by side in one array (target last) with a single copy,
+    instead of np.c_ building intermediate arrays. With a file_path the array is written to a
+    .npy file and returned memory-mapped, so training can read it without reparsing.
+    """
+    try:
+        shape = (features.shape[0], features.shape[1] + 1)
+        if file_path is None:
+            arr = np.empty(shape, dtype=np.float64)
+        else:
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            arr = np.lib.format.open_memmap(file_path, mode="w+", dtype=np.float64, shape=shape)
+
+        arr[:, :-1] = features
+        arr[:, -1] = target
+        if file_path is None:
+            return arr
+
+        arr.flush()
+        del arr
+        return load_array(file_path)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def load_array(file_path):
+    """
+    Memory-maps a .npy artifact instead of reading it into memory.
+    """
+    try:
+        return np.load(file_path, mmap_mode="r")
+
+    except Exception as e:
+        raise CustomException(e, sys)
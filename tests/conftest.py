@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Add the project root directory to sys.path
+sys.path.insert(0, ROOT_DIR)
+
+
+@pytest.fixture
+def in_repo(monkeypatch):
+    # the pipelines resolve artifacts/ relative to the working directory
+    monkeypatch.chdir(ROOT_DIR)
+    return ROOT_DIR
@@ -0,0 +1,138 @@
+import os
+import pickle
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from src.artifacts import ArtifactCache
+from src.exception import CustomException
+from src.pipeline.compact_model import export_compact_model
+from src.pipeline.predict_pipeline import FEATURE_COLUMNS, PredictPipeline
+from src.utils import save_object
+
+
+def touch(file_path, obj):
+    # a new version of the file, with an mtime that is sure to differ from the old one
+    save_object(file_path, obj)
+    mtime_ns = time.time_ns() + 1_000_000_000
+    os.utime(file_path, ns=(mtime_ns, mtime_ns))
+
+
+class CountingLoader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, file_path):
+        self.calls += 1
+        time.sleep(0.01)
+        with open(file_path, "rb") as file_obj:
+            return pickle.load(file_obj)
+
+
+def test_loads_once_and_reloads_on_change(tmp_path):
+    cache = ArtifactCache()
+    loader = CountingLoader()
+    file_path = str(tmp_path / "model.pkl")
+    save_object(file_path, {"version": 1})
+
+    assert cache.get(file_path, loader=loader) == {"version": 1}
+    assert cache.get(file_path, loader=loader) == {"version": 1}
+    assert loader.calls == 1
+    version = cache.version(file_path, loader=loader)
+
+    touch(file_path, {"version": 2})
+    assert cache.get(file_path, loader=loader) == {"version": 2}
+    assert loader.calls == 2
+    assert cache.version(file_path, loader=loader) != version
+
+    cache.clear()
+    assert cache.version(file_path, loader=loader) is None
+
+
+def test_concurrent_requests_load_once(tmp_path):
+    cache = ArtifactCache()
+    loader = CountingLoader()
+    file_path = str(tmp_path / "model.pkl")
+    save_object(file_path, {"version": 1})
+
+    threads = [threading.Thread(target=cache.get, args=(file_path, loader)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loader.calls == 1
+
+
+def test_dependency_change_reloads(tmp_path):
+    cache = ArtifactCache()
+    loader = CountingLoader()
+    file_path = str(tmp_path / "manifest.pkl")
+    dependency = str(tmp_path / "model.pkl")
+    save_object(file_path, {"export": 1})
+    save_object(dependency, {"version": 1})
+
+    cache.get(file_path, loader=loader, depends_on=(dependency,))
+    touch(dependency, {"version": 2})
+    cache.get(file_path, loader=loader, depends_on=(dependency,))
+    os.remove(dependency)
+    cache.get(file_path, loader=loader, depends_on=(dependency,))
+    assert loader.calls == 3
+
+
+def test_missing_file_fails(tmp_path):
+    with pytest.raises(CustomException):
+        ArtifactCache().get(str(tmp_path / "model.pkl"))
+
+
+@pytest.fixture
+def pipeline(in_repo, tmp_path):
+    shutil.copy(os.path.join("artifacts", "preprocessor.pkl"), tmp_path / "preprocessor.pkl")
+    pipeline = PredictPipeline()
+    config = pipeline.predict_pipeline_config
+    config.model_path = str(tmp_path / "model.pkl")
+    config.preprocessor_path = str(tmp_path / "preprocessor.pkl")
+    config.compact_model_dir = str(tmp_path / "compact_model")
+    config.artifact_lock_path = str(tmp_path / "artifacts.lock")
+    config.use_compiled_preprocessor = False
+    config.prediction_cache = False
+    config.micro_batching = False
+    config.drift_monitoring = False
+    return pipeline
+
+
+def fit_model(intercept_shift):
+    rng = np.random.RandomState(0)
+    X, y = rng.normal(size=(50, len(FEATURE_COLUMNS))), rng.normal(7, 0.3, size=50)
+    return LinearRegression().fit(X, y + intercept_shift)
+
+
+def readings():
+    return pd.read_csv(os.path.join("artifacts", "test.csv"))[FEATURE_COLUMNS].dropna(how="all").head(5)
+
+
+def test_retrained_model_is_picked_up(pipeline):
+    save_object(pipeline.predict_pipeline_config.model_path, fit_model(0.0))
+    before = pipeline.predict_now(readings())
+
+    # a retrain replaces the pickle while the server runs
+    touch(pipeline.predict_pipeline_config.model_path, fit_model(1.0))
+    after = pipeline.predict_now(readings())
+    assert np.allclose(after - before, 1.0)
+
+
+def test_stale_compact_export_falls_back_to_the_pickle(pipeline):
+    config = pipeline.predict_pipeline_config
+    model = fit_model(0.0)
+    save_object(config.model_path, model)
+    _, preprocessor = pipeline.load_artifacts()
+    export_compact_model(model, config.model_path, config.compact_model_dir, preprocessor.transform(readings()))
+    assert type(pipeline.load_model()).__name__ == "LinearModel"
+
+    # the pickle changes but the export made from the old one stays behind
+    touch(config.model_path, fit_model(1.0))
+    assert isinstance(pipeline.load_model(), LinearRegression)
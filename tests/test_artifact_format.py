@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.components.convert_artifacts import convert_artifact
+from src.exception import CustomException
+from src.utils import (
+    ChunkedTableWriter, load_array, read_table, stack_features_and_target, table_columns, write_table,
+)
+
+
+def make_frame():
+    return pd.DataFrame({"WP_ID": ["MLI28", "MLI29", "MLI30"], "Temp": [25.2, 26.0, np.nan], "pH": [6.8, 7.1, 7.0]})
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+def test_table_round_trip(tmp_path, extension):
+    file_path = str(tmp_path / "artifacts" / f"train{extension}")
+    write_table(make_frame(), file_path)
+
+    assert table_columns(file_path) == ["WP_ID", "Temp", "pH"]
+    pd.testing.assert_frame_equal(read_table(file_path), make_frame())
+    pd.testing.assert_frame_equal(read_table(file_path, columns=["Temp", "pH"]), make_frame()[["Temp", "pH"]])
+
+
+def test_missing_table_fails(tmp_path):
+    with pytest.raises(CustomException):
+        read_table(str(tmp_path / "train.parquet"))
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+def test_chunked_writer_appends(tmp_path, extension):
+    file_path = str(tmp_path / f"data{extension}")
+    write_table(make_frame().head(1), file_path)
+
+    # the first chunk replaces what was there, the later ones are appended
+    with ChunkedTableWriter(file_path) as writer:
+        writer.write(make_frame())
+        writer.write(make_frame())
+    result = read_table(file_path)
+    assert len(result) == 6
+    pd.testing.assert_frame_equal(result.tail(3).reset_index(drop=True), make_frame())
+
+
+def test_later_parquet_chunks_take_the_first_schema(tmp_path):
+    file_path = str(tmp_path / "data.parquet")
+    with ChunkedTableWriter(file_path) as writer:
+        writer.write(make_frame())
+        # a chunk where the float column happens to hold only whole numbers
+        writer.write(pd.DataFrame({"WP_ID": ["MLI31"], "Temp": [25], "pH": [7]}))
+    assert read_table(file_path)["Temp"].dtype == np.float64
+
+
+def test_convert_settles_one_type_per_column(tmp_path):
+    csv_path = str(tmp_path / "data.csv")
+    df = make_frame()
+    df["Comment"] = [np.nan, np.nan, "PVC pipes installed"]
+    df.to_csv(csv_path, index=False)
+
+    # the comment column is empty (numeric) in the first chunk and text in the second
+    parquet_path = convert_artifact(csv_path, chunk_size=2)
+    assert parquet_path == str(tmp_path / "data.parquet")
+    result = read_table(parquet_path)
+    assert result["Comment"].tolist()[2] == "PVC pipes installed"
+    assert result["Temp"].dtype == np.float64
+    assert len(result) == 3
+
+
+def test_stacked_arrays(tmp_path):
+    features = np.arange(12, dtype=np.float64).reshape(4, 3)
+    target = np.array([6.5, 7.0, 7.5, 8.0])
+    expected = np.c_[features, target]
+    assert np.array_equal(stack_features_and_target(features, target), expected)
+
+    # written to disk and handed back memory-mapped
+    file_path = str(tmp_path / "arrays" / "train_arr.npy")
+    arr = stack_features_and_target(features, target, file_path=file_path)
+    assert isinstance(arr, np.memmap)
+    assert np.array_equal(arr, expected)
+    assert np.array_equal(load_array(file_path), expected)
@@ -0,0 +1,109 @@
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline.predict_pipeline import FEATURE_COLUMNS, get_batch_as_data_frame
+
+
+@pytest.fixture
+def client(in_repo):
+    import app
+    return app.app.test_client()
+
+
+@pytest.fixture
+def readings(in_repo):
+    return pd.read_csv("artifacts/test.csv")[FEATURE_COLUMNS].dropna(how="all").head(25).reset_index(drop=True)
+
+
+def upload(client, text, query=""):
+    return client.post(f"/predictbatch{query}", data={"file": (io.BytesIO(text.encode()), "readings.csv")},
+                       content_type="multipart/form-data")
+
+
+def streamed_rows(response):
+    return list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_batch_parsing_flags_bad_rows():
+    records = pd.DataFrame([{column: "1.5" for column in FEATURE_COLUMNS} for _ in range(5)])
+    records.loc[1, "SEC"] = "inf"
+    records.loc[2, "Temp"] = "abc"
+    records.loc[3, :] = ""
+    records.loc[4, "Volume"] = ""
+    features, errors = get_batch_as_data_frame(records)
+    assert features.index.tolist() == [0, 4]
+    assert np.isnan(features.loc[4, "Volume"])
+    assert errors == {1: "Invalid value for ['SEC']", 2: "Invalid value for ['Temp']", 3: "Empty row"}
+
+
+def test_batch_parsing_rejects_booleans():
+    records = pd.DataFrame([{column: 1.0 for column in FEATURE_COLUMNS}, {column: True for column in FEATURE_COLUMNS}])
+    features, errors = get_batch_as_data_frame(records)
+    assert features.index.tolist() == [0]
+    assert list(errors) == [1]
+
+
+def test_batch_parsing_empty_batch():
+    features, errors = get_batch_as_data_frame(pd.DataFrame())
+    assert len(features) == 0 and errors == {}
+
+
+def test_json_batch(client, readings):
+    records = readings.to_dict("records")
+    records[3]["SEC"] = "not a number"
+    body = client.post("/predictbatch", json=records).get_json()
+    assert body["n_predicted"] == len(records) - 1 and body["n_errors"] == 1
+    assert body["results"][3] == {"row": 3, "error": "Invalid value for ['SEC']"}
+    assert all("pH" in result for i, result in enumerate(body["results"]) if i != 3)
+
+
+def test_bad_requests_are_json_400(client):
+    for response in [
+        client.post("/predictbatch", json={"Temp": 1}),
+        client.post("/predictbatch", json=[{"Temp": 1}]),
+        upload(client, ""),
+        upload(client, 'Temp,SEC\n"1,2\n'),
+    ]:
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+    assert "artifacts" not in client.post("/predictbatch", json=[{"Temp": 1}]).get_json()["error"]
+
+
+def test_empty_json_batch(client):
+    assert client.post("/predictbatch", json=[]).get_json() == {"results": [], "n_predicted": 0, "n_errors": 0}
+
+
+def test_csv_upload_matches_json(client, readings):
+    body = client.post("/predictbatch", json=readings.to_dict("records")).get_json()
+    uploaded = upload(client, readings.to_csv(index=False)).get_json()
+    assert uploaded == body
+
+
+def test_streamed_in_chunks(client, readings, monkeypatch):
+    import app
+    expected = client.post("/predictbatch", json=readings.to_dict("records")).get_json()["results"]
+    # several chunks, the last one shorter
+    monkeypatch.setattr(app, "STREAM_THRESHOLD_ROWS", 10)
+    lines = readings.to_csv(index=False).splitlines()
+    lines[13] = "x" + lines[13]
+
+    response = upload(client, "\n".join(lines) + "\n", query="?format=csv")
+    assert response.mimetype == "text/csv"
+    rows = streamed_rows(response)
+    assert [int(row["row"]) for row in rows] == list(range(len(readings)))
+    assert rows[12]["error"] == "Invalid value for ['Temp']"
+    for row, result in zip(rows, expected):
+        if row["row"] != "12":
+            assert float(row["pH"]) == pytest.approx(result["pH"])
+
+
+def test_large_json_batch_is_streamed(client, readings, monkeypatch):
+    import app
+    monkeypatch.setattr(app, "STREAM_THRESHOLD_ROWS", 10)
+    response = client.post("/predictbatch", json=readings.to_dict("records"))
+    assert response.mimetype == "text/csv"
+    assert len(streamed_rows(response)) == len(readings)
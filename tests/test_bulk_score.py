@@ -0,0 +1,91 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.exception import CustomException
+from src.pipeline.bulk_score import BulkScorer, PROGRESS_FILE, part_path
+from src.pipeline.predict_pipeline import PredictPipeline, FEATURE_COLUMNS
+
+ID_COLUMNS = ["WP_ID", "Date_Assessment"]
+
+
+@pytest.fixture
+def readings(in_repo, tmp_path):
+    df = pd.read_csv("artifacts/test.csv")[ID_COLUMNS + FEATURE_COLUMNS]
+    df["SEC"] = df["SEC"].astype(object)
+    df.loc[3, "SEC"] = "abc"
+    input_path = str(tmp_path / "readings.csv")
+    df.to_csv(input_path, index=False)
+    return df, input_path
+
+
+def read_output(output_dir):
+    parts = sorted(name for name in os.listdir(output_dir) if name.startswith("part-"))
+    return pd.concat([pd.read_parquet(os.path.join(output_dir, name)) for name in parts], ignore_index=True)
+
+
+def test_scores_every_row(readings, tmp_path):
+    df, input_path = readings
+    output_dir = str(tmp_path / "scored")
+    progress = BulkScorer(input_path, output_dir, chunk_size=15, workers=2).run()
+
+    assert progress["done"]
+    assert sorted(progress["completed"]) == ["0", "1", "2"]
+    output = read_output(output_dir)
+    assert progress["rows"] == len(output) == len(df)
+    assert output["WP_ID"].tolist() == df["WP_ID"].astype(str).tolist()
+
+    # the same predictions as scoring the whole file at once
+    rows, preds, errors = PredictPipeline().predict_batch(pd.read_csv(input_path)[FEATURE_COLUMNS])
+    assert np.allclose(output.loc[rows, "pH_predicted"], preds)
+    assert progress["errors"] == len(errors) == output["error"].notna().sum()
+    assert output["error"][3].startswith("Invalid value")
+    assert np.isnan(output["pH_predicted"][3])
+
+
+def test_rerun_only_scores_missing_chunks(readings, tmp_path):
+    _, input_path = readings
+    output_dir = str(tmp_path / "scored")
+    BulkScorer(input_path, output_dir, chunk_size=15, workers=1).run()
+
+    # a crash after the first chunk: its part is kept, the others are lost
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    with open(progress_path) as file_obj:
+        progress = json.load(file_obj)
+    progress["done"] = False
+    with open(progress_path, "w") as file_obj:
+        json.dump(progress, file_obj)
+    os.remove(part_path(output_dir, 1))
+    os.remove(part_path(output_dir, 2))
+    first_part_mtime = os.stat(part_path(output_dir, 0)).st_mtime_ns
+
+    progress = BulkScorer(input_path, output_dir, chunk_size=15, workers=1).run()
+    assert progress["done"]
+    assert os.stat(part_path(output_dir, 0)).st_mtime_ns == first_part_mtime
+    assert os.path.exists(part_path(output_dir, 2))
+    assert progress["rows"] == len(read_output(output_dir))
+
+
+def test_different_run_needs_restart(readings, tmp_path):
+    _, input_path = readings
+    output_dir = str(tmp_path / "scored")
+    BulkScorer(input_path, output_dir, chunk_size=15, workers=1).run()
+
+    with pytest.raises(CustomException, match="use --restart"):
+        BulkScorer(input_path, output_dir, chunk_size=10, workers=1).run()
+
+    progress = BulkScorer(input_path, output_dir, chunk_size=30, workers=1, restart=True).run()
+    assert sorted(progress["completed"]) == ["0", "1"]
+    # the parts of the old run are gone
+    assert not os.path.exists(part_path(output_dir, 2))
+
+
+def test_missing_columns_fail(readings, tmp_path):
+    df, _ = readings
+    input_path = str(tmp_path / "no_ids.csv")
+    df.drop(columns=["WP_ID"]).to_csv(input_path, index=False)
+    with pytest.raises(CustomException, match="Missing columns"):
+        BulkScorer(input_path, str(tmp_path / "scored"), workers=1).run()
@@ -0,0 +1,94 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from catboost import CatBoostRegressor
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from xgboost import XGBRegressor
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.pipeline.compact_model import (
+    export_compact_model, load_compact_model, TreeEnsembleModel, MANIFEST_FILE,
+)
+from src.utils import save_object
+
+
+def make_data(n_rows, seed):
+    rng = np.random.RandomState(seed)
+    X = rng.normal(size=(n_rows, 6))
+    y = 7 + 0.5 * X[:, 0] + np.sin(2 * X[:, 1]) + 0.3 * X[:, 2] * X[:, 3] + 0.05 * rng.normal(size=n_rows)
+    return X, y
+
+
+def export(model, tmp_path):
+    X, y = make_data(400, seed=0)
+    model.fit(X, y)
+    model_path = str(tmp_path / "model.pkl")
+    save_object(model_path, model)
+    manifest = export_compact_model(model, model_path, str(tmp_path / "compact_model"), make_data(200, seed=1)[0])
+    return model, manifest
+
+
+@pytest.mark.parametrize("model, kind", [
+    (LinearRegression(), "linear"),
+    (RandomForestRegressor(n_estimators=10, random_state=0), "tree_ensemble"),
+    (GradientBoostingRegressor(n_estimators=30, random_state=0), "tree_ensemble"),
+    # the boosters the trainer usually picks are flattened too, so they're memory-mapped like the rest
+    (XGBRegressor(n_estimators=50, max_depth=4), "tree_ensemble"),
+    (CatBoostRegressor(iterations=50, depth=4, verbose=False, random_seed=0, allow_writing_files=False), "tree_ensemble"),
+])
+def test_export_matches_model(model, kind, tmp_path):
+    model, manifest = export(model, tmp_path)
+    assert manifest["kind"] == kind
+    compact_model = load_compact_model(str(tmp_path / "compact_model" / MANIFEST_FILE))
+
+    X = make_data(300, seed=2)[0]
+    assert np.max(np.abs(compact_model.predict(X) - model.predict(X))) <= manifest["tolerance"]
+    if kind == "tree_ensemble":
+        assert isinstance(compact_model.feature, np.memmap)
+
+
+def test_booster_falls_back_to_native_format(tmp_path):
+    # absolute error has no flattened form, so the native model file is exported instead
+    model, manifest = export(XGBRegressor(n_estimators=20, objective="reg:absoluteerror"), tmp_path)
+    assert manifest["kind"] == "xgboost"
+    compact_model = load_compact_model(str(tmp_path / "compact_model" / MANIFEST_FILE))
+    X = make_data(50, seed=3)[0]
+    assert np.allclose(compact_model.predict(X), model.predict(X))
+
+
+def test_chunked_predict_matches_unchunked(tmp_path):
+    export(RandomForestRegressor(n_estimators=10, random_state=0), tmp_path)
+    compact_model = load_compact_model(str(tmp_path / "compact_model" / MANIFEST_FILE))
+    X = make_data(1000, seed=4)[0]
+    expected = compact_model.predict(X)
+
+    # 3 rows per chunk, with a shorter last chunk
+    compact_model.chunk_nodes = 3 * len(compact_model.roots)
+    assert np.array_equal(compact_model.predict(X), expected)
+    assert compact_model.predict(X[:0]).shape == (0,)
+
+
+def test_chunks_bound_node_indices(monkeypatch):
+    # one tree that's a single leaf, so every row lands on it
+    model = TreeEnsembleModel(
+        feature=np.array([-1]), threshold=np.array([0.0]), children_left=np.array([-1]),
+        children_right=np.array([-1]), value=np.array([1.5]), roots=np.array([0]), max_depth=0,
+        aggregate="sum", offset=0.0, chunk_nodes=100,
+    )
+    chunk_sizes = []
+    predict_rows = model._predict_rows
+    monkeypatch.setattr(model, "_predict_rows", lambda X: chunk_sizes.append(len(X)) or predict_rows(X))
+
+    assert np.array_equal(model.predict(np.zeros((250, 2))), np.full(250, 1.5))
+    assert chunk_sizes == [100, 100, 50]
+
+
+def test_stale_export_is_ignored(tmp_path):
+    export(LinearRegression(), tmp_path)
+    # a retrained pickle that the export wasn't made from
+    save_object(str(tmp_path / "model.pkl"), LinearRegression().fit(*make_data(50, seed=5)))
+    assert load_compact_model(str(tmp_path / "compact_model" / MANIFEST_FILE)) is None
@@ -0,0 +1,83 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.components.data_transformation import DataTransformation
+from src.pipeline.compiled_preprocessor import (
+    compile_preprocessor, export_compiled_preprocessor, load_compiled_preprocessor, MANIFEST_FILE,
+)
+from src.utils import save_object
+
+COLUMNS = ["Temp", "SEC", "Turbidity", "Total_Iron"]
+
+
+def make_frame(n_rows, seed):
+    rng = np.random.RandomState(seed)
+    X = pd.DataFrame(rng.normal(loc=[25, 1000, 5, 0.3], scale=[2, 300, 2, 0.1], size=(n_rows, len(COLUMNS))),
+                     columns=COLUMNS)
+    # missing values and outliers on both sides of the IQR bounds
+    X.iloc[rng.choice(n_rows, n_rows // 10, replace=False), 0] = np.nan
+    X.iloc[rng.choice(n_rows, n_rows // 10, replace=False), 2] = np.nan
+    X.iloc[::13, 1] = 10000
+    X.iloc[::17, 3] = -5
+    return X
+
+
+def fit_preprocessor(outlier_strategy):
+    data_transformation = DataTransformation()
+    data_transformation.data_transformation_config.outlier_strategy = outlier_strategy
+    preprocessor = data_transformation.get_data_transformer_object(COLUMNS)
+    return preprocessor.fit(make_frame(200, seed=0))
+
+
+@pytest.fixture(params=["median", "clip"])
+def preprocessor(request):
+    return fit_preprocessor(request.param)
+
+
+def test_batch_matches_sklearn(preprocessor):
+    compiled = compile_preprocessor(preprocessor)
+    assert compiled is not None
+    X = make_frame(100, seed=1)
+    assert np.allclose(compiled.transform(X), preprocessor.transform(X))
+
+
+def test_single_rows_match_sklearn(preprocessor):
+    compiled = compile_preprocessor(preprocessor)
+    X = make_frame(50, seed=2)
+    # every row has to come out the same as in sklearn when it's the only row of the request
+    for i in range(len(X)):
+        row = X.iloc[[i]]
+        assert np.allclose(compiled.transform(row), preprocessor.transform(row))
+
+
+def test_all_missing_row_matches_sklearn(preprocessor):
+    compiled = compile_preprocessor(preprocessor)
+    row = pd.DataFrame([[np.nan] * len(COLUMNS)], columns=COLUMNS)
+    assert np.allclose(compiled.transform(row), preprocessor.transform(row))
+
+
+def test_legacy_batch_median_matches_sklearn():
+    preprocessor = fit_preprocessor("median")
+    # handlers pickled before the rework replace outliers with the median of the batch
+    preprocessor.transformers_[0][1].named_steps["outlier_handler"].median = None
+    compiled = compile_preprocessor(preprocessor)
+    X = make_frame(100, seed=3)
+    assert np.allclose(compiled.transform(X), preprocessor.transform(X))
+    assert np.allclose(compiled.transform(X.iloc[[0]]), preprocessor.transform(X.iloc[[0]]))
+
+
+def test_export_round_trip(tmp_path, preprocessor):
+    preprocessor_path = str(tmp_path / "preprocessor.pkl")
+    export_dir = str(tmp_path / "compiled_preprocessor")
+    save_object(preprocessor_path, preprocessor)
+    assert export_compiled_preprocessor(preprocessor, preprocessor_path, export_dir) is not None
+
+    compiled = load_compiled_preprocessor(os.path.join(export_dir, MANIFEST_FILE))
+    X = make_frame(30, seed=4)
+    assert np.allclose(compiled.transform(X), preprocessor.transform(X))
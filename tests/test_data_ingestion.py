@@ -0,0 +1,92 @@
+import pandas as pd
+import pytest
+
+from src.components.data_ingestion import DataIngestion, DataIngestionConfig
+from src.exception import CustomException
+from src.utils import read_in_chunks, read_table
+
+
+@pytest.fixture
+def source(in_repo, tmp_path):
+    # the raw readings as the spreadsheet they're ingested from
+    df = pd.read_csv("artifacts/data.csv")
+    source_path = str(tmp_path / "source.xlsx")
+    df.to_excel(source_path, index=False)
+    return df, source_path
+
+
+def ingest(source_path, output_dir, **kwargs):
+    data_ingestion = DataIngestion()
+    data_ingestion.ingestion_config = DataIngestionConfig(
+        train_data_path=str(output_dir / "train.csv"),
+        test_data_path=str(output_dir / "test.csv"),
+        raw_data_path=str(output_dir / "data.csv"),
+        source_data_path=source_path,
+        **kwargs,
+    )
+    train_path, test_path = data_ingestion.initiate_data_ingestion()
+    return read_table(train_path), read_table(test_path)
+
+
+def test_streaming_keeps_sampled_rows_and_used_columns(source, tmp_path):
+    df, source_path = source
+    train, test = ingest(source_path, tmp_path, streaming=True, chunk_size=7)
+
+    config = DataIngestionConfig()
+    assert train.columns.tolist() == list(config.keep_columns)
+    assert len(train) + len(test) == (df["Sample_taken"] == "Sampled").sum()
+    assert 0 < len(test) < len(train)
+
+
+def test_split_doesnt_depend_on_the_chunks(source, tmp_path):
+    _, source_path = source
+    (tmp_path / "small").mkdir()
+    (tmp_path / "large").mkdir()
+    small = ingest(source_path, tmp_path / "small", streaming=True, chunk_size=7)
+    large = ingest(source_path, tmp_path / "large", streaming=True, chunk_size=1000)
+    for small_part, large_part in zip(small, large):
+        pd.testing.assert_frame_equal(small_part, large_part)
+
+
+def test_streaming_to_parquet(source, tmp_path):
+    _, source_path = source
+    (tmp_path / "csv").mkdir()
+    csv_parts = ingest(source_path, tmp_path / "csv", streaming=True, chunk_size=7)
+    parquet_parts = ingest(source_path, tmp_path, streaming=True, chunk_size=7, artifact_format="parquet")
+    assert (tmp_path / "train.parquet").exists()
+    for csv_part, parquet_part in zip(csv_parts, parquet_parts):
+        pd.testing.assert_frame_equal(csv_part, parquet_part)
+
+
+def test_forecasting_keeps_the_id_columns(source, tmp_path):
+    _, source_path = source
+    train, _ = ingest(source_path, tmp_path, streaming=True, chunk_size=7, forecasting=True)
+    assert train.columns.tolist()[:3] == ["WP_ID", "Date_Assessment", "Time_Assessment"]
+
+
+def test_full_read_keeps_every_row(source, tmp_path):
+    df, source_path = source
+    train, test = ingest(source_path, tmp_path)
+    assert len(train) + len(test) == len(df)
+    assert train.columns.tolist() == df.columns.tolist()
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet", ".xlsx"])
+def test_read_in_chunks(source, tmp_path, extension):
+    df, source_path = source
+    df = df[["WP_ID", "Temp", "pH"]]
+    file_path = source_path if extension == ".xlsx" else str(tmp_path / f"data{extension}")
+    if extension == ".csv":
+        df.to_csv(file_path, index=False)
+    elif extension == ".parquet":
+        df.to_parquet(file_path, index=False)
+
+    chunks = list(read_in_chunks(file_path, 64, columns=["WP_ID", "Temp", "pH"]))
+    assert [len(chunk) for chunk in chunks] == [64, 64, 64, 8]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), df, check_dtype=False)
+
+
+def test_missing_source_column_fails(source, tmp_path):
+    _, source_path = source
+    with pytest.raises(CustomException):
+        list(read_in_chunks(source_path, 64, columns=["WP_ID", "Depth"]))
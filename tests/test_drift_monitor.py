@@ -0,0 +1,139 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.pipeline.drift_monitor import (
+    DriftMonitor, bin_counts, build_drift_reference, load_drift_reference, save_drift_reference,
+    set_prediction_reference,
+)
+
+COLUMNS = ["Temp", "SEC", "Turbidity"]
+
+
+def make_frame(n_rows, seed, shift=0.0):
+    rng = np.random.RandomState(seed)
+    X = pd.DataFrame(rng.normal(loc=[25, 1000, 5], scale=[2, 300, 2], size=(n_rows, len(COLUMNS))), columns=COLUMNS)
+    X["Temp"] += shift
+    return X
+
+
+def make_predictions(n_rows, seed):
+    return np.random.RandomState(seed).normal(7, 0.5, size=n_rows)
+
+
+@pytest.fixture
+def reference():
+    X = make_frame(2000, seed=0)
+    return build_drift_reference(X, make_predictions(2000, seed=0), lower_bound=[20, 100, 0], upper_bound=[30, 1900, 10])
+
+
+def test_counts_match_per_column_binning(reference):
+    monitor = DriftMonitor(reference)
+    X = make_frame(500, seed=1)
+    X.iloc[::7, 1] = np.nan
+    predictions = make_predictions(500, seed=1)
+    monitor.observe(X, predictions)
+
+    counts = np.array(monitor.state()["counts"])
+    for i, column in enumerate(COLUMNS):
+        edges = np.asarray(reference["features"][column]["edges"])
+        assert np.array_equal(counts[monitor.offsets[i]:monitor.offsets[i + 1]], bin_counts(X[column], edges))
+    edges = np.asarray(reference["prediction"]["edges"])
+    assert np.array_equal(counts[monitor.offsets[-2]:], bin_counts(predictions, edges))
+
+
+def test_shifted_feature_is_flagged(reference):
+    monitor = DriftMonitor(reference, min_rows=300)
+    monitor.observe(make_frame(1000, seed=2, shift=4.0), make_predictions(1000, seed=2))
+    report = monitor.report()
+    assert report["drifted"] == ["Temp"]
+    assert not report["prediction_drifted"]
+    assert report["features"]["Temp"]["psi"] > report["psi_threshold"]
+    assert report["features"]["SEC"]["psi"] < report["psi_threshold"]
+
+
+def test_small_windows_are_not_flagged(reference):
+    monitor = DriftMonitor(reference, min_rows=300)
+    monitor.observe(make_frame(50, seed=3, shift=4.0), make_predictions(50, seed=3))
+    report = monitor.report()
+    assert report["insufficient_data"]
+    assert report["drifted"] == []
+    # the scores are still reported
+    assert report["features"]["Temp"]["psi"] > report["psi_threshold"]
+
+
+def test_old_windows_are_dropped(reference):
+    monitor = DriftMonitor(reference, window=500, min_rows=300)
+    monitor.observe(make_frame(500, seed=4, shift=4.0), make_predictions(500, seed=4))
+    assert monitor.report()["drifted"] == ["Temp"]
+
+    # two windows of normal readings push the shifted one out
+    for seed in (5, 6):
+        monitor.observe(make_frame(500, seed=seed), make_predictions(500, seed=seed))
+    report = monitor.report()
+    assert report["drifted"] == []
+    assert report["window_rows"] == 1000
+    assert report["rows_seen"] == 1500
+
+
+def test_outliers_are_counted(reference):
+    monitor = DriftMonitor(reference)
+    X = make_frame(100, seed=7)
+    X.loc[:9, "SEC"] = 5000
+    X.loc[10:14, "Turbidity"] = -3
+    monitor.observe(X, make_predictions(100, seed=7))
+    features = monitor.report()["features"]
+    assert features["SEC"]["outlier_replacements"] >= 10
+    assert features["Turbidity"]["outlier_replacements"] >= 5
+    assert features["SEC"]["outlier_rate"] == features["SEC"]["outlier_replacements"] / 100
+
+
+def test_states_of_processes_are_summed(reference):
+    first, second = DriftMonitor(reference), DriftMonitor(reference)
+    first.observe(make_frame(200, seed=8, shift=4.0), make_predictions(200, seed=8))
+    second.observe(make_frame(200, seed=9, shift=4.0), make_predictions(200, seed=9))
+
+    # neither has min_rows on its own, together they do
+    assert first.report()["insufficient_data"]
+    report = first.report([first.state(), second.state()])
+    assert report["processes"] == 2
+    assert report["window_rows"] == 400
+    assert report["drifted"] == ["Temp"]
+
+    # states counted in other bins (a different reference) are left out
+    other = build_drift_reference(make_frame(100, seed=10), make_predictions(100, seed=10), [0, 0, 0], [50, 5000, 50])
+    stranger = DriftMonitor(other)
+    stranger.observe(make_frame(200, seed=11), make_predictions(200, seed=11))
+    assert first.report([first.state(), stranger.state()])["processes"] == 1
+
+
+def test_unusable_batches(reference):
+    monitor = DriftMonitor(reference)
+    # not numeric: left out of the statistics
+    X = make_frame(10, seed=12).astype(object)
+    X.loc[0, "Temp"] = "abc"
+    monitor.observe(X, make_predictions(10, seed=12))
+    assert monitor.state()["rows_seen"] == 0
+
+    # a missing column only leaves that column's counts out
+    monitor.observe(make_frame(10, seed=13).drop(columns=["SEC"]), make_predictions(10, seed=13))
+    counts = np.array(monitor.state()["counts"])
+    assert counts[monitor.offsets[1]:monitor.offsets[2]].sum() == 0
+    assert counts[monitor.offsets[0]:monitor.offsets[1]].sum() == 10
+
+
+def test_prediction_reference_is_replaced(reference, tmp_path):
+    file_path = str(tmp_path / "drift_reference.json")
+    save_drift_reference(reference, file_path)
+    assert load_drift_reference(file_path)["prediction"]["source"] == "target"
+
+    set_prediction_reference(file_path, make_predictions(500, seed=14) + 1.0)
+    saved = load_drift_reference(file_path)
+    assert saved["prediction"]["source"] == "model"
+    assert sum(saved["prediction"]["counts"]) == 500
+    assert saved["features"] == reference["features"]
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from catboost import CatBoostRegressor
+from sklearn.ensemble import AdaBoostRegressor, GradientBoostingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import train_test_split
+from xgboost import XGBRegressor
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.components.model_trainer import BOOSTING_MODELS, ModelTrainer
+from src.utils import EarlyStoppingRegressor
+
+
+def make_data(n_rows, seed):
+    rng = np.random.RandomState(seed)
+    X = rng.normal(size=(n_rows, 4))
+    y = 7 + np.sin(2 * X[:, 0]) + 0.5 * X[:, 1] + 0.3 * rng.normal(size=n_rows)
+    return X, y
+
+
+def test_gradient_boosting_picks_the_best_stage():
+    X, y = make_data(300, seed=0)
+    model = EarlyStoppingRegressor(GradientBoostingRegressor(learning_rate=0.3, random_state=0),
+                                   max_iterations=100, patience=10, random_state=0).fit(X, y)
+
+    # growing stopped well before max_iterations, at the stage with the lowest held-out error so far
+    X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=0.2, random_state=0)
+    full = GradientBoostingRegressor(learning_rate=0.3, random_state=0, n_estimators=100).fit(X_fit, y_fit)
+    errors = [mean_squared_error(y_val, y_pred) for y_pred in full.staged_predict(X_val)]
+    assert model.best_iteration_ < 90
+    assert errors[model.best_iteration_ - 1] == min(errors[:model.best_iteration_])
+
+    # refitted on every row with that many trees
+    assert model.estimator_.n_estimators == model.best_iteration_
+    assert len(model.estimator_.estimators_) == model.best_iteration_
+    assert np.array_equal(model.predict(X), model.estimator_.predict(X))
+
+
+def test_adaboost_staged_predict_matches_sklearn():
+    X, y = make_data(200, seed=1)
+    model = AdaBoostRegressor(n_estimators=20, random_state=0).fit(X, y)
+    fast = list(EarlyStoppingRegressor._staged_predict(model, X))
+    assert len(fast) == 20
+    for y_fast, y_sklearn in zip(fast, model.staged_predict(X)):
+        assert np.allclose(y_fast, y_sklearn)
+
+
+@pytest.mark.parametrize("estimator, n_trees", [
+    (XGBRegressor(learning_rate=0.3), lambda model: model.get_booster().num_boosted_rounds()),
+    (CatBoostRegressor(learning_rate=0.3, verbose=False, allow_writing_files=False), lambda model: model.tree_count_),
+])
+def test_boosters_stop_early(estimator, n_trees):
+    # pure noise, so held-out error stops improving after a few trees
+    rng = np.random.RandomState(2)
+    X, y = rng.normal(size=(300, 4)), rng.normal(size=300)
+    model = EarlyStoppingRegressor(estimator, max_iterations=200, patience=5, random_state=0).fit(X, y)
+    assert 1 <= model.best_iteration_ < 200
+    assert n_trees(model.estimator_) == model.best_iteration_
+
+
+def test_unsupported_model_fails():
+    X, y = make_data(50, seed=3)
+    with pytest.raises(ValueError, match="isn't supported for Ridge"):
+        EarlyStoppingRegressor(Ridge()).fit(X, y)
+
+
+def test_trainer_drops_tree_counts_from_the_grid():
+    model_trainer = ModelTrainer()
+    model_trainer.model_trainer_config.early_stopping = True
+    models, params = model_trainer.get_models_and_params()
+    for model_name in BOOSTING_MODELS:
+        assert isinstance(models[model_name], EarlyStoppingRegressor)
+        assert params[model_name]
+        assert all(name.startswith("estimator__") for name in params[model_name])
+        assert not {"estimator__n_estimators", "estimator__iterations"} & set(params[model_name])
+    assert not isinstance(models["Random Forest"], EarlyStoppingRegressor)
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.exception import CustomException
+from src.pipeline import explainer as explainer_module
+from src.pipeline.explainer import Explainer
+from src.pipeline.predict_pipeline import FEATURE_COLUMNS
+
+
+@pytest.fixture(autouse=True)
+def small_explanations(in_repo, monkeypatch):
+    monkeypatch.setenv("PH_EXPLAIN_SAMPLES", "500")
+    monkeypatch.setattr(explainer_module, "_explanation_cache", OrderedDict())
+    monkeypatch.setattr(explainer_module, "_explanation_cache_artifacts", None)
+
+
+@pytest.fixture
+def readings():
+    return pd.read_csv("artifacts/test.csv")[FEATURE_COLUMNS].dropna(how="all").head(4).reset_index(drop=True)
+
+
+@pytest.fixture
+def client():
+    import app
+    return app.app.test_client()
+
+
+def test_explanations_limit_the_features(readings):
+    explanations = Explainer().explain(readings, num_features=3)
+    assert len(explanations) == len(readings)
+    for explanation in explanations:
+        assert len(explanation["features"]) == 3
+        assert {"intercept", "score", "local_prediction"} <= set(explanation)
+
+
+def test_repeated_rows_come_from_the_cache(readings, monkeypatch):
+    first = Explainer().explain(readings, num_features=3)
+    monkeypatch.setattr(Explainer, "sample", lambda *args: pytest.fail("explained again"))
+    assert Explainer().explain(readings, num_features=3) == first
+
+
+def test_public_lime_path_gives_the_same_explanations(readings, monkeypatch):
+    explainer = Explainer()
+    explainer.explainer_config.cache_size = 0
+    batched = explainer.explain(readings, num_features=4)
+    # as on a lime version without the private sampler
+    monkeypatch.setattr(explainer_module, "PRIVATE_SAMPLER", "_no_such_sampler")
+    one_by_one = explainer.explain(readings, num_features=4)
+    for a, b in zip(batched, one_by_one):
+        assert [f["feature"] for f in a["features"]] == [f["feature"] for f in b["features"]]
+        assert np.allclose([f["weight"] for f in a["features"]], [f["weight"] for f in b["features"]])
+        assert a["intercept"] == pytest.approx(b["intercept"])
+
+
+@pytest.mark.parametrize("num_features", [0, -1, 2.5, True])
+def test_explainer_rejects_bad_num_features(readings, num_features):
+    with pytest.raises(CustomException, match="positive integer"):
+        Explainer().explain(readings, num_features=num_features)
+
+
+@pytest.mark.parametrize("query", ["0", "-1", "abc", "1.5", ""])
+def test_endpoint_rejects_bad_num_features(client, readings, query):
+    response = client.post(f"/explain?num_features={query}", json=readings.to_dict("records"))
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "num_features must be a positive integer"}
+
+
+def test_endpoint_explains_and_reports_bad_rows(client, readings):
+    records = readings.to_dict("records")
+    records[1]["SEC"] = "abc"
+    response = client.post("/explain?num_features=2", json=records)
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["results"][1] == {"row": 1, "error": "Invalid value for ['SEC']"}
+    assert all(len(result["explanation"]["features"]) == 2 for i, result in enumerate(body["results"]) if i != 1)
+    assert body["prediction_ms"] >= 0 and body["explanation_ms"] >= 0
+
+
+def test_endpoint_hides_server_errors(client, readings, monkeypatch):
+    monkeypatch.setattr(Explainer, "load_explainer", lambda self: open("/nonexistent/train.csv"))
+    response = client.post("/explain", json=readings.to_dict("records"))
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "Internal server error"}
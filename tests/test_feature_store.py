@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.artifacts import load_object
+from src.components.data_transformation import DataTransformation
+from src.pipeline.feature_store import FeatureStore
+from src.utils import save_object
+
+
+def readings(rows):
+    return pd.DataFrame(rows, columns=["WP_ID", "Date_Assessment", "Time_Assessment", "pH", "SEC", "Temp"])
+
+
+HISTORY = readings([
+    ["A", "2021-03-01", "09:00", 7.0, 100.0, 20.0],
+    ["A", "2021-03-01", "15:00", 7.2, 200.0, 22.0],
+    ["B", "2021-03-02", "10:00", 6.5, 50.0, 25.0],
+    ["A", "2021-03-02", "09:00", 7.4, 300.0, 24.0],
+    ["A", "2021-03-03", "09:00", 7.6, 400.0, 26.0],
+])
+
+
+def test_features_describe_the_history_before_each_reading():
+    features = FeatureStore().fit_transform(HISTORY)
+    assert features.loc[0].isna().sum() == 4 and features.loc[0, "n_previous_readings"] == 0
+    assert features.loc[1, "prev_pH"] == 7.0 and features.loc[1, "hours_since_last_reading"] == 6
+    # rolling means over the last 3 readings only
+    assert features.loc[4, "SEC_rolling_mean"] == pytest.approx(200.0)
+    assert features.loc[4, "Temp_rolling_mean"] == pytest.approx(22.0)
+    assert features.loc[4, "n_previous_readings"] == 3
+    assert features.loc[2, "n_previous_readings"] == 0
+
+
+def test_row_order_does_not_matter():
+    shuffled = HISTORY.sample(frac=1, random_state=0)
+    assert FeatureStore().fit_transform(shuffled).sort_index().equals(FeatureStore().fit_transform(HISTORY))
+
+
+def test_same_day_readings_are_ordered_by_time():
+    features = FeatureStore().fit_transform(HISTORY.iloc[[1, 0]])
+    assert features.loc[1, "prev_pH"] == 7.0
+    assert np.isnan(features.loc[0, "prev_pH"])
+
+
+def test_older_readings_never_get_negative_hours():
+    store = FeatureStore()
+    store.observe(HISTORY)
+    late = store.transform(readings([["A", "2021-03-01", "12:00", np.nan, 1.0, 1.0]]))
+    assert late.loc[0, "hours_since_last_reading"] == 0
+    # and can't be added behind the latest one
+    assert store.observe(readings([["A", "2021-03-01", "12:00", 9.9, 1.0, 1.0]])) == 0
+
+
+def test_store_survives_pickling(tmp_path):
+    store = FeatureStore()
+    store.observe(HISTORY)
+    save_object(str(tmp_path / "store.pkl"), store)
+    loaded = load_object(str(tmp_path / "store.pkl"))
+    assert loaded.transform(HISTORY).equals(store.transform(HISTORY))
+    loaded.observe(readings([["B", "2021-03-05", "10:00", 6.0, 1.0, 1.0]]))
+
+
+def test_test_labels_do_not_reach_training_features(tmp_path):
+    data_transformation = DataTransformation()
+    data_transformation.data_transformation_config.feature_store_path = str(tmp_path / "feature_store.pkl")
+    train = HISTORY.iloc[[0, 3, 4]]
+    # taken between the two first training readings, with a pH no training reading has
+    test = readings([["A", "2021-03-01", "15:00", 9.9, 900.0, 30.0]]).set_index(pd.Index([1]))
+
+    train_out, test_out = data_transformation.add_forecasting_features(train, test)
+    assert 9.9 not in train_out["prev_pH"].tolist()
+    assert train_out.loc[3, "prev_pH"] == 7.0 and train_out.loc[3, "n_previous_readings"] == 1
+    assert train_out.loc[3, "SEC_rolling_mean"] == 100.0
+    # replayed after every training reading: the latest one known, and no negative gap
+    assert test_out.loc[1, "prev_pH"] == 7.6
+    assert test_out.loc[1, "hours_since_last_reading"] == 0
+
+    # serving knows every reading
+    store = load_object(data_transformation.data_transformation_config.feature_store_path)
+    assert store._states["A"].n_readings == 4
+    assert store._states["A"].lags["pH"] == 7.6
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from src.artifacts import artifact_lock, load_object
+from src.components.data_transformation import DataTransformation
+from src.components.incremental_trainer import IncrementalTrainer
+from src.exception import CustomException
+from src.utils import save_object
+
+COLUMNS = ["Temp", "SEC", "Turbidity", "Total_Iron"]
+COEF = np.array([0.05, 0.001, -0.02, 0.5])
+
+
+def make_readings(n_rows, seed, shift=0.0):
+    rng = np.random.RandomState(seed)
+    X = rng.normal(loc=[25 + shift, 1000, 5, 0.3], scale=[2, 300, 2, 0.1], size=(n_rows, len(COLUMNS)))
+    df = pd.DataFrame(X, columns=COLUMNS)
+    df["pH"] = 5 + X @ COEF + rng.normal(scale=0.05, size=n_rows)
+    # a few missing values and outliers for the frozen imputer and outlier handler
+    df.iloc[::11, 0] = np.nan
+    df.iloc[::13, 1] = 10000
+    return df
+
+
+def steps(preprocessor):
+    return preprocessor.transformers_[0][1].named_steps
+
+
+@pytest.fixture
+def trainer(tmp_path):
+    train, test = make_readings(300, seed=0), make_readings(100, seed=1)
+    train.to_csv(tmp_path / "train.csv", index=False)
+    test.to_csv(tmp_path / "test.csv", index=False)
+
+    preprocessor = DataTransformation().get_data_transformer_object(COLUMNS)
+    model = LinearRegression().fit(preprocessor.fit_transform(train[COLUMNS]), train["pH"])
+    save_object(str(tmp_path / "preprocessor.pkl"), preprocessor)
+    save_object(str(tmp_path / "model.pkl"), model)
+
+    trainer = IncrementalTrainer()
+    config = trainer.incremental_trainer_config
+    for name in ("model_path", "preprocessor_path", "training_stats_path", "artifact_lock_path"):
+        setattr(config, name, str(tmp_path / os.path.basename(getattr(config, name))))
+    config.compact_model_dir = str(tmp_path / "compact_model")
+    config.compiled_preprocessor_dir = str(tmp_path / "compiled_preprocessor")
+    config.train_data_path = str(tmp_path / "train.csv")
+    config.test_data_path = str(tmp_path / "test.csv")
+    config.max_score_drop = 0.05
+    return trainer
+
+
+def write_new_readings(tmp_path, seed, shift=0.0):
+    path = str(tmp_path / f"new_{seed}.csv")
+    make_readings(200, seed=seed, shift=shift).to_csv(path, index=False)
+    return path
+
+
+def test_linear_refresh_equals_refit_through_the_frozen_steps(trainer, tmp_path):
+    config = trainer.incremental_trainer_config
+    before = load_object(config.preprocessor_path)
+    new_path = write_new_readings(tmp_path, seed=2, shift=3.0)
+
+    result = trainer.refresh(new_path)
+    assert result["promoted"]
+    model, preprocessor = load_object(config.model_path), load_object(config.preprocessor_path)
+
+    # imputer medians and outlier bounds stay as fitted by the full training, only the scaler moves
+    assert np.array_equal(steps(preprocessor)["imputer"].statistics_, steps(before)["imputer"].statistics_)
+    assert np.array_equal(steps(preprocessor)["outlier_handler"].lower_bound, steps(before)["outlier_handler"].lower_bound)
+    assert np.array_equal(steps(preprocessor)["outlier_handler"].upper_bound, steps(before)["outlier_handler"].upper_bound)
+    assert steps(preprocessor)["scaler"].n_samples_seen_ == 500
+
+    # same as fitting on every row through those frozen steps and a scaler of all rows
+    rows = pd.concat([pd.read_csv(config.train_data_path), pd.read_csv(new_path)])
+    frozen = before.transformers_[0][1][:-1]
+    Z = frozen.transform(rows[COLUMNS])
+    expected = LinearRegression().fit((Z - Z.mean(axis=0)) / Z.std(axis=0), rows["pH"])
+    assert np.allclose(model.coef_, expected.coef_)
+    assert np.isclose(model.intercept_, expected.intercept_)
+    assert np.allclose(preprocessor.transform(rows[COLUMNS]), (Z - Z.mean(axis=0)) / Z.std(axis=0))
+
+
+def test_a_file_is_trained_on_once(trainer, tmp_path):
+    new_path = write_new_readings(tmp_path, seed=3)
+    assert trainer.refresh(new_path)["promoted"]
+    assert trainer.refresh(new_path) == {"promoted": False, "reason": "already trained on"}
+
+
+def test_worse_model_is_not_promoted(trainer, tmp_path):
+    config = trainer.incremental_trainer_config
+    config.max_score_drop = 0.0
+    config.min_score = 1.01
+    model_bytes = open(config.model_path, "rb").read()
+    result = trainer.refresh(write_new_readings(tmp_path, seed=4))
+    assert not result["promoted"]
+    assert open(config.model_path, "rb").read() == model_bytes
+    assert not os.path.exists(config.training_stats_path)
+
+
+def test_legacy_preprocessor_needs_a_full_training(trainer, tmp_path):
+    config = trainer.incremental_trainer_config
+    preprocessor = load_object(config.preprocessor_path)
+    steps(preprocessor)["outlier_handler"].median = None
+    save_object(config.preprocessor_path, preprocessor)
+    with pytest.raises(CustomException, match="full training"):
+        trainer.refresh(write_new_readings(tmp_path, seed=5))
+
+
+def test_swap_waits_for_readers(trainer, tmp_path):
+    config = trainer.incremental_trainer_config
+    stamps = {path: os.stat(path).st_mtime_ns for path in (config.model_path, config.preprocessor_path)}
+    refresh = threading.Thread(target=trainer.refresh, args=(write_new_readings(tmp_path, seed=6, shift=3.0),))
+    with artifact_lock(config.artifact_lock_path):
+        # a server is loading the artifacts: neither pickle may be replaced until it's done
+        refresh.start()
+        time.sleep(1.0)
+        assert {path: os.stat(path).st_mtime_ns for path in stamps} == stamps
+    refresh.join()
+    assert all(os.stat(path).st_mtime_ns != stamp for path, stamp in stamps.items())
+
+
+def test_readers_wait_for_a_swap(in_repo, tmp_path):
+    from src.pipeline.predict_pipeline import PredictPipeline
+
+    pipeline = PredictPipeline()
+    pipeline.predict_pipeline_config.artifact_lock_path = str(tmp_path / "artifacts.lock")
+    loaded = []
+    reader = threading.Thread(target=lambda: loaded.append(pipeline.load_artifacts()))
+    with artifact_lock(pipeline.predict_pipeline_config.artifact_lock_path, exclusive=True):
+        reader.start()
+        reader.join(timeout=0.5)
+        assert reader.is_alive() and not loaded
+    reader.join()
+    assert len(loaded) == 1
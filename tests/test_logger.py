@@ -0,0 +1,68 @@
+import glob
+import logging
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from src.logger import LazyRotatingFileHandler, LazyTimedRotatingFileHandler, fcntl
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="rotation is only shared between processes with flock")
+
+N_PROCESSES = 4
+
+
+def write_records(handler, worker, n_records, pause=0.0):
+    for i in range(n_records):
+        handler.handle(logging.makeLogRecord({"msg": f"{worker} {i} " + "x" * 50}))
+        time.sleep(pause)
+    handler.close()
+
+
+def run_workers(handler, n_records, pause=0.0):
+    # the handler is made before the fork, as the gunicorn master does
+    handler.handle(logging.makeLogRecord({"msg": "master"}))
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=write_records, args=(handler, worker, n_records, pause))
+               for worker in range(N_PROCESSES)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    handler.close()
+
+
+def logged_lines(log_path):
+    lines = []
+    for path in glob.glob(f"{log_path}*"):
+        if not path.endswith(".lock"):
+            with open(path) as file_obj:
+                lines += file_obj.read().splitlines()
+    return lines
+
+
+def expected_lines(n_records):
+    return sorted(["master"] + [f"{worker} {i} " + "x" * 50 for worker in range(N_PROCESSES) for i in range(n_records)])
+
+
+def test_size_rotation_keeps_every_line(tmp_path):
+    log_path = str(tmp_path / "logs" / "server.log")
+    handler = LazyRotatingFileHandler(log_path, maxBytes=4000, backupCount=1000, delay=True)
+    run_workers(handler, n_records=300)
+
+    assert sorted(logged_lines(log_path)) == expected_lines(300)
+    backups = [path for path in glob.glob(f"{log_path}.*") if not path.endswith(".lock")]
+    assert len(backups) > 10
+    # rotated by whichever process got there first, never past the size by more than a record
+    assert all(os.path.getsize(path) < 4000 for path in backups)
+
+
+def test_time_rotation_keeps_every_line(tmp_path):
+    log_path = str(tmp_path / "logs" / "server.log")
+    handler = LazyTimedRotatingFileHandler(log_path, when="S", backupCount=0, delay=True)
+    run_workers(handler, n_records=100, pause=0.025)
+
+    assert sorted(logged_lines(log_path)) == expected_lines(100)
+    assert len(glob.glob(f"{log_path}.*")) > 2
@@ -0,0 +1,125 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.metrics import MetricsRegistry, load_processes, stage_seconds, timed
+
+
+def test_counter_and_gauge_render():
+    metrics = MetricsRegistry()
+    counter = metrics.counter("ph_test_total", "Test counter", labels=("endpoint",))
+    counter.inc(endpoint="predict")
+    counter.inc(2, endpoint="predict")
+    metrics.gauge("ph_test_depth", "Test gauge").set(7)
+
+    assert metrics.render().splitlines() == [
+        "# HELP ph_test_total Test counter",
+        "# TYPE ph_test_total counter",
+        'ph_test_total{endpoint="predict"} 3',
+        "# HELP ph_test_depth Test gauge",
+        "# TYPE ph_test_depth gauge",
+        "ph_test_depth 7",
+    ]
+    # registering the same name again returns the existing metric
+    assert metrics.counter("ph_test_total", "Test counter", labels=("endpoint",)) is counter
+
+
+def test_wrong_labels_raise():
+    counter = MetricsRegistry().counter("ph_test_total", "Test counter", labels=("endpoint",))
+    with pytest.raises(ValueError, match="expects labels"):
+        counter.inc(status=200)
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = MetricsRegistry()
+    histogram = metrics.histogram("ph_test_seconds", "Test histogram", buckets=(0.1, 1.0))
+    # a value on a bound counts in that bucket, like Prometheus' le
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    lines = metrics.render(pid=42).splitlines()
+    assert lines[2:] == [
+        'ph_test_seconds_bucket{pid="42",le="0.1"} 2',
+        'ph_test_seconds_bucket{pid="42",le="1.0"} 3',
+        'ph_test_seconds_bucket{pid="42",le="+Inf"} 4',
+        'ph_test_seconds_sum{pid="42"} 2.65',
+        'ph_test_seconds_count{pid="42"} 4',
+    ]
+
+
+def test_timed_records_blocks_and_functions():
+    def observed(stage):
+        return sum(sum(counts) for key, (counts, _) in stage_seconds.snapshot()["values"] if key == [stage])
+
+    @timed("test_decorated")
+    def work():
+        return 1
+
+    with timed("test_block"):
+        pass
+    assert work() == 1
+    assert work() == 1
+    assert observed("test_block") == 1
+    assert observed("test_decorated") == 2
+
+
+def test_process_states_are_merged(tmp_path):
+    metrics = MetricsRegistry()
+    metrics.counter("ph_test_total", "Test counter").inc(3)
+    metrics.collector("extra", lambda: {"rows": 5})
+    metrics.save_process(str(tmp_path))
+
+    # another live process (the test runner's parent) with its own count
+    with open(tmp_path / f"{os.getpid()}.json") as file_obj:
+        state = json.load(file_obj)
+    assert state["collected"] == {"extra": {"rows": 5}}
+    state["metrics"]["ph_test_total"]["values"] = [[[], 4]]
+    with open(tmp_path / f"{os.getppid()}.json", "w") as file_obj:
+        json.dump(state, file_obj)
+
+    # a process that's gone, and a file that isn't a process's
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    (tmp_path / f"{dead.pid}.json").write_text(json.dumps(state))
+    (tmp_path / "notes.json").write_text("{}")
+
+    processes = load_processes(str(tmp_path))
+    assert sorted(processes) == sorted([os.getpid(), os.getppid()])
+    assert not (tmp_path / f"{dead.pid}.json").exists()
+    assert (tmp_path / "notes.json").exists()
+
+    lines = metrics.render_processes(processes).splitlines()
+    assert lines.count("# TYPE ph_test_total counter") == 1
+    assert f'ph_test_total{{pid="{os.getpid()}"}} 3' in lines
+    assert f'ph_test_total{{pid="{os.getppid()}"}} 4' in lines
+
+
+def test_write_textfile(tmp_path):
+    metrics = MetricsRegistry()
+    metrics.gauge("ph_test_r2", "Test gauge").set(0.7)
+    file_path = tmp_path / "training" / "metrics.prom"
+    metrics.write(str(file_path))
+    assert file_path.read_text().endswith("ph_test_r2 0.7\n")
+    assert not os.path.exists(f"{file_path}.tmp")
+
+
+def test_metrics_endpoint_counts_requests(in_repo, monkeypatch):
+    monkeypatch.delenv("PH_METRICS_DIR", raising=False)
+    import app
+    client = app.app.test_client()
+    client.get("/")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert f'ph_requests_total{{endpoint="index",status="200",pid="{os.getpid()}"}}' in body
+    # /metrics itself isn't counted
+    assert 'endpoint="metrics"' not in body
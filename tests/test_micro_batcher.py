@@ -0,0 +1,100 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline import predict_pipeline
+from src.pipeline.micro_batcher import MicroBatcher
+from src.pipeline.predict_pipeline import PredictPipeline, FEATURE_COLUMNS
+from src.utils import save_object
+from tests.test_compiled_preprocessor import fit_preprocessor
+
+
+@pytest.fixture
+def readings(in_repo):
+    return pd.read_csv("artifacts/test.csv")[FEATURE_COLUMNS].dropna(how="all").head(32).reset_index(drop=True)
+
+
+@pytest.fixture
+def fresh_batcher(monkeypatch):
+    # one micro-batcher per process, started over for every test
+    monkeypatch.setattr(predict_pipeline, "_micro_batcher", None)
+    monkeypatch.setattr(predict_pipeline, "_ignored_settings", set())
+
+
+def predict_concurrently(predict, rows):
+    results = [None] * len(rows)
+    barrier = threading.Barrier(len(rows))
+
+    def request(i):
+        barrier.wait()
+        results[i] = predict(rows[i])
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(len(rows))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_callers_get_their_own_rows():
+    batch_sizes = []
+
+    def predict_fn(features):
+        batch_sizes.append(len(features))
+        return features["x"].to_numpy() * 2
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=8, max_wait_ms=50)
+    rows = [pd.DataFrame({"x": [float(i)] * (1 + i % 3)}) for i in range(20)]
+    results = predict_concurrently(batcher.predict, rows)
+    for row, result in zip(rows, results):
+        assert np.array_equal(result, row["x"].to_numpy() * 2)
+    assert max(batch_sizes) > 1
+    assert batcher.stats()["requests"] == 20 and batcher.stats()["rows"] == sum(map(len, rows))
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    def predict_fn(features):
+        raise ValueError("broken model")
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(Exception, match="broken model"):
+        batcher.predict(pd.DataFrame({"x": [1.0]}))
+
+
+def test_batched_predictions_equal_single_ones(readings, fresh_batcher):
+    pipeline = PredictPipeline()
+    pipeline.predict_pipeline_config.micro_batching = True
+    pipeline.predict_pipeline_config.max_wait_ms = 50
+    rows = [readings.iloc[[i]] for i in range(len(readings))]
+
+    batched = predict_concurrently(pipeline.predict_uncached, rows)
+    stats = predict_pipeline.get_micro_batcher().stats()
+    assert stats["batches"] < len(rows)
+    for row, pred in zip(rows, batched):
+        assert np.allclose(pred, pipeline.predict_now(row))
+
+
+def test_legacy_preprocessor_bypasses_the_batcher(tmp_path, readings, fresh_batcher, monkeypatch, caplog):
+    preprocessor = fit_preprocessor("median")
+    # handlers pickled before the rework replace outliers with the median of the batch
+    preprocessor.transformers_[0][1].named_steps["outlier_handler"].median = None
+    legacy_path = str(tmp_path / "preprocessor.pkl")
+    save_object(legacy_path, preprocessor)
+
+    pipeline = PredictPipeline()
+    config = pipeline.predict_pipeline_config
+    config.micro_batching = True
+    config.use_compiled_preprocessor = False
+    config.preprocessor_path = legacy_path
+    monkeypatch.setattr(predict_pipeline, "get_micro_batcher", lambda config=None: pytest.fail("batcher used"))
+
+    row = readings[["Temp", "SEC", "Turbidity", "Total_Iron"]].iloc[[0]]
+    monkeypatch.setattr(predict_pipeline, "FEATURE_COLUMNS", list(row.columns))
+    monkeypatch.setattr(pipeline, "load_model", lambda: type("Model", (), {"predict": lambda self, X: X.sum(axis=1)})())
+    with caplog.at_level("WARNING"):
+        pipeline.predict_uncached(row)
+        pipeline.predict_uncached(row)
+    assert [record.getMessage().startswith("PH_MICRO_BATCHING is ignored") for record in caplog.records] == [True]
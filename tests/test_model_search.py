@@ -0,0 +1,128 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import GridSearchCV, ParameterGrid
+from sklearn.tree import DecisionTreeRegressor
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.exception import CustomException
+from src import utils
+from src.utils import EarlyStoppingRegressor, evaluate_models, set_supported_params, successive_halving
+
+RIDGE_GRID = {"alpha": [0.01, 0.1, 1.0, 10.0, 100.0, 1000.0, 10000.0, 100000.0, 1000000.0]}
+
+
+def make_data(n_rows, seed):
+    rng = np.random.RandomState(seed)
+    X = rng.normal(size=(n_rows, 4))
+    y = 7 + X @ np.array([0.5, -0.3, 0.2, 0.0]) + 0.1 * rng.normal(size=n_rows)
+    return X, y
+
+
+class CountingRidge(Ridge):
+    fits = 0
+
+    def fit(self, X, y, sample_weight=None):
+        CountingRidge.fits += 1
+        return super().fit(X, y, sample_weight)
+
+
+def search(models, param, **kwargs):
+    X_train, y_train = make_data(270, seed=0)
+    X_test, y_test = make_data(100, seed=1)
+    return evaluate_models(X_train, y_train, X_test, y_test, models, param, **kwargs)
+
+
+def test_grid_search_matches_grid_search_cv():
+    report = search({"Decision Tree": DecisionTreeRegressor(random_state=0)},
+                    {"Decision Tree": {"max_depth": [1, 2, 4, 8], "min_samples_leaf": [1, 5]}})
+    result = report["Decision Tree"]
+
+    X_train, y_train = make_data(270, seed=0)
+    gs = GridSearchCV(DecisionTreeRegressor(random_state=0), {"max_depth": [1, 2, 4, 8], "min_samples_leaf": [1, 5]}, cv=3)
+    gs.fit(X_train, y_train)
+    assert result["best_params"] == gs.best_params_
+    assert result["cv_score"] == pytest.approx(gs.best_score_)
+    assert result["n_candidates"] == 8
+    assert set(result) == {"test_score", "train_score", "cv_score", "fit_time", "best_params",
+                           "n_candidates", "best_iteration", "model"}
+    assert result["model"].get_params()["max_depth"] == gs.best_params_["max_depth"]
+
+
+def test_best_params_are_fitted_once():
+    CountingRidge.fits = 0
+    search({"Ridge": CountingRidge()}, {"Ridge": {"alpha": [0.1, 1.0, 10.0]}}, n_jobs=1)
+    # 3 folds per candidate, then one refit of the winner on all rows
+    assert CountingRidge.fits == 3 * 3 + 1
+
+
+def test_parallel_search_matches_serial():
+    models = {"Decision Tree": DecisionTreeRegressor(), "Ridge": Ridge()}
+    param = {"Decision Tree": {"max_depth": [2, 4, 8]}, "Ridge": {"alpha": [0.1, 10.0]}}
+    serial = search(models, param, n_jobs=1, random_state=0)
+    parallel = search(models, param, n_jobs=2, random_state=0)
+    for model_name in models:
+        assert parallel[model_name]["best_params"] == serial[model_name]["best_params"]
+        assert parallel[model_name]["test_score"] == pytest.approx(serial[model_name]["test_score"])
+
+
+def test_unknown_strategy_fails():
+    with pytest.raises(CustomException, match="Unknown search strategy"):
+        search({"Ridge": Ridge()}, {"Ridge": {"alpha": [1.0]}}, search_strategy="bayes")
+
+
+def test_supported_params_only():
+    model = set_supported_params(Ridge(), random_state=3, n_jobs=1, thread_count=1)
+    assert model.random_state == 3
+    # passed on to the model inside the wrapper
+    wrapped = set_supported_params(EarlyStoppingRegressor(DecisionTreeRegressor()), random_state=5)
+    assert wrapped.random_state == 5
+    assert wrapped.estimator.random_state == 5
+
+
+def test_random_search_samples_n_iter():
+    report = search({"Ridge": Ridge()}, {"Ridge": RIDGE_GRID}, search_strategy="random", n_iter=4, random_state=0)
+    assert report["Ridge"]["n_candidates"] == 4
+    # never more than the grid has
+    report = search({"Ridge": Ridge()}, {"Ridge": {"alpha": [0.1, 1.0]}}, search_strategy="random", n_iter=10,
+                    random_state=0)
+    assert report["Ridge"]["n_candidates"] == 2
+
+
+def test_successive_halving_rounds(monkeypatch):
+    rounds = []
+    score_candidates = utils.score_candidates
+
+    def record(model, candidates, X, y, **kwargs):
+        rounds.append((len(candidates), len(y)))
+        return score_candidates(model, candidates, X, y, **kwargs)
+
+    monkeypatch.setattr(utils, "score_candidates", record)
+    X, y = make_data(270, seed=0)
+    scored = successive_halving(Ridge(), list(ParameterGrid(RIDGE_GRID)), X, y, factor=3, random_state=0)
+
+    # a third of the candidates on three times the rows each round, the last one on every row
+    assert rounds == [(9, 30), (3, 90), (1, 270)]
+    assert len(scored) == 1
+    assert scored[0][1]["alpha"] <= 1.0
+
+
+def test_halving_strategy_finds_good_params():
+    report = search({"Ridge": Ridge()}, {"Ridge": RIDGE_GRID}, search_strategy="halving", random_state=0)
+    grid = search({"Ridge": Ridge()}, {"Ridge": RIDGE_GRID})
+    assert report["Ridge"]["test_score"] == pytest.approx(grid["Ridge"]["test_score"], abs=0.01)
+
+
+def test_time_budgets_stop_the_search():
+    # the budget is checked between batches of 2 * n_jobs candidates, and at least one batch is scored
+    report = search({"Ridge": Ridge()}, {"Ridge": RIDGE_GRID}, n_jobs=1, model_time_budget=0)
+    assert report["Ridge"]["n_candidates"] == 2
+
+    # the total budget skips the models it has no time left for
+    report = search({"Ridge": Ridge(), "Decision Tree": DecisionTreeRegressor()},
+                    {"Ridge": RIDGE_GRID, "Decision Tree": {"max_depth": [2, 4]}}, total_time_budget=0)
+    assert report == {}
@@ -0,0 +1,94 @@
+import json
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+
+from src.components.model_trainer import ModelTrainer
+from src.utils import pareto_front, profile_model, save_object
+
+
+def candidate(test_score, single_row_ms, size_bytes):
+    return {"test_score": test_score, "profile": {"single_row_ms": single_row_ms, "size_bytes": size_bytes}}
+
+
+REPORT = {
+    "Random Forest": candidate(0.80, 5.0, 50_000_000),
+    "Gradient Boosting": candidate(0.79, 1.0, 2_000_000),
+    "Ridge": candidate(0.70, 0.1, 1_000),
+    "Decision Tree": candidate(0.60, 0.2, 5_000),
+}
+
+
+@pytest.fixture
+def model_trainer():
+    return ModelTrainer()
+
+
+def test_best_score_wins_by_default(model_trainer):
+    assert model_trainer.select_model(REPORT) == "Random Forest"
+
+
+def test_budgets_rule_out_slow_and_large_models(model_trainer):
+    model_trainer.model_trainer_config.max_latency_ms = 2.0
+    assert model_trainer.select_model(REPORT) == "Gradient Boosting"
+    model_trainer.model_trainer_config.max_model_size_mb = 1.0
+    assert model_trainer.select_model(REPORT) == "Ridge"
+
+
+def test_fastest_model_within_tolerance_wins(model_trainer):
+    model_trainer.model_trainer_config.score_tolerance = 0.015
+    assert model_trainer.select_model(REPORT) == "Gradient Boosting"
+    model_trainer.model_trainer_config.score_tolerance = 0.2
+    assert model_trainer.select_model(REPORT) == "Ridge"
+
+
+def test_no_model_within_budget_fails(model_trainer):
+    model_trainer.model_trainer_config.max_latency_ms = 0.01
+    with pytest.raises(ValueError, match="No model is within the latency/size budget"):
+        model_trainer.select_model(REPORT)
+
+
+def test_pareto_front():
+    candidates = {name: {"test_score": report["test_score"], **report["profile"]} for name, report in REPORT.items()}
+    # the Decision Tree is worse than Ridge on every metric
+    assert pareto_front(candidates) == ["Random Forest", "Gradient Boosting", "Ridge"]
+    # ties don't dominate each other
+    candidates["Lasso"] = dict(candidates["Ridge"])
+    assert "Lasso" in pareto_front(candidates) and "Ridge" in pareto_front(candidates)
+
+
+def test_profile_measures_serving_cost():
+    rng = np.random.RandomState(0)
+    X, y = rng.normal(size=(200, 5)), rng.normal(size=200)
+    linear = profile_model(LinearRegression().fit(X, y), X, n_repeats=5, batch_size=100)
+    forest = profile_model(RandomForestRegressor(n_estimators=50, random_state=0).fit(X, y), X, n_repeats=5,
+                           batch_size=100)
+
+    assert set(linear) == {"single_row_ms", "single_row_p95_ms", "batch_size", "batch_ms", "rows_per_second",
+                           "size_bytes", "load_ms"}
+    assert linear["batch_size"] == 100
+    assert forest["size_bytes"] > 10 * linear["size_bytes"]
+    assert all(value > 0 for value in linear.values())
+
+
+def test_profile_is_saved_for_capacity_planning(model_trainer, tmp_path):
+    rng = np.random.RandomState(1)
+    X, y = rng.normal(size=(100, 5)), rng.normal(size=100)
+    config = model_trainer.model_trainer_config
+    config.trained_model_file_path = str(tmp_path / "model.pkl")
+    config.model_profile_path = str(tmp_path / "model_profile.json")
+    config.profile_repeats = 5
+
+    model = LinearRegression().fit(X, y)
+    save_object(config.trained_model_file_path, model)
+    model_report = {"Linear Regression": {"test_score": 0.5, "profile": profile_model(model, X, n_repeats=5)}}
+    profile = model_trainer.save_model_profile(model_report, "Linear Regression", None, X)
+
+    with open(config.model_profile_path) as file_obj:
+        assert json.load(file_obj) == profile
+    assert profile["selected"] == "Linear Regression"
+    assert profile["served"]["format"] == "pickle"
+    assert profile["candidates"]["Linear Regression"]["pareto_optimal"]
+    assert profile["candidates"]["Linear Regression"]["within_budget"]
@@ -0,0 +1,79 @@
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.utils import OutlierHandler
+
+
+def make_frame(n_rows, seed):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame(rng.normal(loc=[25, 1000], scale=[2, 300], size=(n_rows, 2)), columns=["Temp", "SEC"])
+
+
+@pytest.fixture
+def handler():
+    return OutlierHandler().fit(make_frame(200, seed=0))
+
+
+def test_outliers_become_the_training_median(handler):
+    X = make_frame(20, seed=1).to_numpy()
+    X[0, 0] = 100
+    X[1, 1] = -5000
+    transformed = handler.transform(X)
+
+    train = make_frame(200, seed=0).to_numpy()
+    assert transformed[0, 0] == np.median(train[:, 0])
+    assert transformed[1, 1] == np.median(train[:, 1])
+    assert np.array_equal(transformed[2:], X[2:])
+    assert handler.feature_names == ["Temp", "SEC"]
+
+
+def test_rows_dont_depend_on_the_batch(handler):
+    X = make_frame(20, seed=2).to_numpy()
+    X[::3, 1] = 10000
+    batch = handler.transform(X)
+    for i in range(len(X)):
+        assert np.array_equal(handler.transform(X[i:i + 1]), batch[i:i + 1])
+
+
+def test_clip_strategy():
+    handler = OutlierHandler(strategy="clip").fit(make_frame(200, seed=0))
+    X = np.array([[100.0, -5000.0], [25.0, 1000.0]])
+    transformed = handler.transform(X)
+    assert np.array_equal(transformed[0], [handler.upper_bound[0], handler.lower_bound[1]])
+    assert np.array_equal(transformed[1], X[1])
+
+
+def test_float32_stays_float32(handler):
+    X = make_frame(10, seed=3).to_numpy(dtype=np.float32)
+    assert handler.transform(X).dtype == np.float32
+    assert handler.transform(X.astype(np.int64)).dtype == np.float64
+
+
+def test_invalid_input():
+    with pytest.raises(ValueError, match="Unknown strategy"):
+        OutlierHandler(strategy="drop").fit(make_frame(10, seed=4))
+    with pytest.raises(ValueError, match="DataFrame or a NumPy array"):
+        OutlierHandler().fit([[1.0, 2.0]])
+
+
+def test_legacy_pickle_keeps_batch_median():
+    # a handler pickled before the rework: pandas bounds, no strategy and no training median
+    legacy = OutlierHandler().fit(make_frame(200, seed=0))
+    for name in ("Q1", "Q3", "IQR", "lower_bound", "upper_bound"):
+        setattr(legacy, name, pd.Series(getattr(legacy, name), index=["Temp", "SEC"]))
+    del legacy.__dict__["strategy"], legacy.__dict__["median"]
+    legacy = pickle.loads(pickle.dumps(legacy))
+
+    assert legacy.strategy == "median"
+    assert isinstance(legacy.lower_bound, np.ndarray)
+    X = make_frame(20, seed=5).to_numpy()
+    X[0, 0] = 100
+    assert legacy.transform(X)[0, 0] == np.median(X[:, 0])
+    assert np.array_equal(legacy.transform(X[1:]), X[1:])
@@ -0,0 +1,121 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline import prediction_cache, predict_pipeline
+from src.pipeline.prediction_cache import PredictionCache
+from src.pipeline.predict_pipeline import PredictPipeline, FEATURE_COLUMNS
+
+ARTIFACTS = (object(), object())
+
+
+class Model:
+    """Counts the rows it is asked to predict."""
+    def __init__(self):
+        self.rows = []
+
+    def __call__(self, features):
+        self.rows += features["x"].tolist()
+        return features["x"].to_numpy(dtype=np.float64) * 10
+
+
+def frame(*values):
+    return pd.DataFrame({"x": values, "y": [1.0] * len(values)})
+
+
+def test_hits_and_misses_are_counted_per_row():
+    cache, model = PredictionCache(["x", "y"]), Model()
+    preds = cache.predict(frame(1, 2, 2, 2, 3), ARTIFACTS, model)
+    assert preds.tolist() == [10, 20, 20, 20, 30]
+    # identical rows of one call are predicted once, but each one missed the cache
+    assert model.rows == [1, 2, 3]
+    assert cache.stats()["misses"] == 5 and cache.stats()["hits"] == 0
+
+    cache.predict(frame(2, 3, 4), ARTIFACTS, model)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 6)
+    assert stats["hit_rate"] == pytest.approx(2 / 8)
+
+
+def test_same_reading_in_other_types_is_one_entry():
+    cache, model = PredictionCache(["x", "y"]), Model()
+    cache.predict(pd.DataFrame({"x": [100.0, 0.0, np.nan], "y": [1.0, 1.0, 1.0]}), ARTIFACTS, model)
+    cache.predict(pd.DataFrame({"x": [100, -0.0, float("nan")], "y": [1, 1, 1]}), ARTIFACTS, lambda f: pytest.fail("missed"))
+    assert cache.stats()["hits"] == 3
+
+
+def test_non_numeric_rows_bypass_the_cache():
+    cache, model = PredictionCache(["x", "y"]), Model()
+    features = pd.DataFrame({"x": [1.0], "y": ["a"]})
+    assert cache.predict(features, ARTIFACTS, model).tolist() == [10]
+    assert cache.stats()["size"] == 0 and cache.stats()["misses"] == 0
+
+
+def test_least_recently_used_rows_are_evicted():
+    cache, model = PredictionCache(["x", "y"], max_size=3), Model()
+    cache.predict(frame(1, 2, 3), ARTIFACTS, model)
+    cache.predict(frame(1), ARTIFACTS, model)
+    cache.predict(frame(4), ARTIFACTS, model)
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 3
+    # 2 was the least recently used
+    model.rows.clear()
+    cache.predict(frame(1, 2, 3, 4), ARTIFACTS, model)
+    assert model.rows == [2]
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache.time, "monotonic", lambda: now[0])
+    cache, model = PredictionCache(["x", "y"], ttl_seconds=60), Model()
+    cache.predict(frame(1), ARTIFACTS, model)
+    now[0] += 59
+    cache.predict(frame(1), ARTIFACTS, model)
+    now[0] += 2
+    cache.predict(frame(1), ARTIFACTS, model)
+    assert model.rows == [1, 1]
+    assert cache.stats()["expirations"] == 1 and cache.stats()["hits"] == 1
+
+
+def test_new_artifacts_invalidate_every_entry():
+    cache, model = PredictionCache(["x", "y"]), Model()
+    cache.predict(frame(1, 2), ARTIFACTS, model)
+    cache.predict(frame(1, 2), (ARTIFACTS[0], object()), model)
+    assert model.rows == [1, 2, 1, 2]
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_predictions_of_replaced_artifacts_are_not_stored():
+    cache = PredictionCache(["x", "y"])
+
+    def replaced_while_predicting(features):
+        # another request picks up a retrained model in the meantime
+        cache.predict(frame(9), (object(), object()), Model())
+        return Model()(features)
+
+    cache.predict(frame(1), ARTIFACTS, replaced_while_predicting)
+    assert cache.stats()["size"] == 1
+
+
+def test_retrained_model_file_empties_the_cache(in_repo, tmp_path, monkeypatch):
+    monkeypatch.setattr(predict_pipeline, "_prediction_cache", None)
+    shutil.copy("artifacts/model.pkl", tmp_path / "model.pkl")
+    pipeline = PredictPipeline()
+    config = pipeline.predict_pipeline_config
+    config.prediction_cache = True
+    config.use_compact_model = False
+    config.model_path = str(tmp_path / "model.pkl")
+    readings = pd.read_csv("artifacts/test.csv")[FEATURE_COLUMNS].dropna(how="all").head(5)
+
+    first = pipeline.predict_rows(readings)
+    assert np.allclose(pipeline.predict_rows(readings), first)
+    cache = predict_pipeline.get_prediction_cache()
+    assert cache.stats()["hits"] == 5
+
+    # a new file (same content) is a new model as far as the cache knows
+    stat = os.stat(config.model_path)
+    os.utime(config.model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    pipeline.predict_rows(readings)
+    assert cache.stats()["invalidations"] == 1 and cache.stats()["hits"] == 5
@@ -0,0 +1,131 @@
+import importlib.util
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from src.pipeline.predict_pipeline import PredictPipeline
+
+
+class StopWatching(Exception):
+    pass
+
+
+@pytest.fixture
+def server_config(in_repo, tmp_path, monkeypatch):
+    # the settings module sets PH_METRICS_DIR if it isn't set, keep that out of the other tests
+    monkeypatch.setenv("PH_METRICS_DIR", str(tmp_path / "metrics"))
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", os.path.join(in_repo, "gunicorn.conf.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeServer:
+    class log:
+        errors = []
+
+        @classmethod
+        def info(cls, message):
+            pass
+
+        @classmethod
+        def error(cls, message):
+            cls.errors.append(message)
+
+
+def watch(server_config, monkeypatch, stamps, warm_up=lambda self: None):
+    """
+    Runs the artifact watcher over a sequence of artifact stamps (the first is the one at
+    startup), returns the signals it sent.
+    """
+    stamps = iter(stamps)
+    signals = []
+
+    def next_stamps():
+        # the watcher runs until it has no stamps left
+        for stamp in stamps:
+            return stamp
+        raise StopWatching
+
+    monkeypatch.setattr(server_config, "artifact_stamps", next_stamps)
+    monkeypatch.setattr(server_config.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(server_config.os, "kill", lambda pid, sig: signals.append(sig))
+    monkeypatch.setattr(PredictPipeline, "warm_up", warm_up)
+    with pytest.raises(StopWatching):
+        server_config.watch_artifacts(FakeServer())
+    return signals
+
+
+def test_workers_are_replaced_once_the_artifacts_settle(server_config, monkeypatch):
+    # unchanged, then written over three checks, then unchanged
+    stamps = [{"model": 1}, {"model": 1}, {"model": 2}, {"model": 3}, {"model": 3}, {"model": 3}]
+    assert watch(server_config, monkeypatch, stamps) == [signal.SIGHUP]
+
+
+def test_broken_artifacts_keep_the_old_workers(server_config, monkeypatch):
+    def warm_up(self):
+        raise ValueError("truncated pickle")
+
+    stamps = [{"model": 1}, {"model": 2}, {"model": 2}, {"model": 2}]
+    assert watch(server_config, monkeypatch, stamps, warm_up) == []
+    assert "truncated pickle" in FakeServer.log.errors[-1]
+
+
+def test_artifact_stamps_cover_the_exports(server_config):
+    stamps = server_config.artifact_stamps()
+    assert stamps[os.path.join("artifacts", "model.pkl")] is not None
+    assert os.path.join("artifacts", "compact_model", "manifest.json") in stamps
+    assert os.path.join("artifacts", "compiled_preprocessor", "manifest.json") in stamps
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.read().decode()
+
+
+# the worker pids are read from /proc
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs /proc")
+def test_workers_share_their_metrics(in_repo, tmp_path):
+    pytest.importorskip("gunicorn")
+    port = free_port()
+    env = {**os.environ, "PORT": str(port), "PH_WORKERS": "2", "PH_THREADS": "1",
+           "PH_METRICS_DIR": str(tmp_path / "metrics"), "PH_METRICS_SAVE_INTERVAL": "0.2", "PH_RELOAD_INTERVAL": "0"}
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "app:app"],
+                              cwd=in_repo, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                ready = json.loads(get(f"http://127.0.0.1:{port}/ready"))
+                break
+            except OSError:
+                if time.time() > deadline or server.poll() is not None:
+                    raise
+                time.sleep(0.2)
+        assert ready["ready"]
+
+        # every worker saves its metrics on its own, so one scrape sees both
+        while True:
+            with open(f"/proc/{server.pid}/task/{server.pid}/children") as file_obj:
+                worker_pids = sorted(int(pid) for pid in file_obj.read().split())
+            metrics = get(f"http://127.0.0.1:{port}/metrics")
+            if len(worker_pids) == 2 and all(f'pid="{pid}"' in metrics for pid in worker_pids):
+                break
+            assert time.time() < deadline
+            time.sleep(0.2)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
@@ -0,0 +1,42 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+from src.components.export_artifacts import export_artifacts
+from src.pipeline.predict_pipeline import PredictPipeline
+
+SERVE = """
+import json, sys
+import pandas as pd
+import app
+from src.pipeline.predict_pipeline import PredictPipeline, FEATURE_COLUMNS
+pipeline = PredictPipeline()
+pipeline.warm_up()
+pipeline.predict_now(pd.read_csv("artifacts/test.csv")[FEATURE_COLUMNS].dropna(how="all").head(3))
+print(json.dumps([name for name in ("sklearn", "xgboost", "catboost", "lime", "scipy") if name in sys.modules]))
+"""
+
+
+def test_serving_the_exports_skips_the_training_libraries(in_repo):
+    env = {**os.environ, "PH_PREDICTION_CACHE": "0", "PH_MICRO_BATCHING": "0"}
+    result = subprocess.run([sys.executable, "-c", SERVE], cwd=in_repo, env=env, capture_output=True, text=True,
+                            check=True)
+    assert json.loads(result.stdout.splitlines()[-1]) == []
+
+
+def test_exports_for_existing_pickles(in_repo, tmp_path, monkeypatch):
+    (tmp_path / "artifacts").mkdir()
+    for name in ("model.pkl", "preprocessor.pkl", "train.csv", "test.csv"):
+        shutil.copy(os.path.join("artifacts", name), tmp_path / "artifacts" / name)
+    monkeypatch.chdir(tmp_path)
+
+    preprocessor_manifest, model_manifest = export_artifacts()
+    assert preprocessor_manifest is not None
+    assert model_manifest["kind"] == "linear"
+    assert os.path.exists(os.path.join("artifacts", "drift_reference.json"))
+
+    model, preprocessor = PredictPipeline().load_artifacts()
+    assert type(model).__name__ == "LinearModel"
+    assert type(preprocessor).__name__ == "CompiledPreprocessor"
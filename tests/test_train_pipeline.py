@@ -0,0 +1,121 @@
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+
+# Add the project root directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.components.model_trainer import ModelTrainer
+from src.pipeline.compact_model import MANIFEST_FILE
+from src.pipeline.train_pipeline import Stage, TrainPipeline
+
+
+@dataclass
+class FakeConfig:
+    scale: int=1
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    pipeline = TrainPipeline()
+    pipeline.train_pipeline_config.cache_manifest_path = str(tmp_path / "pipeline_cache.json")
+    pipeline.train_pipeline_config.metrics_path = str(tmp_path / "training_metrics.prom")
+
+    # one stage that reads an input file and writes an output plus an export manifest
+    input_path = tmp_path / "input.txt"
+    input_path.write_text("1")
+    export_manifest = tmp_path / "export" / MANIFEST_FILE
+    config = FakeConfig()
+    runs = []
+
+    def run():
+        runs.append(1)
+        (tmp_path / "output.txt").write_text(input_path.read_text() * config.scale)
+        export_manifest.parent.mkdir(exist_ok=True)
+        export_manifest.write_text("{}")
+        return 0.5
+
+    stage = Stage("fake", run=run, inputs=[str(input_path)],
+                  outputs=[str(tmp_path / "output.txt"), str(export_manifest)],
+                  config=config, code_files=["utils.py"])
+    monkeypatch.setattr(pipeline, "get_stages", lambda: [stage])
+    pipeline.input_path, pipeline.export_manifest, pipeline.config, pipeline.runs = input_path, export_manifest, config, runs
+    return pipeline
+
+
+def test_unchanged_stage_is_cached(pipeline):
+    assert pipeline.run() == ({"fake": "ran"}, None)
+    assert pipeline.run()[0] == {"fake": "cached"}
+    assert len(pipeline.runs) == 1
+
+
+def test_deleted_export_reruns_stage(pipeline):
+    pipeline.run()
+    os.remove(pipeline.export_manifest)
+    assert pipeline.run()[0] == {"fake": "ran"}
+    assert os.path.exists(pipeline.export_manifest)
+
+
+def test_changed_input_or_config_reruns_stage(pipeline):
+    pipeline.run()
+    pipeline.input_path.write_text("2")
+    assert pipeline.run()[0] == {"fake": "ran"}
+    pipeline.config.scale = 2
+    assert pipeline.run()[0] == {"fake": "ran"}
+    assert pipeline.run()[0] == {"fake": "cached"}
+
+
+def test_force_reruns_every_stage(pipeline):
+    pipeline.run()
+    pipeline.force = True
+    assert pipeline.run()[0] == {"fake": "ran"}
+
+
+def test_missing_input_fails(pipeline):
+    os.remove(pipeline.input_path)
+    with pytest.raises(Exception, match="Inputs of the fake stage are missing"):
+        pipeline.run()
+
+
+def test_stage_outputs_include_exports():
+    pipeline = TrainPipeline()
+    stages = {stage.name: stage for stage in pipeline.get_stages()}
+    transformation_config = pipeline.data_transformation.data_transformation_config
+    trainer_config = pipeline.model_trainer.model_trainer_config
+
+    assert os.path.join(transformation_config.compiled_preprocessor_dir, MANIFEST_FILE) in stages["data_transformation"].outputs
+    assert os.path.join(trainer_config.compact_model_dir, MANIFEST_FILE) in stages["model_trainer"].outputs
+
+    # no export, nothing to check for
+    trainer_config.export_compact_model = False
+    stages = {stage.name: stage for stage in pipeline.get_stages()}
+    assert os.path.join(trainer_config.compact_model_dir, MANIFEST_FILE) not in stages["model_trainer"].outputs
+
+
+def test_model_search_results_are_cached(tmp_path):
+    rng = np.random.RandomState(0)
+    X_train, X_test = rng.normal(size=(150, 3)), rng.normal(size=(50, 3))
+    y_train, y_test = X_train.sum(axis=1), X_test.sum(axis=1)
+    model_trainer = ModelTrainer()
+    config = model_trainer.model_trainer_config
+    config.search_cache_dir = str(tmp_path / "model_search_cache")
+    config.n_jobs = 1
+
+    def search(grid):
+        return model_trainer.evaluate_models_cached(X_train, y_train, X_test, y_test, {"Ridge": Ridge()}, {"Ridge": grid})
+
+    first = search({"alpha": [0.1, 1.0]})
+    assert "cached" not in first["Ridge"]
+    second = search({"alpha": [0.1, 1.0]})
+    assert second["Ridge"]["cached"]
+    assert second["Ridge"]["best_params"] == first["Ridge"]["best_params"]
+
+    # a different grid is searched again
+    assert "cached" not in search({"alpha": [10.0]})["Ridge"]
+    # a search cut short by a time budget is never read from or saved to the cache
+    config.model_time_budget = 60
+    assert "cached" not in search({"alpha": [0.1, 1.0]})["Ridge"]
+    assert len(os.listdir(config.search_cache_dir)) == 2